@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+
+import click
+import io
+import json
+from lxml import etree
+from os import path
+import os
+import random
+import zipfile
+
+
+WORDS = [
+    "American",
+    "Association",
+    "Capitol",
+    "Coalition",
+    "Council",
+    "Energy",
+    "Federal",
+    "Health",
+    "Institute",
+    "National",
+    "Policy",
+    "Public",
+    "Strategies",
+    "Technology",
+    "Trade",
+    "Union",
+]
+FIRST_NAMES = ["Alex", "Jordan", "Morgan", "Pat", "Riley", "Sam", "Taylor", "Casey"]
+LAST_NAMES = ["Adams", "Baker", "Chen", "Garcia", "Johnson", "Lee", "Nguyen", "Smith"]
+ISSUE_CODES = ["BUD", "DEF", "ENV", "HCR", "IMM", "TAX", "TEC", "TRD", "TRA"]
+STATES = ["CA", "DC", "MD", "NY", "TX", "VA"]
+AGENCIES = ["HOUSE OF REPRESENTATIVES", "SENATE", "Treasury, Dept of", "White House"]
+QUARTERS = {1: "1stQuarter", 2: "2ndQuarter", 3: "3rdQuarter", 4: "4thQuarter"}
+
+
+class Generator:
+    """
+    Builds synthetic LD1, LD2 and Senate documents with the same element
+    shapes as the real files. nesting is the largest number of repeated
+    children (lobbyists, issues, orgs, ...) in any one list.
+    """
+
+    def __init__(self, seed, nesting, year):
+        self.random = random.Random(seed)
+        self.nesting = nesting
+        self.year = year
+
+    def count(self):
+        return self.random.randint(0, self.nesting)
+
+    def name(self, words=3):
+        return " ".join(self.random.choice(WORDS) for _ in range(words))
+
+    def person(self):
+        return (self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES))
+
+    def sometimes(self, value, chance=0.5):
+        return value if self.random.random() < chance else ""
+
+    def add(self, parent, tag, text=""):
+        element = etree.SubElement(parent, tag)
+        element.text = str(text)
+        return element
+
+    def add_all(self, parent, values):
+        for (tag, text) in values:
+            self.add(parent, tag, text)
+
+    def address(self, prefix=""):
+        return [
+            (prefix + "address1", "{} Main St".format(self.random.randint(1, 9999))),
+            (prefix + "address2", self.sometimes("Suite 100", 0.2)),
+            (prefix + "city", "Washington"),
+            (prefix + "state", self.random.choice(STATES)),
+            (prefix + "zip", "{:05d}".format(self.random.randint(10000, 99999))),
+            (prefix + "zipext", ""),
+            (prefix + "country", "USA"),
+        ]
+
+    def lobbyists(self, parent):
+        lobbyists = self.add(parent, "lobbyists")
+        for _ in range(self.count()):
+            (first, last) = self.person()
+            lobbyist = self.add(lobbyists, "lobbyist")
+            self.add_all(
+                lobbyist,
+                [
+                    ("lobbyistFirstName", first),
+                    ("lobbyistLastName", last),
+                    ("lobbyistSuffix", self.sometimes("JR", 0.05)),
+                    ("coveredPosition", self.sometimes("Legislative Assistant", 0.3)),
+                    ("lobbyistNew", self.random.choice("YN")),
+                ],
+            )
+        # The real files end every list with an empty entry
+        blank = self.add(lobbyists, "lobbyist")
+        for tag in ["lobbyistFirstName", "lobbyistLastName", "lobbyistSuffix"]:
+            self.add(blank, tag)
+
+    def affiliated_orgs(self, parent):
+        orgs = self.add(parent, "affiliatedOrgs")
+        for _ in range(max(self.count(), 1)):
+            org = self.add(orgs, "affiliatedOrg")
+            self.add_all(
+                org,
+                [
+                    ("affiliatedOrgName", self.sometimes(self.name(), 0.3)),
+                    ("affiliatedOrgAddress", ""),
+                    ("affiliatedOrgCity", ""),
+                    ("affiliatedOrgState", ""),
+                    ("affiliatedOrgZip", ""),
+                    ("affiliatedOrgCountry", ""),
+                    ("affiliatedPrinOrgCity", ""),
+                    ("affiliatedPrinOrgState", ""),
+                    ("affiliatedPrinOrgCountry", ""),
+                ],
+            )
+
+    def foreign_entities(self, parent, ownership_tag):
+        entities = self.add(parent, "foreignEntities")
+        for _ in range(max(self.count(), 1)):
+            entity = self.add(entities, "foreignEntity")
+            self.add_all(
+                entity,
+                [
+                    ("name", self.sometimes(self.name(), 0.1)),
+                    ("address", ""),
+                    ("city", ""),
+                    ("state", ""),
+                    ("country", self.sometimes("CANADA", 0.1)),
+                    ("prinCity", ""),
+                    ("prinState", ""),
+                    ("prinCountry", ""),
+                    ("contribution", self.sometimes(self.random.randint(0, 50000))),
+                    (ownership_tag, self.sometimes(self.random.randint(0, 100))),
+                ],
+            )
+
+    def registration(self, house_id):
+        root = etree.Element("LOBBYINGDISCLOSURE1")
+        (first, last) = self.person()
+        self.add_all(
+            root,
+            [
+                ("regType", self.random.choice("1234")),
+                ("organizationName", self.name()),
+                ("prefix", ""),
+                ("firstName", self.sometimes(first, 0.1)),
+                ("lastName", self.sometimes(last, 0.1)),
+            ]
+            + self.address()
+            + [
+                ("principal_city", ""),
+                ("principal_state", ""),
+                ("principal_zip", ""),
+                ("principal_zipext", ""),
+                ("principal_country", ""),
+                ("contactIntlPhone", ""),
+                ("registrantGeneralDescription", self.name(6)),
+                ("selfSelect", self.random.choice("NY")),
+                ("clientName", self.name()),
+                ("clientAddress", "1 Client Way"),
+                ("clientCity", "Arlington"),
+                ("clientState", self.random.choice(STATES)),
+                ("clientZip", "22201"),
+                ("clientZipExt", ""),
+                ("clientCountry", "USA"),
+                ("prinClientCity", ""),
+                ("prinClientState", ""),
+                ("prinClientZip", ""),
+                ("prinClientZipExt", ""),
+                ("prinClientCountry", ""),
+                ("clientGeneralDescription", self.name(4)),
+                ("senateID", "{}-{}".format(self.random.randint(1, 99999), house_id)),
+                ("houseID", house_id),
+            ],
+        )
+        self.lobbyists(root)
+        alis = self.add(root, "alis")
+        for _ in range(self.count()):
+            self.add(alis, "ali_Code", self.random.choice(ISSUE_CODES))
+        self.add(alis, "ali_Code")
+        self.add(root, "specific_issues", self.name(12))
+        self.add(root, "affiliatedUrl", self.sometimes("http://example.com", 0.1))
+        self.affiliated_orgs(root)
+        self.foreign_entities(root, "ownership_Percentage")
+        self.add_all(
+            root,
+            [
+                ("reportYear", self.year),
+                ("reportType", "RR"),
+                ("effectiveDate", "01/02/{}".format(self.year)),
+                ("printedName", " ".join(self.person())),
+                ("signedDate", "01/03/{}".format(self.year)),
+            ],
+        )
+        return root
+
+    def issue(self, alis):
+        info = self.add(alis, "ali_info")
+        self.add(info, "issueAreaCode", self.random.choice(ISSUE_CODES))
+        specific_issues = self.add(info, "specific_issues")
+        for _ in range(max(self.count(), 1)):
+            self.add(
+                specific_issues,
+                "description",
+                "H.R. {}, {}".format(self.random.randint(1, 9999), self.name(8)),
+            )
+        self.add(info, "federal_agencies", ", ".join(self.random.sample(AGENCIES, 2)))
+        self.lobbyists(info)
+        self.add(info, "foreign_entity_issues", self.random.choice("NY"))
+
+    def report(self, house_id, quarter):
+        root = etree.Element("LOBBYINGDISCLOSURE2")
+        (first, last) = self.person()
+        self.add_all(
+            root,
+            [
+                ("organizationName", self.name()),
+                ("prefix", ""),
+                ("firstName", ""),
+                ("lastName", ""),
+                ("registrantDifferentAddress", self.random.choice("NY")),
+            ]
+            + self.address()
+            + [
+                ("principal_city", ""),
+                ("principal_state", ""),
+                ("principal_zip", ""),
+                ("principal_zipext", ""),
+                ("principal_country", ""),
+                ("contactPrefix", "MS"),
+                ("contactName", "{} {}".format(first, last)),
+                ("contactPhone", "2025550100"),
+                ("contactIntlPhone", ""),
+                ("contactEmail", "{}@example.com".format(last.lower())),
+                ("selfSelect", self.random.choice("NY")),
+                ("clientName", self.name()),
+                ("senateID", "{}-{}".format(self.random.randint(1, 99999), house_id)),
+                ("houseID", house_id),
+                ("reportYear", self.year),
+                ("reportType", "Q{}".format(quarter)),
+                ("terminationDate", self.sometimes("03/31/{}".format(self.year), 0.05)),
+                ("noLobbying", self.sometimes("Y", 0.1)),
+                (
+                    "income",
+                    self.sometimes("{},000.00".format(self.random.randint(5, 900))),
+                ),
+                ("expenses", self.sometimes(self.random.randint(5000, 900000))),
+                ("expensesMethod", self.random.choice("ABC")),
+                ("printedName", "{} {}".format(first, last)),
+                ("signedDate", "04/20/{} 10:11:12 AM".format(self.year)),
+                ("signerEmail", ""),
+            ],
+        )
+        updates = self.add(root, "updates")
+        for tag in [
+            "clientAddress",
+            "clientCity",
+            "clientState",
+            "clientZip",
+            "clientZipext",
+            "clientCountry",
+            "prinClientCity",
+            "prinClientState",
+            "prinClientZip",
+            "prinClientZipext",
+            "prinClientCountry",
+            "generalDescription",
+        ]:
+            self.add(updates, tag)
+        inactive_lobbyists = self.add(updates, "inactive_lobbyists")
+        for _ in range(max(self.count() // 2, 1)):
+            (first, last) = self.person()
+            inactive = self.add(inactive_lobbyists, "inactive_lobbyist")
+            self.add(inactive, "firstName", self.sometimes(first, 0.2))
+            self.add(inactive, "lastName", self.sometimes(last, 0.2))
+            self.add(inactive, "suffix")
+        inactive_alis = self.add(updates, "inactive_ALIs")
+        self.add(inactive_alis, "ali_Code", self.sometimes("TAX", 0.1))
+        self.affiliated_orgs(updates)
+        inactive_orgs = self.add(updates, "inactiveOrgs")
+        self.add(inactive_orgs, "inactiveOrgName", self.sometimes(self.name(), 0.05))
+        self.foreign_entities(updates, "Ownership_percentage")
+        inactive_entities = self.add(updates, "inactive_ForeignEntities")
+        self.add(
+            inactive_entities,
+            "inactive_ForeignEntity",
+            self.sometimes(self.name(), 0.05),
+        )
+        alis = self.add(root, "alis")
+        for _ in range(max(self.count(), 1)):
+            self.issue(alis)
+        # Followed by an empty issue, as in the real files
+        empty = self.add(alis, "ali_info")
+        self.add(empty, "issueAreaCode")
+        self.add(empty, "lobbyists")
+        return root
+
+    def filing(self, filing_id, quarter):
+        filing = etree.Element(
+            "Filing",
+            ID=filing_id,
+            Year=str(self.year),
+            Received="{}-04-{:02d}T10:00:00".format(
+                self.year, self.random.randint(1, 28)
+            ),
+            Amount=self.sometimes(str(self.random.randint(1, 500) * 1000)),
+            Type="Q{}".format(quarter),
+            Period="{} Quarter".format(QUARTERS[quarter][:3]),
+        )
+        etree.SubElement(
+            filing,
+            "Registrant",
+            RegistrantID=str(self.random.randint(1, 99999)),
+            RegistrantName=self.name(),
+            GeneralDescription=self.name(6),
+            Address="{} Main St, Washington, DC".format(self.random.randint(1, 9999)),
+            RegistrantCountry="USA",
+            RegistrantPPBCountry="USA",
+            # The client is described by attributes of the Registrant, which
+            # is where senate_processor reads them from
+            ClientName=self.name(),
+            ClientID=str(self.random.randint(1, 99999)),
+            SelfFiler=self.random.choice(["TRUE", "FALSE"]),
+            ContactFullname=" ".join(self.person()),
+            IsStateOrLocalGov="FALSE",
+            ClientCountry="USA",
+            ClientPPBCountry="USA",
+            ClientState=self.random.choice(STATES),
+            ClientPPBState=self.random.choice(STATES),
+        )
+        count = self.count()
+        if count:
+            lobbyists = etree.SubElement(filing, "Lobbyists")
+            for _ in range(count):
+                (first, last) = self.person()
+                etree.SubElement(
+                    lobbyists,
+                    "Lobbyist",
+                    LobbyistName="{}, {}".format(last.upper(), first.upper()),
+                    LobbyistCoveredGovPositionIndicator=self.random.choice(
+                        ["COVERED", "NOT COVERED"]
+                    ),
+                    OfficialPosition=self.sometimes("Legislative Director", 0.2),
+                    ActivityInformation=self.name(5),
+                )
+        entities = etree.SubElement(filing, "GovernmentEntities")
+        for name in self.random.sample(AGENCIES, self.random.randint(1, len(AGENCIES))):
+            etree.SubElement(entities, "GovernmentEntity", GovEntityName=name)
+        count = self.count()
+        if count:
+            issues = etree.SubElement(filing, "Issues")
+            for _ in range(count):
+                etree.SubElement(
+                    issues,
+                    "Issue",
+                    Code=self.random.choice(ISSUE_CODES),
+                    SpecificIssue=self.name(12),
+                )
+        if self.random.random() < 0.1:
+            foreign_entities = etree.SubElement(filing, "ForeignEntities")
+            etree.SubElement(
+                foreign_entities,
+                "Entity",
+                ForeignEntityName=self.name(),
+                ForeignEntityCountry="CANADA",
+                ForeignEntityPPBcountry="CANADA",
+                ForeignEntityContribution=" {} ".format(self.random.randint(0, 50000)),
+                ForeignEntityOwnershipPercentage=str(self.random.randint(0, 100)),
+                ForeignEntityStatus="active",
+            )
+        if self.random.random() < 0.1:
+            orgs = etree.SubElement(filing, "AffiliatedOrgs")
+            etree.SubElement(
+                orgs,
+                "Org",
+                AffiliatedOrgName=self.name(),
+                AffiliatedOrgCountry="USA",
+                AffiliatedOrgPPBCcountry="USA",
+            )
+        return filing
+
+
+def write_house_zip(filename, documents):
+    count = 0
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zfile:
+        for (name, document) in documents:
+            zfile.writestr(
+                name, etree.tostring(document, xml_declaration=True, encoding="UTF-8")
+            )
+            count += 1
+    return count
+
+
+def write_senate_zip(filename, members):
+    """
+    Writes each member's filings as a UTF-16 document, like the real files,
+    one filing at a time so large corpora don't have to fit in memory.
+    """
+    count = 0
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zfile:
+        for (name, filings) in members:
+            with zfile.open(name, "w") as member:
+                output = io.TextIOWrapper(member, encoding="utf-16")
+                output.write('<?xml version="1.0" encoding="UTF-16"?>\n')
+                output.write("<PublicFilings>\n")
+                for filing in filings:
+                    output.write(etree.tostring(filing, encoding="unicode") + "\n")
+                    count += 1
+                output.write("</PublicFilings>\n")
+                output.flush()
+                output.detach()
+    return count
+
+
+def generate(
+    output_dir, year, registrations, reports, filings, senate_members, nesting, seed
+):
+    """
+    Writes <year>_Registrations_XML.zip, <year>_1stQuarter_XML.zip and
+    <year>_1.zip to output_dir, along with a corpus.json that records the
+    number of documents in each.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    generator = Generator(seed, nesting, year)
+    corpus = {}
+
+    name = "{}_Registrations_XML.zip".format(year)
+    corpus[name] = write_house_zip(
+        path.join(output_dir, name),
+        (
+            ("{}.xml".format(300000000 + i), generator.registration(300000000 + i))
+            for i in range(registrations)
+        ),
+    )
+
+    name = "{}_{}_XML.zip".format(year, QUARTERS[1])
+    corpus[name] = write_house_zip(
+        path.join(output_dir, name),
+        (
+            ("{}.xml".format(700000000 + i), generator.report(700000000 + i, 1))
+            for i in range(reports)
+        ),
+    )
+
+    name = "{}_1.zip".format(year)
+    per_member = -(-filings // senate_members)
+    corpus[name] = write_senate_zip(
+        path.join(output_dir, name),
+        (
+            (
+                "{}_1_1_{}.xml".format(year, member + 1),
+                (
+                    generator.filing("{:08X}-{:04X}".format(member, i), 1)
+                    for i in range(
+                        member * per_member, min((member + 1) * per_member, filings)
+                    )
+                ),
+            )
+            for member in range(senate_members)
+        ),
+    )
+
+    with open(path.join(output_dir, "corpus.json"), "w") as f:
+        json.dump({"year": year, "documents": corpus}, f, indent=2)
+    return corpus
+
+
+@click.command()
+@click.argument("output_dir", type=click.Path())
+@click.option("--year", default=2018, type=int, help="Year of the generated files")
+@click.option("--registrations", default=2000, help="Number of LD1 documents")
+@click.option("--reports", default=2000, help="Number of LD2 documents")
+@click.option("--filings", default=20000, help="Number of Senate filings")
+@click.option(
+    "--senate-members", default=2, help="Number of XML files in the Senate zip"
+)
+@click.option(
+    "--nesting",
+    default=4,
+    type=click.IntRange(1, None),
+    help="Largest number of lobbyists, issues, etc. in any one list",
+)
+@click.option("--seed", default=0, help="Random seed, so corpora can be reproduced")
+def cli(
+    output_dir, year, registrations, reports, filings, senate_members, nesting, seed
+):
+    corpus = generate(
+        output_dir, year, registrations, reports, filings, senate_members, nesting, seed
+    )
+    for (name, count) in corpus.items():
+        print("{}\t{}".format(path.join(output_dir, name), count))
+
+
+if __name__ == "__main__":
+    cli()
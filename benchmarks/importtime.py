@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import click
+from collections import namedtuple
+import json
+from os import path
+import os
+import subprocess
+import sys
+
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Dependencies that are only imported by the code paths that use them
+HEAVY_MODULES = ["lxml", "pandas", "numpy", "pyarrow", "requests_html"]
+
+# A module run as a command, the most milliseconds importing it may take,
+# and the modules it must not import until a command needs them
+Budget = namedtuple("Budget", ["module", "milliseconds", "forbidden"])
+
+BUDGETS = [
+    Budget("house_processor", 50, HEAVY_MODULES + ["multiprocessing"]),
+    Budget("senate_processor", 50, HEAVY_MODULES + ["multiprocessing"]),
+    Budget("stack", 30, HEAVY_MODULES + ["multiprocessing"]),
+    Budget("database", 60, HEAVY_MODULES + ["multiprocessing"]),
+    Budget("search", 60, HEAVY_MODULES + ["multiprocessing"]),
+    Budget("lookup", 60, HEAVY_MODULES + ["multiprocessing"]),
+    # The pipeline schedules its steps with a process pool
+    Budget("pipeline", 80, HEAVY_MODULES),
+]
+
+Result = namedtuple(
+    "Result", ["module", "milliseconds", "budget", "forbidden_imports", "passed"]
+)
+
+
+def import_times(module):
+    """
+    Imports module in a new interpreter with -X importtime, returning the
+    cumulative microseconds taken by each module it imported, by name
+    """
+    env = dict(os.environ)
+    # Bytecode has to be cached for the times to match a normal run
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=REPO,
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        raise click.ClickException(
+            "Importing {} failed:\n{}".format(module, process.stderr)
+        )
+    times = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        times[parts[2].strip()] = int(parts[1])
+    return times
+
+
+def measure(budget, repeat, scale):
+    runs = [import_times(budget.module) for _ in range(repeat + 1)]
+    # The first run writes the bytecode cache
+    runs = runs[1:]
+    milliseconds = min(times[budget.module] for times in runs) / 1000
+    forbidden_imports = sorted(
+        module for module in runs[0] if module in budget.forbidden
+    )
+    return Result(
+        budget.module,
+        milliseconds,
+        budget.milliseconds * scale,
+        forbidden_imports,
+        milliseconds <= budget.milliseconds * scale and not forbidden_imports,
+    )
+
+
+@click.command()
+@click.option(
+    "--repeat",
+    default=5,
+    type=click.IntRange(1, None),
+    help="Imports per module; the fastest is kept",
+)
+@click.option(
+    "--scale",
+    default=1.0,
+    type=float,
+    help="Multiply every budget by this, for slower machines",
+)
+@click.option("--only", help="Only measure modules whose name contains this")
+@click.option("--json", "as_json", is_flag=True, help="Print the results as JSON")
+def cli(repeat, scale, only, as_json):
+    """
+    Measures how long importing each command line module takes with
+    python -X importtime, excluding interpreter startup, and checks it
+    against a budget. A module also fails if it imports a heavy dependency
+    before any command needs it. Exits with status 1 if any module fails.
+    """
+    results = [
+        measure(budget, repeat, scale)
+        for budget in BUDGETS
+        if not only or only in budget.module
+    ]
+    if as_json:
+        json.dump([result._asdict() for result in results], sys.stdout, indent=2)
+        print()
+    else:
+        for result in results:
+            print(
+                "{:20} {:8.1f} ms {:8.1f} ms budget  {}{}".format(
+                    result.module,
+                    result.milliseconds,
+                    result.budget,
+                    "ok" if result.passed else "FAIL",
+                    "".join(
+                        "  imports " + module for module in result.forbidden_imports
+                    ),
+                )
+            )
+    if not all(result.passed for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
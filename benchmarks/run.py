@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+import click
+from collections import namedtuple
+import csv
+import json
+from os import path
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+
+HOUSE_REGISTRATION_COMMANDS = [
+    "registrations",
+    "lobbyists",
+    "issues",
+    "affiliated_orgs",
+    "foreign_entities",
+]
+HOUSE_REPORT_COMMANDS = [
+    "reports",
+    "report_issues",
+    "report_lobbyists",
+    "report_inactive_lobbyists",
+    "report_inactive_issues",
+    "report_affiliated_orgs",
+    "report_inactive_orgs",
+    "report_foreign_entities",
+    "report_inactive_foreign_entities",
+]
+SENATE_COMMANDS = [
+    "filings",
+    "lobbyists",
+    "government_entities",
+    "issues",
+    "foreign_entities",
+    "affiliated_orgs",
+]
+
+# A benchmarked command. documents is the number of input documents it
+# parses, and outputs the files whose rows are counted once it finishes;
+# None means the rows are counted from stdout.
+Benchmark = namedtuple("Benchmark", ["name", "args", "documents", "outputs"])
+
+Result = namedtuple(
+    "Result",
+    [
+        "name",
+        "seconds",
+        "documents",
+        "rows",
+        "docs_per_second",
+        "rows_per_second",
+        "peak_rss_mb",
+    ],
+)
+
+
+def script(name):
+    return [sys.executable, path.join(REPO, name)]
+
+
+def benchmarks(corpus_dir, work_dir, workers):
+    with open(path.join(corpus_dir, "corpus.json")) as f:
+        corpus = json.load(f)
+    year = corpus["year"]
+    documents = corpus["documents"]
+    registrations = "{}_Registrations_XML.zip".format(year)
+    reports = "{}_1stQuarter_XML.zip".format(year)
+    senate = "{}_1.zip".format(year)
+    worker_args = ["--workers", str(workers)]
+
+    for command in HOUSE_REGISTRATION_COMMANDS:
+        yield Benchmark(
+            "house_processor {}".format(command),
+            script("house_processor.py")
+            + [command]
+            + worker_args
+            + [path.join(corpus_dir, registrations)],
+            documents[registrations],
+            None,
+        )
+    for command in HOUSE_REPORT_COMMANDS:
+        yield Benchmark(
+            "house_processor {}".format(command),
+            script("house_processor.py")
+            + [command]
+            + worker_args
+            + [path.join(corpus_dir, reports)],
+            documents[reports],
+            None,
+        )
+    for command in SENATE_COMMANDS:
+        yield Benchmark(
+            "senate_processor {}".format(command),
+            script("senate_processor.py")
+            + [command]
+            + worker_args
+            + [path.join(corpus_dir, senate)],
+            documents[senate],
+            None,
+        )
+
+    house_prefix = path.join(work_dir, "{}_Registrations".format(year))
+    yield Benchmark(
+        "house_processor extract_all registrations",
+        script("house_processor.py")
+        + ["extract_all"]
+        + worker_args
+        + ["registrations", house_prefix, path.join(corpus_dir, registrations)],
+        documents[registrations],
+        [
+            "{}_{}.csv".format(house_prefix, table)
+            for table in [
+                "Registrations_Records",
+                "Registrations_Lobbyists",
+                "Registrations_Issues",
+                "Registrations_AffiliatedOrgs",
+                "Registrations_ForeignEntities",
+            ]
+        ],
+    )
+    report_prefix = path.join(work_dir, "{}_1stQuarter".format(year))
+    report_tables = [
+        "Reports",
+        "Reports_Issues",
+        "Reports_Lobbyists",
+        "Reports_Inactive_Lobbyists",
+        "Reports_Inactive_Issues",
+        "Reports_Affiliated_Orgs",
+        "Reports_Inactive_Orgs",
+        "Reports_ForeignEntities",
+        "Reports_Inactive_ForeignEntities",
+    ]
+    yield Benchmark(
+        "house_processor extract_all reports",
+        script("house_processor.py")
+        + ["extract_all"]
+        + worker_args
+        + ["reports", report_prefix, path.join(corpus_dir, reports)],
+        documents[reports],
+        ["{}_{}.csv".format(report_prefix, table) for table in report_tables],
+    )
+    senate_prefix = path.join(work_dir, "{}_1".format(year))
+    senate_tables = [
+        "Filings",
+        "Lobbyists",
+        "Government_Entities",
+        "Issues",
+        "ForeignEntities",
+        "AffiliatedOrgs",
+    ]
+    yield Benchmark(
+        "senate_processor extract_all",
+        script("senate_processor.py")
+        + ["extract_all"]
+        + worker_args
+        + [senate_prefix, path.join(corpus_dir, senate)],
+        documents[senate],
+        ["{}_{}.csv".format(senate_prefix, table) for table in senate_tables],
+    )
+
+    # The stacks read the tables written by extract_all above
+    yield Benchmark(
+        "stack house",
+        script("stack.py")
+        + ["house"]
+        + ["{}_Reports_Lobbyists.csv".format(report_prefix)],
+        None,
+        None,
+    )
+    yield Benchmark(
+        "stack senate",
+        script("stack.py") + ["senate"] + ["{}_Lobbyists.csv".format(senate_prefix)],
+        None,
+        None,
+    )
+
+
+def count_rows(filename):
+    with open(filename, newline="", encoding="utf-8") as f:
+        return sum(1 for row in csv.reader(f)) - 1
+
+
+def run(benchmark, work_dir):
+    """
+    Runs the benchmark in a subprocess, returning its wall clock time and
+    the peak RSS of the process (and any workers it waited for).
+    """
+    stdout_file = path.join(work_dir, "stdout.csv")
+    with open(stdout_file, "wb") as stdout:
+        start = time.perf_counter()
+        process = subprocess.Popen(benchmark.args, stdout=stdout, cwd=REPO)
+        (_, status, usage) = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = status
+    if status != 0:
+        raise click.ClickException("{} failed".format(" ".join(benchmark.args)))
+    outputs = benchmark.outputs or [stdout_file]
+    rows = sum(count_rows(output) for output in outputs)
+    # ru_maxrss is in kilobytes on Linux
+    return (seconds, rows, usage.ru_maxrss / 1024)
+
+
+def rate(count, seconds):
+    return None if count is None else count / seconds
+
+
+@click.command()
+@click.argument("corpus_dir", type=click.Path(exists=True))
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes each processor command parses with",
+)
+@click.option(
+    "--repeat",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Runs per benchmark; the fastest time and largest RSS are kept",
+)
+@click.option("--only", help="Only run benchmarks whose name contains this")
+@click.option("--json", "as_json", is_flag=True, help="Print the results as JSON")
+def cli(corpus_dir, workers, repeat, only, as_json):
+    """
+    Runs every processor command and stack.py over a corpus written by
+    generate.py, reporting documents per second, rows per second and peak
+    RSS for each.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for benchmark in benchmarks(path.abspath(corpus_dir), work_dir, workers):
+            selected = not only or only in benchmark.name
+            # Later benchmarks read the outputs of extract_all, so it always runs
+            if not selected and benchmark.outputs is None:
+                continue
+            runs = [run(benchmark, work_dir) for _ in range(repeat)]
+            if not selected:
+                continue
+            seconds = min(seconds for (seconds, _, _) in runs)
+            rows = runs[0][1]
+            result = Result(
+                benchmark.name,
+                seconds,
+                benchmark.documents,
+                rows,
+                rate(benchmark.documents, seconds),
+                rate(rows, seconds),
+                max(rss for (_, _, rss) in runs),
+            )
+            results.append(result)
+            if not as_json:
+                print(
+                    "{:50} {:8.2f}s {:>10} docs/s {:>10.0f} rows/s {:8.1f} MB".format(
+                        result.name,
+                        result.seconds,
+                        "-"
+                        if result.docs_per_second is None
+                        else "{:.0f}".format(result.docs_per_second),
+                        result.rows_per_second,
+                        result.peak_rss_mb,
+                    )
+                )
+    if as_json:
+        json.dump([result._asdict() for result in results], sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import click
+import sqlite3
+import sys
+import tempfile
+
+import house_processor
+import senate_processor
+
+
+# Rows inserted per executemany call
+BATCH_SIZE = 10000
+
+SQL_TYPES = {"issue_index": "INTEGER", "new": "BOOLEAN"}
+
+
+def source_tables(source):
+    if source == "house_registrations":
+        return house_processor.REGISTRATION_TABLES
+    if source == "house_reports":
+        return house_processor.REPORT_TABLES
+    return senate_processor.TABLES
+
+
+def texts_tables(source, tables):
+    if source == "house_reports":
+        return house_processor.texts_tables(tables)
+    return senate_processor.texts_tables(tables)
+
+
+def extract_rows(source, tables, files, workers, texts=False):
+    """
+    Yields one list of rows per table, for each document (or Senate filing)
+    in the files. With texts, the issue texts are replaced by their hashes
+    and each list is followed by the rows of the texts table.
+    """
+    if source == "house_registrations":
+        return house_processor.extract_tables(
+            house_processor.HouseRegistrationsFile, tables, files, workers
+        )
+    if source == "house_reports":
+        return house_processor.extract_tables(
+            house_processor.HouseReportFile, tables, files, workers, texts=texts
+        )
+    return senate_processor.extract_tables(tables, files, workers, texts=texts)
+
+
+def table_name(source, table):
+    chamber = "senate" if source == "senate" else "house"
+    return "{}_{}".format(chamber, table.name.lower())
+
+
+def create_table_sql(name, table):
+    columns = ", ".join(
+        '"{}" {}'.format(column, SQL_TYPES.get(column, "TEXT"))
+        for column in table.columns
+    )
+    return 'CREATE TABLE IF NOT EXISTS "{}" ({})'.format(name, columns)
+
+
+def create_index_sql(name, table):
+    # The first column of every table is the id of its filing or document
+    return 'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(
+        name, table.columns[0]
+    )
+
+
+def load_sqlite(database, source, tables, rows):
+    """
+    Replaces the tables in a SQLite database with the rows, inserted in
+    batches, and creates the indexes once all of the rows are loaded, all
+    in a single transaction, so loading the same files again gives the same
+    tables and a failed load leaves the database as it was.
+    """
+    names = [table_name(source, table) for table in tables]
+    inserts = [
+        'INSERT INTO "{}" VALUES ({})'.format(
+            name, ", ".join("?" for _ in table.columns)
+        )
+        for (name, table) in zip(names, tables)
+    ]
+    connection = sqlite3.connect(database)
+    try:
+        # The transaction makes the load atomic, so the database only has to
+        # be synced when it commits
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            # Table definitions aren't part of the transaction unless it's
+            # begun before them
+            connection.execute("BEGIN")
+            for (name, table) in zip(names, tables):
+                connection.execute('DROP TABLE IF EXISTS "{}"'.format(name))
+                connection.execute(create_table_sql(name, table))
+            batches = [[] for table in tables]
+            for table_rows in rows:
+                for (insert, batch, new_rows) in zip(inserts, batches, table_rows):
+                    batch.extend(new_rows)
+                    if len(batch) >= BATCH_SIZE:
+                        connection.executemany(insert, batch)
+                        del batch[:]
+            for (insert, batch) in zip(inserts, batches):
+                connection.executemany(insert, batch)
+            for (name, table) in zip(names, tables):
+                connection.execute(create_index_sql(name, table))
+    finally:
+        connection.close()
+
+
+def copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def write_postgres(output, source, tables, rows):
+    """
+    Writes a psql script that replaces the tables, loads the rows with COPY
+    in text format and then creates the indexes. Rows are spooled to
+    temporary files so every table is extracted in the same pass.
+    """
+    names = [table_name(source, table) for table in tables]
+    spools = [
+        tempfile.TemporaryFile("w+", encoding="utf-8", newline="") for table in tables
+    ]
+    try:
+        for table_rows in rows:
+            for (spool, new_rows) in zip(spools, table_rows):
+                for row in new_rows:
+                    spool.write("\t".join(map(copy_value, row)) + "\n")
+        for (name, table, spool) in zip(names, tables, spools):
+            output.write('DROP TABLE IF EXISTS "{}";\n'.format(name))
+            output.write(create_table_sql(name, table) + ";\n")
+            output.write(
+                'COPY "{}" ({}) FROM STDIN;\n'.format(
+                    name, ", ".join('"{}"'.format(column) for column in table.columns)
+                )
+            )
+            spool.seek(0)
+            for line in spool:
+                output.write(line)
+            output.write("\\.\n")
+        for (name, table) in zip(names, tables):
+            output.write(create_index_sql(name, table) + ";\n")
+    finally:
+        for spool in spools:
+            spool.close()
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option(
+    "--database", type=click.Path(), help="SQLite database to load the tables into"
+)
+@click.option(
+    "--postgres",
+    is_flag=True,
+    help="Write a psql script that loads the tables with COPY to stdout instead",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes to parse documents with",
+)
+@click.option(
+    "--dedup-texts",
+    is_flag=True,
+    help="Load each distinct issue text once into a texts table, keyed by the "
+    "hash the issue rows hold",
+)
+@click.argument(
+    "source", type=click.Choice(["house_registrations", "house_reports", "senate"])
+)
+@click.argument("files", nargs=-1, type=click.Path())
+def load(database, postgres, workers, dedup_texts, source, files):
+    if postgres == (database is not None):
+        raise click.UsageError("Specify exactly one of --database or --postgres")
+    if dedup_texts and source == "house_registrations":
+        raise click.UsageError("--dedup-texts doesn't apply to house_registrations")
+    tables = source_tables(source)
+    rows = extract_rows(source, tables, files, workers, dedup_texts)
+    if dedup_texts:
+        tables = texts_tables(source, tables)
+    if postgres:
+        output = open(sys.stdout.fileno(), "w", encoding="utf-8", closefd=False)
+        with output:
+            write_postgres(output, source, tables, rows)
+    else:
+        load_sqlite(database, source, tables, rows)
+
+
+if __name__ == "__main__":
+    cli()
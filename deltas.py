@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import hashlib
+import json
+
+import stats
+from writers import extension, file_writer, write_rows
+
+
+CHANGE_COLUMNS = ["filing_id", "change", "hash"]
+
+
+def filing_rows(document_rows):
+    """
+    Regroups the rows the processors' extract_tables yield, one list of rows
+    per table for each document or batch of filings, into
+    (filing id, rows for each table) for each filing. The first column of
+    every table is the id of its filing.
+    """
+    for rows in document_rows:
+        filings = OrderedDict()
+        for (i, table_rows) in enumerate(rows):
+            for row in table_rows:
+                if row[0] not in filings:
+                    filings[row[0]] = [[] for _ in rows]
+                filings[row[0]][i].append(row)
+        for (filing_id, filing_table_rows) in filings.items():
+            yield (filing_id, filing_table_rows)
+
+
+def rows_hash(rows):
+    return hashlib.sha1(
+        json.dumps(rows, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def filing_hashes(document_rows):
+    """
+    Yields (filing id, hash, rows for each table) for each filing, hashing
+    its rows as they are extracted
+    """
+    for (filing_id, rows) in filing_rows(document_rows):
+        yield (filing_id, rows_hash(rows), rows)
+
+
+def diff_snapshots(old_rows, new_rows, writers, changes):
+    """
+    Compares two snapshots of the same source, given as the rows yielded by
+    extract_tables for each, and writes the rows of the filings that were
+    inserted or changed in the new one with writers. Each inserted, changed
+    and removed filing is written to changes as CHANGE_COLUMNS. Filings are
+    matched by id and compared by the hash of all of their rows, so only the
+    hashes of the old snapshot are kept in memory.
+    """
+    old_hashes = OrderedDict(
+        (filing_id, digest) for (filing_id, digest, _) in filing_hashes(old_rows)
+    )
+    seen = set()
+    for (filing_id, digest, rows) in filing_hashes(new_rows):
+        seen.add(filing_id)
+        previous = old_hashes.get(filing_id)
+        if previous == digest:
+            stats.count("unchanged_filings")
+            continue
+        change = "inserted" if previous is None else "changed"
+        stats.count("{}_filings".format(change))
+        write_rows(writers, rows)
+        write_rows([changes], [[[filing_id, change, digest]]])
+    removed = [
+        [filing_id, "removed", digest]
+        for (filing_id, digest) in old_hashes.items()
+        if filing_id not in seen
+    ]
+    stats.count("removed_filings", len(removed))
+    write_rows([changes], [removed])
+
+
+def export_diff(tables, old_rows, new_rows, output_prefix, output_format="csv"):
+    """
+    Writes the rows of the inserted and changed filings for each table to
+    <output_prefix>_<table name>.<format>, and the list of changes to
+    <output_prefix>_Changes.<format>
+    """
+    writers = []
+    try:
+        for table in tables:
+            writers.append(
+                file_writer(
+                    "{}_{}{}".format(
+                        output_prefix, table.name, extension(output_format)
+                    ),
+                    table.columns,
+                    output_format,
+                )
+            )
+        changes = file_writer(
+            "{}_Changes{}".format(output_prefix, extension(output_format)),
+            CHANGE_COLUMNS,
+            output_format,
+        )
+        writers.append(changes)
+        diff_snapshots(old_rows, new_rows, writers[:-1], changes)
+    finally:
+        for writer in writers:
+            writer.close()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+from os import path
+import os
+import pickle
+import tempfile
+import zlib
+
+from sources import source_hash, source_key
+import stats
+
+
+# Bump this whenever extraction changes in a way that doesn't change the
+# tables' columns, so documents cached by older code are parsed again
+CACHE_VERSION = 2
+
+# Default size cap, in MB
+DEFAULT_MAX_SIZE = 4096
+
+INDEX_NAME = "index"
+
+
+class DocumentCache:
+    """
+    An on-disk store of the rows extracted from each document for every
+    table of its kind, so a document only has to be parsed once no matter
+    which tables are asked for later.
+
+    Entries are pickled and compressed, and keyed by a hash of the document's
+    contents, where it came from, and the names and columns of the tables, so
+    changing a table invalidates them. Entries are written atomically, so
+    worker processes can share a cache. Reading an entry marks it as recently
+    used, and evict() removes the least recently used entries once the cache
+    is larger than max_bytes.
+
+    The size of each entry written is appended to an index file, so evict()
+    can total the cache without walking the directory, and only looks at the
+    entries themselves when some have to go.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_SIZE << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = path.join(directory, INDEX_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, kind, tables, source):
+        description = [
+            CACHE_VERSION,
+            kind,
+            [(table.name, table.columns) for table in tables],
+            source_key(source),
+            source_hash(source),
+        ]
+        return hashlib.sha1(json.dumps(description).encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        filename = self.entry_path(key)
+        try:
+            with open(filename, "rb") as f:
+                value = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            stats.count("cache_misses")
+            return None
+        # The modification time records when the entry was last used
+        os.utime(filename)
+        stats.count("cache_hits")
+        return value
+
+    def put(self, key, value):
+        filename = self.entry_path(key)
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)
+        (fd, temp) = tempfile.mkstemp(dir=path.dirname(filename), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, filename)
+        # Lines this short are appended whole, even by concurrent workers
+        with open(self.index_path, "a") as f:
+            f.write("{} {}\n".format(key, len(data)))
+
+    def read_index(self):
+        """
+        Returns the size of each entry in the index, which is built from the
+        entries on disk if there isn't one yet
+        """
+        if not path.exists(self.index_path):
+            self.write_index(self.walk_entries())
+        sizes = {}
+        with open(self.index_path) as f:
+            for line in f:
+                (key, _, size) = line.partition(" ")
+                # A later line for the same key replaced its entry
+                sizes[key] = int(size)
+        return sizes
+
+    def write_index(self, sizes):
+        (fd, temp) = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            for (key, size) in sizes.items():
+                f.write("{} {}\n".format(key, size))
+        os.replace(temp, self.index_path)
+
+    def walk_entries(self):
+        sizes = {}
+        for (directory, _, files) in os.walk(self.directory):
+            if directory == self.directory:
+                continue
+            for name in files:
+                if not name.endswith(".tmp"):
+                    sizes[name] = path.getsize(path.join(directory, name))
+        return sizes
+
+    def evict(self):
+        sizes = self.read_index()
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        # Entries removed by hand are dropped from the index
+        entries = []
+        for key in list(sizes):
+            try:
+                entries.append((os.stat(self.entry_path(key)).st_mtime, key))
+            except FileNotFoundError:
+                total -= sizes.pop(key)
+        for (_, key) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(self.entry_path(key))
+            total -= sizes.pop(key)
+        self.write_index(sizes)
+
+    def extract(self, kind, tables, all_tables, parse, source):
+        """
+        Returns (file_id, error, rows) for the tables, like the processors'
+        extract functions. On a miss the source is parsed with
+        parse(all_tables, source), and the rows for every table are cached.
+        parse can return None instead for a document it skipped, which isn't
+        cached, and then so does extract.
+        """
+        key = self.key(kind, all_tables, source)
+        cached = self.get(key)
+        if cached is None:
+            parsed = parse(all_tables, source)
+            if parsed is None:
+                return None
+            (_, err, rows) = parsed
+            cached = (None if err is None else str(err), rows)
+            self.put(key, cached)
+        (message, rows) = cached
+        if message is not None:
+            return source.file_id, ValueError(message), None
+        names = [table.name for table in all_tables]
+        return (
+            source.file_id,
+            None,
+            [rows[names.index(table.name)] for table in tables],
+        )
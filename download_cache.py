@@ -0,0 +1,116 @@
+import hashlib
+import json
+from os import path
+import os
+import threading
+
+
+CACHE_FILE = "download_cache.json"
+
+
+def sha256_file(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadCache:
+    """
+    Records the ETag, Last-Modified, size, modification time and SHA-256 of
+    each downloaded file, keyed by its path relative to the data directory,
+    so later runs can make conditional requests and tell whether the bytes
+    actually changed. Entries may be updated from several download threads
+    at once.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.filename = path.join(data_dir, CACHE_FILE)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path.exists(self.filename):
+            with open(self.filename) as f:
+                self.entries = json.load(f)
+
+    def get(self, key):
+        # Entries for files that have since been deleted are ignored
+        if not path.exists(path.join(self.data_dir, key)):
+            return None
+        with self.lock:
+            return self.entries.get(key)
+
+    def conditional_headers(self, key):
+        entry = self.get(key)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def matches(self, key, response):
+        """
+        Returns True if the response headers show the remote file is the one
+        recorded for key, without reading the body.
+        """
+        entry = self.get(key)
+        if entry is None:
+            return False
+        if response.status_code == 304:
+            return True
+        etag = response.headers.get("ETag")
+        if etag and entry.get("etag"):
+            return etag == entry["etag"]
+        last_modified = response.headers.get("Last-Modified")
+        size = response.headers.get("Content-Length")
+        return (
+            last_modified is not None
+            and last_modified == entry.get("last_modified")
+            and size is not None
+            and int(size) == entry.get("size")
+        )
+
+    def sha256(self, key):
+        """
+        Returns the SHA-256 of the local file for key, using the recorded one
+        when the file still has the recorded size and modification time.
+        """
+        filename = path.join(self.data_dir, key)
+        if not path.exists(filename):
+            return None
+        entry = self.get(key)
+        info = os.stat(filename)
+        if (
+            entry is not None
+            and entry.get("size") == info.st_size
+            and entry.get("mtime_ns") == info.st_mtime_ns
+        ):
+            return entry["sha256"]
+        return sha256_file(filename)
+
+    def update(self, key, etag, last_modified, size, sha256):
+        """
+        Records the download of key, which must be in place by now, so the
+        local file's modification time can be recorded with it
+        """
+        filename = path.join(self.data_dir, key)
+        mtime_ns = os.stat(filename).st_mtime_ns if path.exists(filename) else None
+        with self.lock:
+            previous = self.entries.get(key, {})
+            self.entries[key] = {
+                "etag": etag or previous.get("etag"),
+                "last_modified": last_modified or previous.get("last_modified"),
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "sha256": sha256,
+            }
+
+    def save(self):
+        with self.lock:
+            with open(self.filename + ".tmp", "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(self.filename + ".tmp", self.filename)
@@ -0,0 +1,103 @@
+def local_name(element):
+    # Match on the local name b/c some documents have a namespace
+    return element.tag.rpartition("}")[2]
+
+
+def is_element(element):
+    # Comments and processing instructions don't have a string tag
+    return isinstance(element.tag, str)
+
+
+# objectify read these texts as booleans, which were written as True and
+# False, and the output has kept that format
+BOOLEAN_TEXTS = {"true": "True", "false": "False"}
+
+
+def element_text(element):
+    """
+    Returns the stripped text of an element, as str() of the objectify
+    element did: numbers are kept as written, but the booleans true and
+    false become True and False
+    """
+    text = element.text or ""
+    return BOOLEAN_TEXTS.get(text, text.strip())
+
+
+def child_texts(element, tag):
+    """
+    Returns the text of every direct child of element with the tag
+    """
+    return [
+        element_text(child)
+        for child in element.iterchildren()
+        if is_element(child) and local_name(child) == tag
+    ]
+
+
+def find_child(element, tag):
+    for child in element.iterchildren():
+        if is_element(child) and local_name(child) == tag:
+            return child
+    return None
+
+
+def text_map(element):
+    """
+    Maps the tag of each direct child of element to its text, keeping the
+    first of any repeated tags, in a single walk of the children.
+    """
+    texts = {}
+    if element is None:
+        return texts
+    for child in element.iterchildren():
+        if is_element(child):
+            texts.setdefault(local_name(child), element_text(child))
+    return texts
+
+
+def attribute_map(element):
+    return {} if element is None else dict(element.attrib)
+
+
+class Fields:
+    """
+    Extracts a record from an element, driven by a list of (column, path)
+    pairs.
+
+    A path is the tag of a child element, whose text is the value, or
+    "@name" for an attribute. Either can be prefixed with "parent/" to read
+    from a child element instead, and "a|b" reads b when there is no a. The
+    children or attributes of each element are read into a map once per
+    record, rather than searched once per column.
+    """
+
+    def __init__(self, fields):
+        self.columns = [column for (column, _) in fields]
+        self.paths = []
+        for (_, path) in fields:
+            (parent, _, name) = path.rpartition("/")
+            is_attribute = name.startswith("@")
+            names = name.lstrip("@").split("|")
+            self.paths.append((parent, is_attribute, names))
+
+    def extract(self, element, missing=None):
+        maps = {}
+        values = []
+        for (parent, is_attribute, names) in self.paths:
+            key = (parent, is_attribute)
+            if key not in maps:
+                source = find_child(element, parent) if parent else element
+                maps[key] = attribute_map(source) if is_attribute else text_map(source)
+            values.append(
+                next((maps[key][name] for name in names if name in maps[key]), missing)
+            )
+        return values
+
+    def element_paths(self, column):
+        """
+        Returns the paths, as tuples of tag names, of the child elements the
+        column can be read from
+        """
+        (parent, _, names) = self.paths[self.columns.index(column)]
+        prefix = tuple(parent.split("/")) if parent else ()
+        return [prefix + (name,) for name in names]
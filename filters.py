@@ -0,0 +1,123 @@
+import click
+from collections import namedtuple
+
+from fields import element_text, local_name
+
+
+# A --where condition: the column must have exactly this value
+Condition = namedtuple("Condition", ["column", "value"])
+
+
+def parse_conditions(ctx, param, values):
+    conditions = []
+    for value in values:
+        (column, equals, expected) = value.partition("=")
+        if not equals or not column:
+            raise click.BadParameter(
+                "{} should look like column=value".format(value), ctx, param
+            )
+        conditions.append(Condition(column.strip(), expected.strip()))
+    return conditions
+
+
+def parse_columns(ctx, param, value):
+    if value is None:
+        return None
+    return [column.strip() for column in value.split(",") if column.strip()]
+
+
+def check_columns(columns, allowed, description):
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise click.UsageError(
+            "Unknown {} {}. Expected one of {}".format(
+                description, ", ".join(unknown), ", ".join(allowed)
+            )
+        )
+
+
+def filter_rows(columns, rows, conditions):
+    """
+    Keeps the rows that match every condition on one of the columns
+    """
+    checks = [
+        (columns.index(condition.column), condition.value)
+        for condition in conditions
+        if condition.column in columns
+    ]
+    if not checks:
+        return rows
+    return [
+        row
+        for row in rows
+        if all(str(row[index]) == value for (index, value) in checks)
+    ]
+
+
+def project_rows(columns, rows, selected):
+    indexes = [columns.index(column) for column in selected]
+    return [[row[index] for index in indexes] for row in rows]
+
+
+def select_rows(tables, rows, conditions, columns=None):
+    """
+    Filters the rows for each table by the conditions on its columns, then
+    projects them onto columns if they were given
+    """
+    rows = [
+        filter_rows(table.columns, table_rows, conditions)
+        for (table, table_rows) in zip(tables, rows)
+    ]
+    if columns is None:
+        return rows
+    return [
+        project_rows(table.columns, table_rows, columns)
+        for (table, table_rows) in zip(tables, rows)
+    ]
+
+
+def element_path(element):
+    """
+    Returns the local names of element and its ancestors, without the root
+    """
+    names = []
+    while element.getparent() is not None:
+        names.append(local_name(element))
+        element = element.getparent()
+    return tuple(reversed(names))
+
+
+# Checks one condition during a prescan. single is True for values that
+# only appear once in a document, so the first one seen decides the check;
+# otherwise any matching element does.
+Check = namedtuple("Check", ["paths", "value", "single"])
+
+
+def prescan(stream, checks, recover=False):
+    """
+    Returns True if the document in stream passes every check, reading only
+    as far as it needs to. Elements are matched by their path from the root,
+    so tags that are reused deeper in the document don't count. recover
+    should be set as it is for the parser that reads the whole document, so
+    that malformed documents are treated the same by both.
+    """
+    if not checks:
+        return True
+    from lxml import etree
+
+    tags = set("{*}" + path[-1] for check in checks for path in check.paths)
+    results = [None for check in checks]
+    context = etree.iterparse(stream, events=("end",), tag=tags, recover=recover)
+    for (_, element) in context:
+        path = element_path(element)
+        for (i, check) in enumerate(checks):
+            if results[i] is not None or path not in check.paths:
+                continue
+            if element_text(element) == check.value:
+                results[i] = True
+            elif check.single:
+                return False
+        if all(results):
+            return True
+        element.clear()
+    return all(results)
@@ -1,15 +1,221 @@
 #!/usr/bin/env python3
 
 from requests_html import HTMLSession
+from concurrent.futures import ThreadPoolExecutor
+import json
+from os import path
+import os
+import re
 import sys
 import click
 import datetime
+import requests
+
+from download_cache import DownloadCache, sha256_file
 
 DOWNLOAD_URL = "http://disclosures.house.gov/ld/LDDownload.aspx"
+SENATE_DOWNLOAD_URL = "http://soprweb.senate.gov/downloads/"
+
+# Bytes read from the response at a time when streaming a download
+CHUNK_SIZE = 1 << 20
 
 session = HTMLSession()
 
 
+def form_data(page, file_value):
+    # Get the CSRF Protection Properties
+    return {
+        "__VIEWSTATEGENERATOR": page.html.find(
+            "#__VIEWSTATEGENERATOR", first=True
+        ).attrs["value"],
+        "__VIEWSTATE": page.html.find("#__VIEWSTATE", first=True).attrs["value"],
+        "__EVENTVALIDATION": page.html.find("#__EVENTVALIDATION", first=True).attrs[
+            "value"
+        ],
+        "selFilesXML": file_value,
+        "btnDownloadXML": "Download",
+    }
+
+
+def file_values(page):
+    return [e.attrs["value"] for e in page.html.xpath("//option")]
+
+
+def house_filename(file_value):
+    # "2018 Registrations ..." -> 2018_Registrations_XML.zip, as used by the Makefile
+    (year, reg, rest) = file_value.split(" ", maxsplit=2)
+    return "{}_{}_XML.zip".format(year, reg)
+
+
+def read_partial_info(partial):
+    try:
+        with open(partial + ".json") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_partial_info(partial, info):
+    with open(partial + ".json", "w") as f:
+        json.dump(info, f)
+
+
+def remove_partial(partial):
+    for filename in [partial, partial + ".json"]:
+        if path.exists(filename):
+            os.remove(filename)
+
+
+def if_range(info):
+    # Weak ETags can't be used with If-Range
+    etag = info.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return info.get("last_modified")
+
+
+def content_range(response):
+    """
+    Returns the first byte and the total length from the response's
+    Content-Range header, either of which may be None
+    """
+    match = re.match(
+        r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)", response.headers.get("Content-Range", "")
+    )
+    if match is None:
+        return (None, None)
+    (first, length) = match.groups()
+    return (
+        None if first is None else int(first),
+        None if length == "*" else int(length),
+    )
+
+
+def response_length(response):
+    # Content-Length counts the encoded bytes, not the ones iter_content yields
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    length = response.headers.get("Content-Length")
+    return None if length is None else int(length)
+
+
+def download_to(http, method, url, data_dir, key, cache, data=None, force=False):
+    """
+    Streams the response to data_dir/key, which is only replaced once the
+    download completes and its bytes differ from the local file, so its
+    timestamp only changes when the contents do. Unless force is set, the
+    request is conditional on the ETag/Last-Modified recorded in the cache.
+
+    A partial download left by an earlier attempt is resumed with a Range
+    request, made conditional with If-Range on the validator recorded with
+    the partial, so a server whose file has changed since sends the whole new
+    file instead. Partials without a validator are discarded.
+
+    Returns True if the local file was replaced.
+    """
+    destination = path.join(data_dir, key)
+    partial = destination + ".part"
+    info = read_partial_info(partial) if path.exists(partial) else None
+    validator = None if info is None else if_range(info)
+    if validator is None:
+        remove_partial(partial)
+        headers = {} if force else cache.conditional_headers(key)
+    else:
+        headers = {
+            "Range": "bytes={}-".format(path.getsize(partial)),
+            "If-Range": validator,
+        }
+    with http.request(method, url, data=data, headers=headers, stream=True) as r:
+        if r.status_code == 304:
+            return False
+        if r.status_code == 416 and validator is not None:
+            # The partial may already have every byte; if that can't be
+            # confirmed, it's started again
+            (_, length) = content_range(r)
+            if length is None:
+                length = info.get("length")
+            if length != path.getsize(partial):
+                remove_partial(partial)
+                return download_to(http, method, url, data_dir, key, cache, data, force)
+        else:
+            r.raise_for_status()
+            if r.status_code == 206:
+                (first, length) = content_range(r)
+                if validator is None or first != path.getsize(partial):
+                    remove_partial(partial)
+                    raise IOError("Unexpected Content-Range from {}".format(url))
+                mode = "ab"
+            else:
+                # A 200 is the whole file, so any partial is replaced
+                length = response_length(r)
+                mode = "wb"
+            info = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "length": length,
+            }
+            write_partial_info(partial, info)
+            with open(partial, mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        size = path.getsize(partial)
+        if info["length"] is not None and size != info["length"]:
+            # Left in place to be resumed
+            raise IOError("Incomplete download of {}".format(url))
+        sha256 = sha256_file(partial)
+        changed = sha256 != cache.sha256(key)
+        if changed:
+            os.replace(partial, destination)
+        else:
+            os.remove(partial)
+        os.remove(partial + ".json")
+        cache.update(key, info["etag"], info["last_modified"], size, sha256)
+    return changed
+
+
+def worker_session(page_session):
+    """
+    Returns a new session with the cookies and headers of page_session. The
+    form tokens scraped from a page are only valid with the session that
+    loaded it, and sessions can't be shared between threads.
+    """
+    http = requests.Session()
+    http.headers.update(page_session.headers)
+    http.cookies.update(page_session.cookies)
+    return http
+
+
+def sync_house_file(url, data, page_session, data_dir, key, cache, force):
+    with worker_session(page_session) as http:
+        changed = download_to(http, "POST", url, data_dir, key, cache, data, force)
+    return key if changed else None
+
+
+def sync_senate_file(url, data_dir, key, cache, force):
+    with requests.Session() as http:
+        try:
+            changed = download_to(http, "GET", url, data_dir, key, cache, None, force)
+        except requests.HTTPError as err:
+            # Quarters that haven't been published yet don't exist
+            if err.response.status_code == 404:
+                return None
+            raise
+    return key if changed else None
+
+
+def house_file_changed(url, data, page_session, key, cache):
+    """
+    Checks whether a House file differs from the cached copy using only the
+    response headers; the body is never read.
+    """
+    with worker_session(page_session) as http:
+        headers = cache.conditional_headers(key)
+        with http.post(url, data=data, headers=headers, stream=True) as r:
+            if r.status_code != 304:
+                r.raise_for_status()
+            return not cache.matches(key, r)
+
+
 @click.group()
 def cli():
     pass
@@ -47,47 +253,131 @@ def download(year, document, file):
 
     r = session.get(DOWNLOAD_URL)
 
-    # Get the CSRF Protection Properties
-    view_state_generator = r.html.find("#__VIEWSTATEGENERATOR", first=True).attrs[
-        "value"
-    ]
-    view_state = r.html.find("#__VIEWSTATE", first=True).attrs["value"]
-    event_validation = r.html.find("#__EVENTVALIDATION", first=True).attrs["value"]
-
     # Find The File
-    files = [
-        e.attrs["value"]
-        for e in r.html.xpath("//option")
-        if formatted_filename in e.attrs["value"]
-    ]
+    files = [value for value in file_values(r) if formatted_filename in value]
     if len(files) == 0:
         raise ValueError("Could not find {}".format(formatted_filename))
     if len(files) > 1:
         raise ValueError("Duplicate documents for {}".format(formatted_filename))
 
-    with session.post(
-        DOWNLOAD_URL,
-        data={
-            "__VIEWSTATEGENERATOR": view_state_generator,
-            "__VIEWSTATE": view_state,
-            "__EVENTVALIDATION": event_validation,
-            "selFilesXML": files[0],
-            "btnDownloadXML": "Download",
-        },
-        stream=True,
-    ) as dl:
-        for chunk in dl.iter_content(chunk_size=128):
+    with session.post(DOWNLOAD_URL, data=form_data(r, files[0]), stream=True) as dl:
+        for chunk in dl.iter_content(chunk_size=CHUNK_SIZE):
             sys.stdout.buffer.write(chunk)
 
 
 @cli.command()
-def list():
-    r = session.get(DOWNLOAD_URL)
-    files = [e.attrs["value"] for e in r.html.xpath("//option")]
+@click.option(
+    "--changed",
+    is_flag=True,
+    help="Only list files that differ from the ones in data-dir",
+)
+@click.option("--data-dir", default="data/files", type=click.Path())
+@click.option(
+    "--connections",
+    default=4,
+    type=click.IntRange(1, None),
+    help="Number of files to check at once",
+)
+@click.option("--house-url", default=DOWNLOAD_URL)
+def list(changed, data_dir, connections, house_url):
+    r = session.get(house_url)
+    files = file_values(r)
+    if changed:
+        cache = DownloadCache(data_dir)
+        with ThreadPoolExecutor(connections) as executor:
+            is_changed = executor.map(
+                lambda file: house_file_changed(
+                    house_url,
+                    form_data(r, file),
+                    session,
+                    path.join("house", house_filename(file)),
+                    cache,
+                ),
+                files,
+            )
+            files = [file for (file, c) in zip(files, is_changed) if c]
     for file in files:
         (year, reg, rest) = file.split(" ", maxsplit=2)
         print("{}\t{}".format(year, reg))
 
 
+@cli.command()
+@click.option("--data-dir", default="data/files", type=click.Path())
+@click.option(
+    "--connections",
+    default=4,
+    type=click.IntRange(1, None),
+    help="Number of files to download at once",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Download every file, rather than only the ones that changed",
+)
+@click.option("--house/--no-house", default=True, help="Download the House files")
+@click.option("--senate/--no-senate", default=True, help="Download the Senate files")
+@click.option(
+    "--first-senate-year",
+    default=1999,
+    type=int,
+    help="First year of Senate files to download",
+)
+@click.option("--house-url", default=DOWNLOAD_URL)
+@click.option("--senate-url", default=SENATE_DOWNLOAD_URL)
+def sync(
+    data_dir,
+    connections,
+    force,
+    house,
+    senate,
+    first_senate_year,
+    house_url,
+    senate_url,
+):
+    """
+    Downloads every House and Senate file that has changed into data-dir,
+    several at a time, and prints the paths of the files that were replaced.
+    """
+    cache = DownloadCache(data_dir)
+    jobs = []
+    if house:
+        os.makedirs(path.join(data_dir, "house"), exist_ok=True)
+        # The form tokens are scraped once and reused for every file
+        r = session.get(house_url)
+        for value in file_values(r):
+            key = path.join("house", house_filename(value))
+            jobs.append(
+                (sync_house_file, (house_url, form_data(r, value), session), key)
+            )
+    if senate:
+        os.makedirs(path.join(data_dir, "senate"), exist_ok=True)
+        for year in range(first_senate_year, datetime.datetime.now().year + 1):
+            for quarter in range(1, 5):
+                name = "{}_{}.zip".format(year, quarter)
+                key = path.join("senate", name)
+                jobs.append((sync_senate_file, (senate_url + name,), key))
+
+    failed = False
+    try:
+        with ThreadPoolExecutor(connections) as executor:
+            futures = [
+                executor.submit(func, *args, data_dir, key, cache, force)
+                for (func, args, key) in jobs
+            ]
+            for future in futures:
+                try:
+                    key = future.result()
+                except (requests.RequestException, OSError) as err:
+                    print("Download failed. Error: {}".format(err), file=sys.stderr)
+                    failed = True
+                    continue
+                if key is not None:
+                    print(path.join(data_dir, key))
+    finally:
+        cache.save()
+    if failed:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     cli()
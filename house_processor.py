@@ -1,146 +1,188 @@
 #!/usr/bin/env python3
 
 import click
-import tablib
-from lxml import objectify, etree
-from os import path
-import os
-from pathlib import Path
 from collections import namedtuple
+from functools import partial
 import sys
-import zipfile
 
-
-LOBBYIST_COLUMNS = ["first_name", "last_name", "suffix", "covered_position", "new"]
+from fields import Fields, child_texts, find_child, is_element, local_name
+import deltas
+from document_cache import DEFAULT_MAX_SIZE, DocumentCache
+from filters import (
+    Check,
+    check_columns,
+    filter_rows,
+    parse_columns,
+    parse_conditions,
+    prescan,
+    select_rows,
+)
+import incremental
+from shards import ShardWriter
+import stats
+from texts import TEXT_COLUMNS, hashed_columns, intern_texts, unique_texts
+from sources import list_sources, map_sources, open_source
+from writers import FORMATS, extension, file_writer, stdout_writer, write_rows
+
+
+LOBBYIST_FIELDS = Fields(
+    [
+        ("first_name", "lobbyistFirstName"),
+        ("last_name", "lobbyistLastName"),
+        ("suffix", "lobbyistSuffix"),
+        ("covered_position", "coveredPosition"),
+        ("new", "lobbyistNew"),
+    ]
+)
+LOBBYIST_COLUMNS = LOBBYIST_FIELDS.columns
 Lobbyist = namedtuple("Lobbyist", LOBBYIST_COLUMNS)
 
-REGISTRATION_COLUMNS = [
-    "reg_type",
-    "organization_name",
-    "prefix",
-    "first_name",
-    "last_name",
-    "address1",
-    "address2",
-    "city",
-    "state",
-    "zip",
-    "zipext",
-    "country",
-    "principal_city",
-    "principal_state",
-    "principal_zip",
-    "principal_zipext",
-    "principal_country",
-    "contact_intl_phone",
-    "registrant_general_description",
-    "self_select",
-    "client_name",
-    "client_address",
-    "client_city",
-    "client_state",
-    "client_zip",
-    "client_zipext",
-    "client_country",
-    "prin_client_city",
-    "prin_client_state",
-    "prin_client_zip",
-    "prin_client_zipext",
-    "prin_client_country",
-    "client_general_description",
-    "senate_id",
-    "house_id",
-    "specific_issues",
-    "affiliated_url",
-    "report_year",
-    "report_type",
-    "effective_date",
-    "printed_name",
-    "signed_date",
-]
+REGISTRATION_FIELDS = Fields(
+    [
+        ("reg_type", "regType"),
+        ("organization_name", "organizationName"),
+        ("prefix", "prefix"),
+        ("first_name", "firstName"),
+        ("last_name", "lastName"),
+        ("address1", "address1"),
+        ("address2", "address2"),
+        ("city", "city"),
+        ("state", "state"),
+        ("zip", "zip"),
+        ("zipext", "zipext"),
+        ("country", "country"),
+        ("principal_city", "principal_city"),
+        ("principal_state", "principal_state"),
+        ("principal_zip", "principal_zip"),
+        ("principal_zipext", "principal_zipext"),
+        ("principal_country", "principal_country"),
+        ("contact_intl_phone", "contactIntlPhone"),
+        ("registrant_general_description", "registrantGeneralDescription"),
+        ("self_select", "selfSelect"),
+        ("client_name", "clientName"),
+        ("client_address", "clientAddress"),
+        ("client_city", "clientCity"),
+        ("client_state", "clientState"),
+        ("client_zip", "clientZip"),
+        ("client_zipext", "clientZipExt"),
+        ("client_country", "clientCountry"),
+        ("prin_client_city", "prinClientCity"),
+        ("prin_client_state", "prinClientState"),
+        ("prin_client_zip", "prinClientZip"),
+        ("prin_client_zipext", "prinClientZipExt"),
+        ("prin_client_country", "prinClientCountry"),
+        ("client_general_description", "clientGeneralDescription"),
+        ("senate_id", "senateID"),
+        ("house_id", "houseID"),
+        ("specific_issues", "specific_issues"),
+        ("affiliated_url", "affiliatedUrl"),
+        ("report_year", "reportYear"),
+        ("report_type", "reportType"),
+        ("effective_date", "effectiveDate"),
+        ("printed_name", "printedName"),
+        ("signed_date", "signedDate"),
+    ]
+)
+REGISTRATION_COLUMNS = REGISTRATION_FIELDS.columns
 Registration = namedtuple("Registration", REGISTRATION_COLUMNS)
 
-AFFILIATED_ORG_COLUMNS = [
-    "name",
-    "address",
-    "city",
-    "state",
-    "zip",
-    "country",
-    "prin_org_city",
-    "prin_org_state",
-    "prin_org_country",
-]
+AFFILIATED_ORG_FIELDS = Fields(
+    [
+        ("name", "affiliatedOrgName"),
+        ("address", "affiliatedOrgAddress"),
+        ("city", "affiliatedOrgCity"),
+        ("state", "affiliatedOrgState"),
+        ("zip", "affiliatedOrgZip"),
+        ("country", "affiliatedOrgCountry"),
+        ("prin_org_city", "affiliatedPrinOrgCity"),
+        ("prin_org_state", "affiliatedPrinOrgState"),
+        ("prin_org_country", "affiliatedPrinOrgCountry"),
+    ]
+)
+AFFILIATED_ORG_COLUMNS = AFFILIATED_ORG_FIELDS.columns
 AffiliatedOrg = namedtuple("AffiliatedOrg", AFFILIATED_ORG_COLUMNS)
 
-FOREIGN_ENTITY_COLUMNS = [
-    "name",
-    "address",
-    "city",
-    "state",
-    "country",
-    "prin_city",
-    "prin_state",
-    "prin_country",
-    "contribution",
-    "ownership_percentage",
-]
+FOREIGN_ENTITY_FIELDS = Fields(
+    [
+        ("name", "name"),
+        ("address", "address"),
+        ("city", "city"),
+        ("state", "state"),
+        ("country", "country"),
+        ("prin_city", "prinCity"),
+        ("prin_state", "prinState"),
+        ("prin_country", "prinCountry"),
+        ("contribution", "contribution"),
+        ("ownership_percentage", "ownership_Percentage|Ownership_percentage"),
+    ]
+)
+FOREIGN_ENTITY_COLUMNS = FOREIGN_ENTITY_FIELDS.columns
 ForeignEntity = namedtuple("ForeignEntity", FOREIGN_ENTITY_COLUMNS)
 
-REPORT_COLUMNS = [
-    "organization_name",
-    "prefix",
-    "first_name",
-    "last_name",
-    "registrant_different_address",
-    "address1",
-    "address2",
-    "city",
-    "state",
-    "zip",
-    "zipext",
-    "country",
-    "principal_city",
-    "principal_state",
-    "principal_zip",
-    "principal_zipext",
-    "principal_country",
-    "contact_prefix",
-    "contact_name",
-    "contact_phone",
-    "contact_intl_phone",
-    "contact_email",
-    "self_select",
-    "client_name",
-    "senate_id",
-    "house_id",
-    "report_year",
-    "report_type",
-    "termination_date",
-    "no_lobbying",
-    "income",
-    "expenses",
-    "expenses_method",
-    "printed_name",
-    "signed_date",
-    "signer_email",
-    "update_client_address",
-    "update_client_city",
-    "update_client_state",
-    "update_client_zip",
-    "update_client_zipext",
-    "update_client_country",
-    "update_prin_client_city",
-    "update_prin_client_state",
-    "update_prin_client_zip",
-    "update_prin_client_zipext",
-    "update_prin_client_country",
-    "update_general_description",
-]
-
+REPORT_FIELDS = Fields(
+    [
+        ("organization_name", "organizationName"),
+        ("prefix", "prefix"),
+        ("first_name", "firstName"),
+        ("last_name", "lastName"),
+        ("registrant_different_address", "registrantDifferentAddress"),
+        ("address1", "address1"),
+        ("address2", "address2"),
+        ("city", "city"),
+        ("state", "state"),
+        ("zip", "zip"),
+        ("zipext", "zipext"),
+        ("country", "country"),
+        ("principal_city", "principal_city"),
+        ("principal_state", "principal_state"),
+        ("principal_zip", "principal_zip"),
+        ("principal_zipext", "principal_zipext"),
+        ("principal_country", "principal_country"),
+        ("contact_prefix", "contactPrefix"),
+        ("contact_name", "contactName"),
+        ("contact_phone", "contactPhone"),
+        ("contact_intl_phone", "contactIntlPhone"),
+        ("contact_email", "contactEmail"),
+        ("self_select", "selfSelect"),
+        ("client_name", "clientName"),
+        ("senate_id", "senateID"),
+        ("house_id", "houseID"),
+        ("report_year", "reportYear"),
+        ("report_type", "reportType"),
+        ("termination_date", "terminationDate"),
+        ("no_lobbying", "noLobbying"),
+        ("income", "income"),
+        ("expenses", "expenses"),
+        ("expenses_method", "expensesMethod"),
+        ("printed_name", "printedName"),
+        ("signed_date", "signedDate"),
+        ("signer_email", "signerEmail"),
+        ("update_client_address", "updates/clientAddress"),
+        ("update_client_city", "updates/clientCity"),
+        ("update_client_state", "updates/clientState"),
+        ("update_client_zip", "updates/clientZip"),
+        ("update_client_zipext", "updates/clientZipext"),
+        ("update_client_country", "updates/clientCountry"),
+        ("update_prin_client_city", "updates/prinClientCity"),
+        ("update_prin_client_state", "updates/prinClientState"),
+        ("update_prin_client_zip", "updates/prinClientZip"),
+        ("update_prin_client_zipext", "updates/prinClientZipext"),
+        ("update_prin_client_country", "updates/prinClientCountry"),
+        ("update_general_description", "updates/generalDescription"),
+    ]
+)
+REPORT_COLUMNS = REPORT_FIELDS.columns
 Report = namedtuple("Report", REPORT_COLUMNS)
 
 
+ISSUE_FIELDS = Fields(
+    [
+        ("ali_code", "issueAreaCode"),
+        ("federal_agencies", "federal_agencies"),
+        ("foreign_entity_issues", "foreign_entity_issues"),
+    ]
+)
+
 ISSUE_COLUMNS = [
     "ali_code",
     "specific_issues",
@@ -150,93 +192,67 @@ ISSUE_COLUMNS = [
 ]
 Issue = namedtuple("Issue", ISSUE_COLUMNS)
 
-INACTIVE_LOBBYIST_COLUMNS = ["first_name", "last_name", "suffix"]
+INACTIVE_LOBBYIST_FIELDS = Fields(
+    [("first_name", "firstName"), ("last_name", "lastName"), ("suffix", "suffix")]
+)
+INACTIVE_LOBBYIST_COLUMNS = INACTIVE_LOBBYIST_FIELDS.columns
 InactiveLobbyist = namedtuple("InactiveLobbyist", INACTIVE_LOBBYIST_COLUMNS)
 
 
-def clean(field):
-    return str(field).strip()
-
+def nonempty_texts(element, tag):
+    return [text for text in child_texts(element, tag) if text]
 
-def read_lobbyist(lobbyist):
-    return Lobbyist(
-        clean(lobbyist.lobbyistFirstName),
-        clean(lobbyist.lobbyistLastName),
-        clean(lobbyist.lobbyistSuffix),
-        clean(lobbyist.coveredPosition),
-        clean(lobbyist.lobbyistNew) == "Y",
-    )
-
-
-def is_nonempty(field):
-    return bool(clean(field))
 
-
-def is_valid_lobbyist(lobbyist):
-    return is_nonempty(lobbyist.lobbyistFirstName) or is_nonempty(
-        lobbyist.lobbyistLastName
-    )
+def read_records(element, tag, fields, record):
+    """
+    Reads each child of element with the tag into a record
+    """
+    return [
+        record(*fields.extract(child, ""))
+        for child in element.iterchildren()
+        if is_element(child) and local_name(child) == tag
+    ]
 
 
 def read_lobbyists(lobbyists):
-    if hasattr(lobbyists, "lobbyist"):
-        return [
-            read_lobbyist(lobbyist)
-            for lobbyist in lobbyists.lobbyist
-            if is_valid_lobbyist(lobbyist)
-        ]
-    return []
+    return [
+        lobbyist._replace(new=lobbyist.new == "Y")
+        for lobbyist in read_records(lobbyists, "lobbyist", LOBBYIST_FIELDS, Lobbyist)
+        if lobbyist.first_name or lobbyist.last_name
+    ]
 
 
 def read_affiliated_orgs(orgs):
-    if hasattr(orgs, "affiliatedOrg"):
-        return [
-            AffiliatedOrg(
-                clean(org.affiliatedOrgName),
-                clean(org.affiliatedOrgAddress),
-                clean(org.affiliatedOrgCity),
-                clean(org.affiliatedOrgState),
-                clean(org.affiliatedOrgZip),
-                clean(org.affiliatedOrgCountry),
-                clean(org.affiliatedPrinOrgCity),
-                clean(org.affiliatedPrinOrgState),
-                clean(org.affiliatedPrinOrgCountry),
-            )
-            for org in orgs.affiliatedOrg
-            if clean(org.affiliatedOrgName)
-        ]
-    return []
+    return [
+        org
+        for org in read_records(
+            orgs, "affiliatedOrg", AFFILIATED_ORG_FIELDS, AffiliatedOrg
+        )
+        if org.name
+    ]
 
 
 def read_foreign_entities(entities):
-    if hasattr(entities, "foreignEntity"):
-        return [
-            ForeignEntity(
-                clean(entity.name),
-                clean(entity.address),
-                clean(entity.city),
-                clean(entity.state),
-                clean(entity.country),
-                clean(entity.prinCity),
-                clean(entity.prinState),
-                clean(entity.prinCountry),
-                clean(entity.contribution),
-                clean(entity.ownership_Percentage)
-                if hasattr(entity, "ownership_Percentage")
-                else clean(entity.Ownership_percentage),
-            )
-            for entity in entities.foreignEntity
-            if clean(entity.name)
-        ]
-    return []
+    return [
+        entity
+        for entity in read_records(
+            entities, "foreignEntity", FOREIGN_ENTITY_FIELDS, ForeignEntity
+        )
+        if entity.name
+    ]
 
 
 class HouseRegistrationsFile:
+    # Whether the parser recovers from malformed XML, which the --where
+    # prescan has to match
+    recover = False
+
     def __init__(self, contents):
-        if path.isfile(contents):
+        # contents is a filename or a binary file object
+        from lxml import objectify
+
+        with stats.timer("parse"):
             obj = objectify.parse(contents).getroot()
-        else:
-            obj = objectify.fromstring(contents)
         if "LOBBYINGDISCLOSURE1" in obj.tag:
             # Match on substring b/c some documents have a namespace
             self.obj = obj
@@ -249,59 +265,10 @@ class HouseRegistrationsFile:
         return read_lobbyists(self.obj.lobbyists)
 
     def registration(self):
-        def get_column(c):
-            return clean(self.obj[c]) if hasattr(self.obj, c) else None
-
-        return Registration(
-            get_column("regType"),
-            get_column("organizationName"),
-            get_column("prefix"),
-            get_column("firstName"),
-            get_column("lastName"),
-            get_column("address1"),
-            get_column("address2"),
-            get_column("city"),
-            get_column("state"),
-            get_column("zip"),
-            get_column("zipext"),
-            get_column("country"),
-            get_column("principal_city"),
-            get_column("principal_state"),
-            get_column("principal_zip"),
-            get_column("principal_zipext"),
-            get_column("principal_country"),
-            get_column("contactIntlPhone"),
-            get_column("registrantGeneralDescription"),
-            get_column("selfSelect"),
-            get_column("clientName"),
-            get_column("clientAddress"),
-            get_column("clientCity"),
-            get_column("clientState"),
-            get_column("clientZip"),
-            get_column("clientZipExt"),
-            get_column("clientCountry"),
-            get_column("prinClientCity"),
-            get_column("prinClientState"),
-            get_column("prinClientZip"),
-            get_column("prinClientZipExt"),
-            get_column("prinClientCountry"),
-            get_column("clientGeneralDescription"),
-            get_column("senateID"),
-            get_column("houseID"),
-            get_column("specific_issues"),
-            get_column("affiliatedUrl"),
-            get_column("reportYear"),
-            get_column("reportType"),
-            get_column("effectiveDate"),
-            get_column("printedName"),
-            get_column("signedDate"),
-        )
+        return Registration(*REGISTRATION_FIELDS.extract(self.obj))
 
     def issues(self):
-        alis = self.obj.alis
-        if hasattr(alis, "ali_Code"):
-            return [clean(ali_code) for ali_code in alis.ali_Code if clean(ali_code)]
-        return []
+        return nonempty_texts(self.obj.alis, "ali_Code")
 
     def affiliated_orgs(self):
         return read_affiliated_orgs(self.obj.affiliatedOrgs)
@@ -310,15 +277,32 @@ class HouseRegistrationsFile:
         return read_foreign_entities(self.obj.foreignEntities)
 
 
-recovering_parser = objectify.makeparser(recover=True)
+_recovering_parser = None
+
+
+def recovering_parser():
+    # Made on first use, like every use of lxml, so that runs which don't
+    # parse anything (--help, incremental runs with nothing to do) start quickly
+    global _recovering_parser
+    if _recovering_parser is None:
+        from lxml import objectify
+
+        _recovering_parser = objectify.makeparser(recover=True)
+    return _recovering_parser
 
 
 class HouseReportFile:
+    recover = True
+
     def __init__(self, contents):
-        if path.isfile(contents):
-            obj = objectify.parse(contents, parser=recovering_parser).getroot()
-        else:
-            obj = objectify.fromstring(contents, parser=recovering_parser)
+        # contents is a filename or a binary file object
+        from lxml import objectify
+
+        parser = recovering_parser()
+        with stats.timer("parse"):
+            obj = objectify.parse(contents, parser=parser).getroot()
+        stats.count("recovered_errors", len(parser.error_log))
+        self._issues = None
         if "LOBBYINGDISCLOSURE2" in obj.tag:
             # Match on substring b/c some documents have a namespace
             self.obj = obj
@@ -328,82 +312,38 @@ class HouseReportFile:
             )
 
     def report(self):
-        def get_column(c):
-            return clean(self.obj[c]) if hasattr(self.obj, c) else None
-
-        def get_update_column(c):
-            return clean(self.obj.updates[c]) if hasattr(self.obj.updates, c) else None
-
-        return Report(
-            get_column("organizationName"),
-            get_column("prefix"),
-            get_column("firstName"),
-            get_column("lastName"),
-            get_column("registrantDifferentAddress"),
-            get_column("address1"),
-            get_column("address2"),
-            get_column("city"),
-            get_column("state"),
-            get_column("zip"),
-            get_column("zipext"),
-            get_column("country"),
-            get_column("principal_city"),
-            get_column("principal_state"),
-            get_column("principal_zip"),
-            get_column("principal_zipext"),
-            get_column("principal_country"),
-            get_column("contactPrefix"),
-            get_column("contactName"),
-            get_column("contactPhone"),
-            get_column("contactIntlPhone"),
-            get_column("contactEmail"),
-            get_column("selfSelect"),
-            get_column("clientName"),
-            get_column("senateID"),
-            get_column("houseID"),
-            get_column("reportYear"),
-            get_column("reportType"),
-            get_column("terminationDate"),
-            get_column("noLobbying"),
-            get_column("income"),
-            get_column("expenses"),
-            get_column("expensesMethod"),
-            get_column("printedName"),
-            get_column("signedDate"),
-            get_column("signerEmail"),
-            get_update_column("clientAddress"),
-            get_update_column("clientCity"),
-            get_update_column("clientState"),
-            get_update_column("clientZip"),
-            get_update_column("clientZipext"),
-            get_update_column("clientCountry"),
-            get_update_column("prinClientCity"),
-            get_update_column("prinClientState"),
-            get_update_column("prinClientZip"),
-            get_update_column("prinClientZipext"),
-            get_update_column("prinClientCountry"),
-            get_update_column("generalDescription"),
-        )
+        return Report(*REPORT_FIELDS.extract(self.obj))
 
     def issues(self):
-        issues = self.obj.alis
-        if hasattr(issues, "ali_info"):
-            return [
+        # Both the issue and the lobbyist rows are made from the issues, so
+        # they're only read from the document once
+        if self._issues is None:
+            self._issues = self.read_issues()
+        return self._issues
+
+    def read_issues(self):
+        issues = []
+        for issue in self.obj.alis.iterchildren():
+            if not is_element(issue) or local_name(issue) != "ali_info":
+                continue
+            (ali_code, federal_agencies, foreign_entity_issues) = ISSUE_FIELDS.extract(
+                issue, ""
+            )
+            if not ali_code:
+                continue
+            specific_issues = find_child(issue, "specific_issues")
+            issues.append(
                 Issue(
-                    clean(issue.issueAreaCode),
-                    [
-                        clean(desc)
-                        for desc in issue.specific_issues.description
-                        if clean(desc)
-                    ],
-                    clean(issue.federal_agencies),
+                    ali_code,
+                    []
+                    if specific_issues is None
+                    else nonempty_texts(specific_issues, "description"),
+                    federal_agencies,
                     read_lobbyists(issue.lobbyists),
-                    clean(issue.foreign_entity_issues),
+                    foreign_entity_issues,
                 )
-                for issue in issues.ali_info
-                if clean(issue.issueAreaCode)
-            ]
-        return []
+            )
+        return issues
 
     def affiliated_orgs(self):
         return read_affiliated_orgs(self.obj.updates.affiliatedOrgs)
@@ -412,253 +352,1031 @@ class HouseReportFile:
         return read_foreign_entities(self.obj.updates.foreignEntities)
 
     def inactive_foreign_entities(self):
-        inactive_entities = self.obj.updates.inactive_ForeignEntities
-        if hasattr(inactive_entities, "inactive_ForeignEntity"):
-            return [
-                clean(org)
-                for org in inactive_entities.inactive_ForeignEntity
-                if is_nonempty(org)
-            ]
-        return []
+        return nonempty_texts(
+            self.obj.updates.inactive_ForeignEntities, "inactive_ForeignEntity"
+        )
 
     def inactive_lobbyists(self):
-        inactive_lobbyists = self.obj.updates.inactive_lobbyists
-        if hasattr(inactive_lobbyists, "inactive_lobbyist"):
-            return [
-                InactiveLobbyist(
-                    clean(lobbyist.firstName),
-                    clean(lobbyist.lastName),
-                    clean(lobbyist.suffix),
-                )
-                for lobbyist in inactive_lobbyists.inactive_lobbyist
-                if is_nonempty(lobbyist.firstName) or is_nonempty(lobbyist.lastName)
-            ]
-        return []
+        return [
+            lobbyist
+            for lobbyist in read_records(
+                self.obj.updates.inactive_lobbyists,
+                "inactive_lobbyist",
+                INACTIVE_LOBBYIST_FIELDS,
+                InactiveLobbyist,
+            )
+            if lobbyist.first_name or lobbyist.last_name
+        ]
 
     def inactive_issues(self):
-        inactive_issues = self.obj.updates.inactive_ALIs
-        if hasattr(inactive_issues, "ali_Code"):
-            return [
-                clean(issue) for issue in inactive_issues.ali_Code if is_nonempty(issue)
-            ]
-        return []
+        return nonempty_texts(self.obj.updates.inactive_ALIs, "ali_Code")
 
     def inactive_orgs(self):
-        inactive_orgs = self.obj.updates.inactiveOrgs
-        if hasattr(inactive_orgs, "inactiveOrgName"):
-            return [
-                clean(org) for org in inactive_orgs.inactiveOrgName if is_nonempty(org)
-            ]
-        return []
-
-
-def read_files(files):
-    for file in files:
-        if path.isdir(file):
-            for f in os.listdir(file):
-                yield Path(f).stem, path.join(file, f)
-        elif zipfile.is_zipfile(file):
-            zfile = zipfile.ZipFile(file, "r")
-            for name in zfile.namelist():
-                yield Path(name).stem, zfile.read(name)
-        else:
-            yield Path(file).stem, file
+        return nonempty_texts(self.obj.updates.inactiveOrgs, "inactiveOrgName")
 
 
-def read_registrations(files):
-    for (file_id, contents) in read_files(files):
-        try:
-            reg_file = HouseRegistrationsFile(contents)
-            yield file_id, reg_file
-        except ValueError as err:
-            print("Could not read {}. Error: {}".format(file_id, err), file=sys.stderr)
+Table = namedtuple("Table", ["name", "columns", "rows"])
 
 
-def read_reports(files):
-    for (file_id, contents) in read_files(files):
-        try:
-            report_file = HouseReportFile(contents)
-            yield file_id, report_file
-        except ValueError as err:
+def registration_rows(file_id, registration):
+    yield [file_id] + list(registration.registration())
+
+
+def registration_lobbyist_rows(file_id, registration):
+    for lobbyist in registration.lobbyists():
+        yield [file_id] + list(lobbyist)
+
+
+def registration_issue_rows(file_id, registration):
+    for issue in registration.issues():
+        yield [file_id, issue]
+
+
+def registration_affiliated_org_rows(file_id, registration):
+    for org in registration.affiliated_orgs():
+        yield [file_id] + list(org)
+
+
+def registration_foreign_entity_rows(file_id, registration):
+    for entity in registration.foreign_entities():
+        yield [file_id] + list(entity)
+
+
+def report_rows(file_id, report):
+    yield [file_id] + list(report.report())
+
+
+def report_issue_rows(file_id, report):
+    for idx, issue in enumerate(report.issues()):
+        yield [
+            file_id,
+            idx,
+            issue.ali_code,
+            "\n".join(issue.specific_issues),
+            issue.federal_agencies,
+            issue.foreign_entity_issues,
+        ]
+
+
+def report_lobbyist_rows(file_id, report):
+    for idx, issue in enumerate(report.issues()):
+        for lobbyist in issue.lobbyists:
+            yield [file_id, idx, issue.ali_code] + list(lobbyist)
+
+
+def report_inactive_lobbyist_rows(file_id, report):
+    for lobbyist in report.inactive_lobbyists():
+        yield [file_id] + list(lobbyist)
+
+
+def report_inactive_issue_rows(file_id, report):
+    for issue in report.inactive_issues():
+        yield [file_id, issue]
+
+
+def report_affiliated_org_rows(file_id, report):
+    for org in report.affiliated_orgs():
+        yield [file_id] + list(org)
+
+
+def report_inactive_org_rows(file_id, report):
+    for org in report.inactive_orgs():
+        yield [file_id, org]
+
+
+def report_foreign_entity_rows(file_id, report):
+    for entity in report.foreign_entities():
+        yield [file_id] + list(entity)
+
+
+def report_inactive_foreign_entity_rows(file_id, report):
+    for entity in report.inactive_foreign_entities():
+        yield [file_id, entity]
+
+
+# Table names match the output file suffixes used by the Makefile
+REGISTRATION_TABLES = [
+    Table("Registrations_Records", ["id"] + REGISTRATION_COLUMNS, registration_rows),
+    Table(
+        "Registrations_Lobbyists",
+        ["registration_id"] + LOBBYIST_COLUMNS,
+        registration_lobbyist_rows,
+    ),
+    Table(
+        "Registrations_Issues",
+        ["registration_id", "ali_code"],
+        registration_issue_rows,
+    ),
+    Table(
+        "Registrations_AffiliatedOrgs",
+        ["registration_id"] + AFFILIATED_ORG_COLUMNS,
+        registration_affiliated_org_rows,
+    ),
+    Table(
+        "Registrations_ForeignEntities",
+        ["registration_id"] + FOREIGN_ENTITY_COLUMNS,
+        registration_foreign_entity_rows,
+    ),
+]
+
+REPORT_TABLES = [
+    Table("Reports", ["id"] + REPORT_COLUMNS, report_rows),
+    Table(
+        "Reports_Issues",
+        [
+            "report_id",
+            "issue_index",
+            "ali_code",
+            "specific_issues",
+            "federal_agencies",
+            "foreign_entity_issues",
+        ],
+        report_issue_rows,
+    ),
+    Table(
+        "Reports_Lobbyists",
+        ["report_id", "issue_index", "ali_code"] + LOBBYIST_COLUMNS,
+        report_lobbyist_rows,
+    ),
+    Table(
+        "Reports_Inactive_Lobbyists",
+        ["report_id"] + INACTIVE_LOBBYIST_COLUMNS,
+        report_inactive_lobbyist_rows,
+    ),
+    Table(
+        "Reports_Inactive_Issues",
+        ["report_id", "ali_code"],
+        report_inactive_issue_rows,
+    ),
+    Table(
+        "Reports_Affiliated_Orgs",
+        ["report_id"] + AFFILIATED_ORG_COLUMNS,
+        report_affiliated_org_rows,
+    ),
+    Table(
+        "Reports_Inactive_Orgs",
+        ["report_id", "organization_name"],
+        report_inactive_org_rows,
+    ),
+    Table(
+        "Reports_ForeignEntities",
+        ["report_id"] + FOREIGN_ENTITY_COLUMNS,
+        report_foreign_entity_rows,
+    ),
+    Table(
+        "Reports_Inactive_ForeignEntities",
+        ["report_id", "entity_name"],
+        report_inactive_foreign_entity_rows,
+    ),
+]
+
+
+# With --dedup-texts, each distinct specific_issues text is written once to
+# this table and the issue rows only hold its hash
+ISSUE_TEXT_COLUMNS = ["specific_issues"]
+ISSUE_TEXTS_TABLE = Table("Reports_Issue_Texts", TEXT_COLUMNS, None)
+
+
+def texts_tables(tables):
+    """
+    Returns the tables as they're written with deduplicated texts: the issue
+    text columns hold hashes, and are named for them, and the texts table
+    follows the others
+    """
+    return [
+        table._replace(columns=hashed_columns(table.columns, ISSUE_TEXT_COLUMNS))
+        for table in tables
+    ] + [ISSUE_TEXTS_TABLE]
+
+
+def get_table(tables, name):
+    return next(table for table in tables if table.name == name)
+
+
+def parse_document(document_class, tables, source):
+    """
+    Parses a single source document and returns its rows for each table.
+    """
+    stats.count("documents")
+    try:
+        with open_source(source) as f:
+            document = document_class(f)
+    except ValueError as err:
+        stats.count("parse_failures")
+        return source.file_id, err, None
+    with stats.timer("extract"):
+        rows = [list(table.rows(source.file_id, document)) for table in tables]
+    return source.file_id, None, rows
+
+
+def document_tables(document_class):
+    if document_class is HouseRegistrationsFile:
+        return REGISTRATION_TABLES
+    return REPORT_TABLES
+
+
+# Where the issue codes are in each kind of document
+ISSUE_CODE_PATHS = {
+    "HouseRegistrationsFile": [("alis", "ali_Code")],
+    "HouseReportFile": [("alis", "ali_info", "issueAreaCode")],
+}
+
+# The tables an ali_code condition filters. The codes of inactive issues
+# aren't the ones the prescan matches, so those rows are kept as they are.
+ISSUE_CODE_TABLES = ["Registrations_Issues", "Reports_Issues", "Reports_Lobbyists"]
+
+
+def document_fields(document_class):
+    if document_class is HouseRegistrationsFile:
+        return REGISTRATION_FIELDS
+    return REPORT_FIELDS
+
+
+def where_columns(document_class):
+    return ["id"] + document_fields(document_class).columns + ["ali_code"]
+
+
+def check_conditions(document_class, conditions):
+    check_columns(
+        [condition.column for condition in conditions],
+        where_columns(document_class),
+        "--where column",
+    )
+
+
+def document_matches(document_class, conditions, source):
+    """
+    Checks the --where conditions against a document with a prescan of just
+    the elements they refer to, so documents that don't match are never
+    fully parsed. ali_code matches documents with any issue with that code.
+    """
+    checks = []
+    for condition in conditions:
+        if condition.column == "id":
+            if condition.value != source.file_id:
+                return False
+        elif condition.column == "ali_code":
+            checks.append(
+                Check(ISSUE_CODE_PATHS[document_class.__name__], condition.value, False)
+            )
+        else:
+            paths = document_fields(document_class).element_paths(condition.column)
+            checks.append(Check(paths, condition.value, True))
+    with open_source(source) as f:
+        with stats.timer("prescan"):
+            return prescan(f, checks, document_class.recover)
+
+
+def parse_matching(document_class, conditions, tables, source):
+    """
+    Parses a document like parse_document if it matches the conditions, and
+    returns None if it doesn't
+    """
+    if conditions and not document_matches(document_class, conditions, source):
+        return None
+    return parse_document(document_class, tables, source)
+
+
+def cached_rows_match(document_class, conditions, source, rows):
+    """
+    Checks the --where conditions against the cached rows of every table of
+    a document's kind, the way document_matches checks them against the
+    document. Documents that couldn't be parsed are scanned as before.
+    """
+    if rows is None:
+        return not conditions or document_matches(document_class, conditions, source)
+    tables = document_tables(document_class)
+    # The first table has the document's own row
+    [document_row] = rows[0]
+    for condition in conditions:
+        if condition.column == "ali_code":
+            codes = set(
+                row[table.columns.index("ali_code")]
+                for (table, table_rows) in zip(tables, rows)
+                if table.name in ISSUE_CODE_TABLES
+                for row in table_rows
+            )
+            if condition.value not in codes:
+                return False
+        elif document_row[tables[0].columns.index(condition.column)] != condition.value:
+            return False
+    return True
+
+
+def cached_document(document_class, tables, source, cache, conditions):
+    """
+    Returns (file_id, error, rows) for the tables from the cache, parsing
+    and caching the document on a miss, or None if it doesn't match the
+    conditions. Cached documents are checked against their rows rather than
+    scanned again, which needs the rows of every table.
+    """
+    all_tables = document_tables(document_class)
+    extracted = cache.extract(
+        document_class.__name__,
+        all_tables,
+        all_tables,
+        partial(parse_matching, document_class, conditions),
+        source,
+    )
+    if extracted is None:
+        return None
+    (file_id, err, rows) = extracted
+    if not cached_rows_match(document_class, conditions, source, rows):
+        return None
+    if err is not None:
+        return extracted
+    names = [table.name for table in all_tables]
+    return file_id, None, [rows[names.index(table.name)] for table in tables]
+
+
+def extract_document(
+    document_class,
+    tables,
+    source,
+    cache=None,
+    conditions=(),
+    columns=None,
+    texts=False,
+):
+    """
+    Returns the rows of a single source document for each table, from the
+    cache if it has them, or no rows if the document doesn't match the
+    conditions. An ali_code condition also limits the rows of the
+    ISSUE_CODE_TABLES to that code, and columns projects the rows. With
+    texts, the issue texts are replaced by their hashes and the rows of the
+    texts table follow the others. This runs in the worker processes, so it
+    only takes and returns picklable values.
+    """
+    if cache is None:
+        extracted = parse_matching(document_class, conditions, tables, source)
+    else:
+        extracted = cached_document(document_class, tables, source, cache, conditions)
+    if extracted is None:
+        stats.count("skipped_documents")
+        rows = [[] for table in tables]
+        return source.file_id, None, rows + [[]] if texts else rows
+    (file_id, err, rows) = extracted
+    if err is not None:
+        return file_id, err, rows
+    issue_conditions = [c for c in conditions if c.column == "ali_code"]
+    rows = [
+        filter_rows(table.columns, table_rows, issue_conditions)
+        if table.name in ISSUE_CODE_TABLES
+        else table_rows
+        for (table, table_rows) in zip(tables, rows)
+    ]
+    rows = select_rows(tables, rows, (), columns)
+    if texts:
+        rows = intern_texts(
+            [columns or table.columns for table in tables], rows, ISSUE_TEXT_COLUMNS
+        )
+    return file_id, None, rows
+
+
+def extract_tables(
+    document_class,
+    tables,
+    files,
+    workers=1,
+    cache=None,
+    conditions=(),
+    columns=None,
+    texts=False,
+):
+    """
+    Yields the rows for each table, one list of rows per table for each
+    document. With texts, each list is followed by the rows of the texts
+    table for the texts that haven't been seen in an earlier document.
+    """
+    extract = partial(
+        extract_document,
+        document_class,
+        tables,
+        cache=cache,
+        conditions=conditions,
+        columns=columns,
+        texts=texts,
+    )
+    seen = set()
+    for (file_id, err, rows) in map_sources(
+        extract, list_sources(files), workers, chunksize=64
+    ):
+        if err is not None:
             print("Could not read {}. Error: {}".format(file_id, err), file=sys.stderr)
+        else:
+            yield unique_texts(seen, rows) if texts else rows
+    if cache is not None:
+        cache.evict()
+
+
+def export_table(
+    document_class,
+    table,
+    files,
+    workers=1,
+    output_format="csv",
+    cache=None,
+    conditions=(),
+    columns=None,
+    texts_output=None,
+):
+    """
+    Writes a single table to stdout. With texts_output, each distinct issue
+    text is written once to that file instead, and the rows hold its hash.
+    """
+    check_conditions(document_class, conditions)
+    if columns is not None:
+        check_columns(columns, table.columns, "column")
+    header = columns or table.columns
+    if texts_output is not None:
+        header = hashed_columns(header, ISSUE_TEXT_COLUMNS)
+    writers = []
+    try:
+        writers.append(stdout_writer(header, output_format))
+        if texts_output is not None:
+            writers.append(file_writer(texts_output, TEXT_COLUMNS, output_format))
+        for table_rows in extract_tables(
+            document_class,
+            [table],
+            files,
+            workers,
+            cache,
+            conditions,
+            columns,
+            texts_output is not None,
+        ):
+            write_rows(writers, table_rows)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+def export_tables(
+    document_class,
+    tables,
+    files,
+    output_prefix,
+    workers=1,
+    manifest=None,
+    output_format="csv",
+    cache=None,
+    conditions=(),
+    dedup_texts=False,
+    shards=None,
+):
+    """
+    Extracts every table from each document in a single pass, writing each
+    table to <output_prefix>_<table name>.<format>. With a manifest, only
+    documents that changed since the last run are parsed. With dedup_texts,
+    each distinct issue text is written once to the Reports_Issue_Texts
+    table, and the issue rows hold its hash. With shards, each table is
+    written as that many shards per year and quarter, as described in
+    ShardWriter.
+    """
+    check_conditions(document_class, conditions)
+    if manifest is not None:
+        if output_format != "csv":
+            raise ValueError("Incremental runs only support csv output")
+        if conditions or dedup_texts or shards:
+            raise ValueError(
+                "Incremental runs can't be filtered, deduplicated or sharded"
+            )
+        extract = partial(extract_document, document_class, tables, cache=cache)
+        incremental.export_tables(
+            tables,
+            list_sources(files),
+            partial(incremental.extract_whole_sources, extract, workers),
+            output_prefix,
+            manifest,
+        )
+        if cache is not None:
+            cache.evict()
+        return
+    if shards is not None:
+        if dedup_texts:
+            raise ValueError("Sharded output can't be deduplicated")
+        writer = ShardWriter(
+            output_prefix, tables, shards, "report_year", ["report_type"], output_format
+        )
+        try:
+            for (filing_id, rows) in deltas.filing_rows(
+                extract_tables(
+                    document_class, tables, files, workers, cache, conditions
+                )
+            ):
+                writer.write(filing_id, rows)
+        finally:
+            writer.close()
+        writer.write_manifest()
+        return
+    output_tables = texts_tables(tables) if dedup_texts else tables
+    writers = [
+        file_writer(
+            "{}_{}{}".format(output_prefix, table.name, extension(output_format)),
+            table.columns,
+            output_format,
+        )
+        for table in output_tables
+    ]
+    try:
+        for document_rows in extract_tables(
+            document_class,
+            tables,
+            files,
+            workers,
+            cache,
+            conditions,
+            texts=dedup_texts,
+        ):
+            write_rows(writers, document_rows)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+workers_option = click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes to parse documents with",
+)
+
+format_option = click.option(
+    "--format",
+    "output_format",
+    default="csv",
+    type=click.Choice(FORMATS),
+    help="Output file format",
+)
+
+manifest_option = click.option(
+    "--manifest",
+    type=click.Path(),
+    help="Only parse documents that changed since the run recorded in this file",
+)
+
+
+where_option = click.option(
+    "--where",
+    "conditions",
+    multiple=True,
+    callback=parse_conditions,
+    help="Only extract documents where column=value. Can be given more than once",
+)
+
+columns_option = click.option(
+    "--columns",
+    callback=parse_columns,
+    help="Comma separated columns to output, in order",
+)
+
+
+texts_output_option = click.option(
+    "--texts-output",
+    type=click.Path(dir_okay=False),
+    help="Write each distinct specific_issues text once to this file, and only "
+    "its hash in the rows",
+)
+
+
+def set_cache_size(ctx, param, value):
+    ctx.meta["cache_size"] = value
+
+
+def open_cache(ctx, param, value):
+    if value is None:
+        return None
+    return DocumentCache(value, ctx.meta.get("cache_size", DEFAULT_MAX_SIZE) << 20)
+
+
+def cache_option(command):
+    command = click.option(
+        "--cache",
+        type=click.Path(file_okay=False),
+        callback=open_cache,
+        help="Directory to cache the rows extracted from each document in",
+    )(command)
+    # Eager, so the size is known by the time the cache is opened
+    return click.option(
+        "--cache-size",
+        default=DEFAULT_MAX_SIZE,
+        type=click.IntRange(1, None),
+        is_eager=True,
+        expose_value=False,
+        callback=set_cache_size,
+        help="Largest size of the cache in MB",
+    )(command)
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--stats",
+    "show_stats",
+    is_flag=True,
+    help="Write a JSON summary of time per stage, rows and bytes to stderr",
+)
+@click.option(
+    "--profile", type=click.Path(), help="Write a cProfile dump of the run to this file"
+)
+@click.option(
+    "--tracemalloc",
+    "snapshot",
+    type=click.Path(),
+    help="Write a tracemalloc snapshot taken at the end of the run to this file",
+)
+@click.pass_context
+def cli(ctx, show_stats, profile, snapshot):
+    stats.instrument(ctx, show_stats, profile, snapshot)
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def registrations(files):
-    COLUMNS = ["id"] + REGISTRATION_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, registration) in read_registrations(files):
-        data.append([file_id] + list(registration.registration()))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def registrations(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseRegistrationsFile,
+        get_table(REGISTRATION_TABLES, "Registrations_Records"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def lobbyists(files):
-    COLUMNS = ["registration_id"] + LOBBYIST_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, registration) in read_registrations(files):
-        for lobbyist in registration.lobbyists():
-            data.append([file_id] + list(lobbyist))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def lobbyists(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseRegistrationsFile,
+        get_table(REGISTRATION_TABLES, "Registrations_Lobbyists"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def issues(files):
-    COLUMNS = ["registration_id", "ali_code"]
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, registration) in read_registrations(files):
-        for issue in registration.issues():
-            data.append([file_id, issue])
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def issues(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseRegistrationsFile,
+        get_table(REGISTRATION_TABLES, "Registrations_Issues"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def affiliated_orgs(files):
-    COLUMNS = ["registration_id"] + AFFILIATED_ORG_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, registration) in read_registrations(files):
-        for org in registration.affiliated_orgs():
-            data.append([file_id] + list(org))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def affiliated_orgs(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseRegistrationsFile,
+        get_table(REGISTRATION_TABLES, "Registrations_AffiliatedOrgs"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def foreign_entities(files):
-    COLUMNS = ["registration_id"] + FOREIGN_ENTITY_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, registration) in read_registrations(files):
-        for entity in registration.foreign_entities():
-            data.append([file_id] + list(entity))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def foreign_entities(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseRegistrationsFile,
+        get_table(REGISTRATION_TABLES, "Registrations_ForeignEntities"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def reports(files):
-    COLUMNS = ["id"] + REPORT_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        data.append([file_id] + list(report.report()))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def reports(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_issues(files):
-    COLUMNS = [
-        "report_id",
-        "issue_index",
-        "ali_code",
-        "specific_issues",
-        "federal_agencies",
-        "foreign_entity_issues",
-    ]
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for idx, issue in enumerate(report.issues()):
-            data.append(
-                [
-                    file_id,
-                    idx,
-                    issue.ali_code,
-                    "\n".join(issue.specific_issues),
-                    issue.federal_agencies,
-                    issue.foreign_entity_issues,
-                ]
-            )
-
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+@texts_output_option
+def report_issues(
+    files, workers, output_format, cache, conditions, columns, texts_output
+):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Issues"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+        texts_output,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_lobbyists(files):
-    COLUMNS = ["report_id", "issue_index", "ali_code"] + LOBBYIST_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for idx, issue in enumerate(report.issues()):
-            for lobbyist in issue.lobbyists:
-                data.append([file_id, idx, issue.ali_code] + list(lobbyist))
-
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_lobbyists(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Lobbyists"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_inactive_lobbyists(files):
-    COLUMNS = ["report_id"] + INACTIVE_LOBBYIST_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for lobbyist in report.inactive_lobbyists():
-            data.append([file_id] + list(lobbyist))
-
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_inactive_lobbyists(
+    files, workers, output_format, cache, conditions, columns
+):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Inactive_Lobbyists"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_inactive_issues(files):
-    COLUMNS = ["report_id", "ali_code"]
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for issue in report.inactive_issues():
-            data.append([file_id, issue])
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_inactive_issues(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Inactive_Issues"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
+
 
-    sys.stdout.buffer.write(data.export("csv").encode())
+@cli.command()
+@click.argument("files", nargs=-1, type=click.Path())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_affiliated_orgs(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Affiliated_Orgs"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_affiliated_orgs(files):
-    COLUMNS = ["report_id"] + AFFILIATED_ORG_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for org in report.affiliated_orgs():
-            data.append([file_id] + list(org))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_inactive_orgs(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Inactive_Orgs"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_inactive_orgs(files):
-    COLUMNS = ["report_id", "organization_name"]
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for org in report.inactive_orgs():
-            data.append([file_id, org])
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_foreign_entities(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_ForeignEntities"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def report_foreign_entities(files):
-    COLUMNS = ["report_id"] + FOREIGN_ENTITY_COLUMNS
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for entity in report.foreign_entities():
-            data.append([file_id] + list(entity))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def report_inactive_foreign_entities(
+    files, workers, output_format, cache, conditions, columns
+):
+    export_table(
+        HouseReportFile,
+        get_table(REPORT_TABLES, "Reports_Inactive_ForeignEntities"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
+@click.argument("document", type=click.Choice(["registrations", "reports"]))
+@click.argument("output_prefix", type=click.Path())
 @click.argument("files", nargs=-1, type=click.Path())
-def report_inactive_foreign_entities(files):
-    COLUMNS = ["report_id", "entity_name"]
-    data = tablib.Dataset(headers=COLUMNS)
-    for (file_id, report) in read_reports(files):
-        for entity in report.inactive_foreign_entities():
-            data.append([file_id, entity])
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@manifest_option
+@format_option
+@cache_option
+@where_option
+@click.option(
+    "--shards",
+    type=click.IntRange(1, None),
+    help="Write each table as this many shards per year and quarter, "
+    "partitioned by a hash of the filing id, with a manifest",
+)
+@click.option(
+    "--dedup-texts",
+    is_flag=True,
+    help="Write each distinct specific_issues text once to a Reports_Issue_Texts "
+    "table, and only its hash in Reports_Issues",
+)
+def extract_all(
+    document,
+    output_prefix,
+    files,
+    workers,
+    manifest,
+    output_format,
+    cache,
+    conditions,
+    shards,
+    dedup_texts,
+):
+    if manifest is not None and output_format != "csv":
+        raise click.UsageError("--manifest can only be used with csv output")
+    if manifest is not None and conditions:
+        raise click.UsageError("--manifest can't be used with --where")
+    if manifest is not None and dedup_texts:
+        raise click.UsageError("--manifest can't be used with --dedup-texts")
+    if manifest is not None and shards is not None:
+        raise click.UsageError("--manifest can't be used with --shards")
+    if shards is not None and dedup_texts:
+        raise click.UsageError("--shards can't be used with --dedup-texts")
+    if document == "registrations" and dedup_texts:
+        raise click.UsageError("--dedup-texts only applies to reports")
+    if document == "registrations":
+        export_tables(
+            HouseRegistrationsFile,
+            REGISTRATION_TABLES,
+            files,
+            output_prefix,
+            workers,
+            manifest,
+            output_format,
+            cache,
+            conditions,
+            shards=shards,
+        )
+    else:
+        export_tables(
+            HouseReportFile,
+            REPORT_TABLES,
+            files,
+            output_prefix,
+            workers,
+            manifest,
+            output_format,
+            cache,
+            conditions,
+            dedup_texts,
+            shards,
+        )
+
+
+@cli.command()
+@click.argument("document", type=click.Choice(["registrations", "reports"]))
+@click.argument("old", type=click.Path(exists=True))
+@click.argument("new", type=click.Path(exists=True))
+@click.argument("output_prefix", type=click.Path())
+@workers_option
+@format_option
+@cache_option
+def diff(document, old, new, output_prefix, workers, output_format, cache):
+    """
+    Compares two snapshots of the same file (an older and a newer download of
+    a quarter, say) and writes only the documents that were inserted or
+    changed to <output_prefix>_<table>, and every inserted, changed and
+    removed document id to <output_prefix>_Changes
+    """
+    if document == "registrations":
+        (document_class, tables) = (HouseRegistrationsFile, REGISTRATION_TABLES)
+    else:
+        (document_class, tables) = (HouseReportFile, REPORT_TABLES)
+    deltas.export_diff(
+        tables,
+        extract_tables(document_class, tables, [old], workers, cache),
+        extract_tables(document_class, tables, [new], workers, cache),
+        output_prefix,
+        output_format,
+    )
 
 
 if __name__ == "__main__":
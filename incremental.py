@@ -0,0 +1,177 @@
+import csv
+import json
+from os import path
+import os
+import sys
+
+from sources import map_sources, source_hash, source_key
+import stats
+from writers import file_writer, write_rows
+
+
+MANIFEST_VERSION = 2
+
+
+def table_columns(tables):
+    return [[table.name, list(table.columns)] for table in tables]
+
+
+def load_manifest(manifest_file, tables, output_files):
+    """
+    Returns the sources recorded by a previous run, in the order their rows
+    were written, or an empty list if that run can't be reused because its
+    tables or their columns differ.
+    """
+    if not path.exists(manifest_file) or not all(map(path.exists, output_files)):
+        return []
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return []
+    if manifest["tables"] != table_columns(tables):
+        return []
+    return manifest["sources"]
+
+
+def save_manifest(manifest_file, tables, entries):
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(
+            {
+                "version": MANIFEST_VERSION,
+                "tables": table_columns(tables),
+                "sources": entries,
+            },
+            f,
+        )
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+
+class PreviousOutput:
+    """
+    Reads back the rows of a previous run one source at a time, in the order
+    they were written, using the row counts recorded in the manifest.
+    """
+
+    def __init__(self, output_files, entries):
+        if not entries:
+            output_files = []
+        self.files = [open(f, newline="", encoding="utf-8") for f in output_files]
+        self.readers = [csv.reader(f) for f in self.files]
+        for reader in self.readers:
+            next(reader)
+        self.entries = iter(entries)
+
+    def copy_rows(self, key, writers):
+        """
+        Writes the rows written for key with writers, a row at a time,
+        skipping over the rows of any sources recorded before it. Returns
+        the number of rows of each table.
+        """
+        for entry in self.entries:
+            if entry["key"] != key:
+                for (reader, count) in zip(self.readers, entry["rows"]):
+                    for _ in range(count):
+                        next(reader)
+                continue
+            with stats.timer("write"):
+                for (reader, writer, count) in zip(
+                    self.readers, writers, entry["rows"]
+                ):
+                    for _ in range(count):
+                        writer.write(next(reader))
+            stats.count("rows", sum(entry["rows"]))
+            return entry["rows"]
+        raise KeyError(key)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def extract_whole_sources(extract, workers, sources):
+    """
+    Yields (source, error, rows) for each source from extract(source), which
+    returns (file_id, error, rows) for a whole source, parsing them with
+    workers processes. Pass it to export_tables bound to extract and
+    workers.
+    """
+    results = map_sources(extract, sources, workers, chunksize=64)
+    for (source, (_, err, rows)) in zip(sources, results):
+        yield (source, err, rows)
+
+
+def export_tables(tables, sources, extract_sources, output_prefix, manifest_file):
+    """
+    Extracts every table from the sources into <output_prefix>_<table>.csv,
+    only parsing the sources that are new or have changed since the run
+    recorded in manifest_file. Rows for unchanged sources are copied from the
+    previous outputs.
+
+    extract_sources(sources) must yield (source, error, rows) for the sources
+    in order, where rows is None or one list of rows per table. A source's
+    rows may come in any number of parts, such as one per filing, so a large
+    source is never held in memory. A source that can't be read is left out
+    of the manifest, so the next run tries it again, unless it wrote rows
+    before the error; those are recorded without its hash, so it is still
+    parsed again.
+    """
+    output_files = ["{}_{}.csv".format(output_prefix, table.name) for table in tables]
+    previous_entries = load_manifest(manifest_file, tables, output_files)
+    previous_hashes = dict((entry["key"], entry["hash"]) for entry in previous_entries)
+
+    sources = [(source, source_key(source), source_hash(source)) for source in sources]
+    # Rows for unchanged sources are copied from the previous outputs as long
+    # as they come in the same order as before; anything else is parsed again.
+    positions = dict((entry["key"], i) for (i, entry) in enumerate(previous_entries))
+    copied = set()
+    next_position = 0
+    for (source, key, digest) in sources:
+        if previous_hashes.get(key) == digest and positions[key] >= next_position:
+            copied.add(key)
+            next_position = positions[key] + 1
+
+    changed = [source for (source, key, _) in sources if key not in copied]
+    parsed = iter(extract_sources(changed))
+    result = next(parsed, None)
+    previous = PreviousOutput(output_files, previous_entries)
+
+    writers = [
+        file_writer(output_file + ".tmp", table.columns)
+        for (output_file, table) in zip(output_files, tables)
+    ]
+    entries = []
+    try:
+        for (source, key, digest) in sources:
+            if key in copied:
+                counts = previous.copy_rows(key, writers)
+                entries.append({"key": key, "hash": digest, "rows": counts})
+                continue
+            counts = [0 for table in tables]
+            failed = False
+            while result is not None and result[0] == source:
+                (_, err, rows) = result
+                if rows is not None:
+                    write_rows(writers, rows)
+                    counts = [
+                        count + len(table_rows)
+                        for (count, table_rows) in zip(counts, rows)
+                    ]
+                if err is not None:
+                    print(
+                        "Could not read {}. Error: {}".format(source.file_id, err),
+                        file=sys.stderr,
+                    )
+                    failed = True
+                result = next(parsed, None)
+            if failed and not any(counts):
+                continue
+            entries.append(
+                {"key": key, "hash": None if failed else digest, "rows": counts}
+            )
+    finally:
+        previous.close()
+        for writer in writers:
+            writer.close()
+    for output_file in output_files:
+        os.replace(output_file + ".tmp", output_file)
+    save_manifest(manifest_file, tables, entries)
@@ -0,0 +1,63 @@
+import sqlite3
+import sys
+
+from sources import map_sources, source_hash, source_key
+import stats
+
+
+SOURCES_SQL = """
+CREATE TABLE IF NOT EXISTS indexed_sources (
+    source TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+)
+"""
+
+
+def connect(database):
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(SOURCES_SQL)
+    return connection
+
+
+def update_index(connection, sources, extract, remove, add, workers=1):
+    """
+    Brings an index up to date with the sources, only parsing the sources
+    that are new or have changed since they were last indexed, so each
+    quarter's zip can be added as it arrives.
+
+    extract(source) must return (file_id, error, rows) like the processors'
+    extract functions. remove(connection, key) deletes the entries of a
+    source that is about to be indexed again, and add(connection, key, rows)
+    inserts them. Returns the number of sources indexed and skipped.
+    """
+    indexed = dict(connection.execute("SELECT source, hash FROM indexed_sources"))
+    sources = [(source, source_key(source), source_hash(source)) for source in sources]
+    changed = [
+        (source, key, digest)
+        for (source, key, digest) in sources
+        if indexed.get(key) != digest
+    ]
+    parsed = map_sources(
+        extract, [source for (source, _, _) in changed], workers, chunksize=64
+    )
+    with connection:
+        for ((source, key, digest), (file_id, err, rows)) in zip(changed, parsed):
+            if key in indexed:
+                remove(connection, key)
+            if err is not None:
+                print(
+                    "Could not read {}. Error: {}".format(file_id, err),
+                    file=sys.stderr,
+                )
+                connection.execute(
+                    "DELETE FROM indexed_sources WHERE source = ?", (key,)
+                )
+                continue
+            with stats.timer("index"):
+                add(connection, key, rows)
+            connection.execute(
+                "INSERT OR REPLACE INTO indexed_sources VALUES (?, ?)", (key, digest)
+            )
+    return len(changed), len(sources) - len(changed)
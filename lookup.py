@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+
+import click
+from collections import namedtuple
+from functools import partial
+import re
+
+import house_processor
+from indexing import connect, update_index
+import senate_processor
+from sources import list_sources
+from writers import FORMATS, stdout_writer, write_rows
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS filings (
+        source TEXT NOT NULL,
+        chamber TEXT NOT NULL,
+        filing_id TEXT NOT NULL,
+        year INTEGER,
+        type TEXT,
+        registrant_id TEXT,
+        client_id TEXT,
+        house_id TEXT,
+        registrant_name TEXT,
+        client_name TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS filings_source ON filings (source)",
+    "CREATE INDEX IF NOT EXISTS filings_filing ON filings (chamber, filing_id)",
+    "CREATE INDEX IF NOT EXISTS filings_registrant ON filings (registrant_id)",
+    "CREATE INDEX IF NOT EXISTS filings_client ON filings (client_id)",
+    "CREATE INDEX IF NOT EXISTS filings_house ON filings (house_id)",
+    """
+    CREATE TABLE IF NOT EXISTS names (
+        source TEXT NOT NULL,
+        chamber TEXT NOT NULL,
+        filing_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        name TEXT NOT NULL,
+        name_key TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS names_key ON names (name_key)",
+    "CREATE INDEX IF NOT EXISTS names_source ON names (source)",
+]
+
+FILING_COLUMNS = [
+    "chamber",
+    "filing_id",
+    "year",
+    "type",
+    "registrant_id",
+    "client_id",
+    "house_id",
+    "registrant_name",
+    "client_name",
+]
+IndexedFiling = namedtuple("IndexedFiling", FILING_COLUMNS)
+
+ROLES = ["lobbyist", "registrant", "client"]
+
+# The filing and lobbyist tables read from each kind of source
+SOURCE_TABLES = {
+    "house_registrations": [
+        house_processor.get_table(
+            house_processor.REGISTRATION_TABLES, "Registrations_Records"
+        ),
+        house_processor.get_table(
+            house_processor.REGISTRATION_TABLES, "Registrations_Lobbyists"
+        ),
+    ],
+    "house_reports": [
+        house_processor.get_table(house_processor.REPORT_TABLES, "Reports"),
+        house_processor.get_table(house_processor.REPORT_TABLES, "Reports_Lobbyists"),
+    ],
+    "senate": [
+        senate_processor.get_table("Filings"),
+        senate_processor.get_table("Lobbyists"),
+    ],
+}
+
+
+# Generational suffixes, which follow the rest of the name however it is
+# ordered
+NAME_SUFFIXES = ["jr", "sr", "ii", "iii", "iv"]
+
+# Stored in the index's user_version, so name keys written by an older
+# normalize_name are recomputed
+NAME_KEY_VERSION = 1
+
+
+def name_words(name):
+    return re.sub(r"[^\w\s]", "", name.lower()).split()
+
+
+def normalize_name(name):
+    """
+    Returns the key shared by the ways a name is written, so "SMITH, JOHN A."
+    and "John A Smith" both become "john a smith", and "SMITH, JOHN JR" and
+    "John Smith Jr." both become "john smith jr"
+    """
+    (last, comma, first) = name.partition(",")
+    if not comma:
+        return " ".join(name_words(name))
+    (last, first) = (name_words(last), name_words(first))
+    # A suffix may be written after either part
+    suffixes = []
+    for part in [last, first]:
+        part_suffixes = []
+        while len(part) > 1 and part[-1] in NAME_SUFFIXES:
+            part_suffixes.insert(0, part.pop())
+        suffixes.extend(part_suffixes)
+    return " ".join(first + last + suffixes)
+
+
+def join_names(*names):
+    return " ".join(name for name in names if name)
+
+
+def split_senate_id(senate_id):
+    # House filings identify the registrant and client with the Senate's
+    # ids, as <registrant id>-<client id>
+    (registrant_id, _, client_id) = (senate_id or "").partition("-")
+    return (registrant_id or None, client_id or None)
+
+
+def house_entries(rows, tables):
+    """
+    Returns the filing and its (role, name) pairs from the rows extracted
+    from a House document
+    """
+    (filing_table, lobbyist_table) = tables
+    ((filing_row,), lobbyist_rows) = rows
+    filing = dict(zip(filing_table.columns, filing_row))
+    (registrant_id, client_id) = split_senate_id(filing["senate_id"])
+    registrant_name = filing["organization_name"] or join_names(
+        filing["first_name"], filing["last_name"]
+    )
+    year = filing["report_year"]
+    entry = IndexedFiling(
+        "house",
+        filing["id"],
+        int(year) if year and year.isdigit() else None,
+        filing["report_type"],
+        registrant_id,
+        client_id,
+        filing["house_id"] or None,
+        registrant_name,
+        filing["client_name"],
+    )
+    names = [("registrant", registrant_name), ("client", filing["client_name"])]
+    for row in lobbyist_rows:
+        lobbyist = dict(zip(lobbyist_table.columns, row))
+        names.append(
+            (
+                "lobbyist",
+                join_names(
+                    lobbyist["first_name"], lobbyist["last_name"], lobbyist["suffix"]
+                ),
+            )
+        )
+    return [(entry, names)]
+
+
+def senate_entries(rows, tables):
+    """
+    Returns each filing and its (role, name) pairs from the rows extracted
+    from a Senate file
+    """
+    (filing_table, lobbyist_table) = tables
+    (filing_rows, lobbyist_rows) = rows
+    lobbyists = {}
+    for row in lobbyist_rows:
+        lobbyist = dict(zip(lobbyist_table.columns, row))
+        lobbyists.setdefault(lobbyist["filing_id"], []).append(
+            ("lobbyist", lobbyist["name"])
+        )
+    entries = []
+    for row in filing_rows:
+        filing = dict(zip(filing_table.columns, row))
+        year = filing["year"]
+        entry = IndexedFiling(
+            "senate",
+            filing["id"],
+            int(year) if year and year.isdigit() else None,
+            filing["type"],
+            filing["registrant_id"],
+            filing["client_id"],
+            None,
+            filing["registrant_name"],
+            filing["client_name"],
+        )
+        names = [
+            ("registrant", filing["registrant_name"]),
+            ("client", filing["client_name"]),
+        ] + lobbyists.get(filing["id"], [])
+        entries.append((entry, names))
+    return entries
+
+
+def remove_entries(connection, key):
+    connection.execute("DELETE FROM filings WHERE source = ?", (key,))
+    connection.execute("DELETE FROM names WHERE source = ?", (key,))
+
+
+def add_entries(source, connection, key, rows):
+    tables = SOURCE_TABLES[source]
+    if source == "senate":
+        entries = senate_entries(rows, tables)
+    else:
+        entries = house_entries(rows, tables)
+    for (entry, names) in entries:
+        connection.execute(
+            "INSERT INTO filings VALUES ({})".format(
+                ", ".join("?" for _ in range(len(FILING_COLUMNS) + 1))
+            ),
+            (key,) + entry,
+        )
+        # Lobbyists are listed once per issue they worked on
+        unique_names = set(
+            (role, name, normalize_name(name)) for (role, name) in names if name
+        )
+        connection.executemany(
+            "INSERT INTO names VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (key, entry.chamber, entry.filing_id, role, name, name_key)
+                for (role, name, name_key) in sorted(unique_names)
+            ],
+        )
+
+
+def source_extractor(source, cache=None):
+    tables = SOURCE_TABLES[source]
+    if source == "senate":
+        return partial(senate_processor.extract_source, tables, cache=cache)
+    if source == "house_registrations":
+        document_class = house_processor.HouseRegistrationsFile
+    else:
+        document_class = house_processor.HouseReportFile
+    return partial(
+        house_processor.extract_document, document_class, tables, cache=cache
+    )
+
+
+class LookupIndex:
+    """
+    A SQLite index of the filings each lobbyist, registrant and client
+    appears on, across both chambers and every year added to it.
+
+    Names are looked up by normalize_name, so they match however they were
+    written; registrants and clients can also be looked up by their ids.
+    House filings are given the Senate registrant and client ids from their
+    senateID, so the same ids find filings from both chambers.
+    """
+
+    def __init__(self, database):
+        self.connection = connect(database)
+        for sql in SCHEMA:
+            self.connection.execute(sql)
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version < NAME_KEY_VERSION:
+            self.connection.create_function("normalize_name", 1, normalize_name)
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE names SET name_key = normalize_name(name)"
+                )
+                self.connection.execute(
+                    "PRAGMA user_version = {}".format(NAME_KEY_VERSION)
+                )
+
+    def update(self, source, files, workers=1, cache=None):
+        """
+        Adds the filings in the files, a source of the kinds in SOURCE_TABLES,
+        skipping documents that are already indexed and haven't changed.
+        Returns the number of documents indexed and skipped.
+        """
+        return update_index(
+            self.connection,
+            list_sources(files),
+            source_extractor(source, cache),
+            remove_entries,
+            partial(add_entries, source),
+            workers,
+        )
+
+    def query(self, sql, parameters, since):
+        if since is not None:
+            sql += " AND filings.year >= ?"
+            parameters.append(since)
+        sql += " ORDER BY filings.year, filings.chamber, filings.filing_id"
+        return [IndexedFiling(*row) for row in self.connection.execute(sql, parameters)]
+
+    def by_name(self, name, role=None, since=None):
+        """
+        Returns the filings a name appears on, optionally only in one role
+        and from the year since on
+        """
+        sql = """
+            SELECT DISTINCT {} FROM names JOIN filings
+            ON filings.chamber = names.chamber
+                AND filings.filing_id = names.filing_id
+            WHERE names.name_key = ?
+        """.format(
+            ", ".join("filings." + column for column in FILING_COLUMNS)
+        )
+        parameters = [normalize_name(name)]
+        if role is not None:
+            sql += " AND names.role = ?"
+            parameters.append(role)
+        return self.query(sql, parameters, since)
+
+    def by_id(self, registrant_id=None, client_id=None, house_id=None, since=None):
+        """
+        Returns the filings with all of the given ids, optionally only from
+        the year since on
+        """
+        conditions = [
+            ("registrant_id", registrant_id),
+            ("client_id", client_id),
+            ("house_id", house_id),
+        ]
+        conditions = [(column, value) for (column, value) in conditions if value]
+        if not conditions:
+            raise ValueError("At least one id is needed")
+        sql = "SELECT DISTINCT {} FROM filings WHERE {}".format(
+            ", ".join(FILING_COLUMNS),
+            " AND ".join("{} = ?".format(column) for (column, _) in conditions),
+        )
+        return self.query(sql, [value for (_, value) in conditions], since)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes to parse documents with",
+)
+@house_processor.cache_option
+@click.argument("index", type=click.Path(dir_okay=False))
+@click.argument("source", type=click.Choice(sorted(SOURCE_TABLES)))
+@click.argument("files", nargs=-1, type=click.Path())
+def index(workers, cache, index, source, files):
+    """
+    Adds the lobbyists, registrants and clients of the filings in the files
+    to the lookup index. Documents that are already indexed and haven't
+    changed are skipped.
+    """
+    with LookupIndex(index) as lookup_index:
+        (indexed, skipped) = lookup_index.update(source, files, workers, cache)
+    if cache is not None:
+        cache.evict()
+    click.echo("Indexed {} documents, {} unchanged".format(indexed, skipped), err=True)
+
+
+@cli.command()
+@click.option("--name", help="Name of a lobbyist, registrant or client")
+@click.option(
+    "--role", type=click.Choice(ROLES), help="Only match the name in this role"
+)
+@click.option("--registrant-id", help="Senate registrant id")
+@click.option("--client-id", help="Senate client id")
+@click.option(
+    "--senate-id", help="House senateID, which is <registrant id>-<client id>"
+)
+@click.option("--house-id", help="House houseID")
+@click.option("--since", type=int, help="Only return filings from this year on")
+@click.option(
+    "--format",
+    "output_format",
+    default="csv",
+    type=click.Choice(FORMATS),
+    help="Output file format",
+)
+@click.argument("index", type=click.Path(exists=True, dir_okay=False))
+def lookup(
+    name,
+    role,
+    registrant_id,
+    client_id,
+    senate_id,
+    house_id,
+    since,
+    output_format,
+    index,
+):
+    """
+    Writes every indexed filing a name appears on, or that has the given ids
+    """
+    if senate_id is not None:
+        (registrant_id, client_id) = split_senate_id(senate_id)
+    has_ids = any([registrant_id, client_id, house_id])
+    if (name is None) == (not has_ids):
+        raise click.UsageError("Specify either --name or one or more ids")
+    with LookupIndex(index) as lookup_index:
+        if name is not None:
+            filings = lookup_index.by_name(name, role, since)
+        else:
+            filings = lookup_index.by_id(registrant_id, client_id, house_id, since)
+    with stdout_writer(FILING_COLUMNS, output_format) as writer:
+        write_rows([writer], [filings])
+
+
+if __name__ == "__main__":
+    cli()
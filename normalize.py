@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+
+# Columns that are parsed into typed values, by name, in whichever table
+# they appear
+NUMERIC_COLUMNS = [
+    "income",
+    "expenses",
+    "amount",
+    "contribution",
+    "ownership_percentage",
+]
+DATE_COLUMNS = ["signed_date", "effective_date", "termination_date", "received"]
+# foreign_entity_issues isn't a flag despite its name: it holds the text the
+# filer wrote about foreign entities' interest in the issue
+BOOLEAN_COLUMNS = [
+    "self_select",
+    "no_lobbying",
+    "registrant_different_address",
+    "new",
+    "client_self_filer",
+    "client_is_state_or_local_gov",
+]
+
+# Arrow types of the parsed columns, for columnar output
+ARROW_TYPES = dict(
+    [(column, "double") for column in NUMERIC_COLUMNS]
+    + [(column, "timestamp[ns]") for column in DATE_COLUMNS]
+    + [(column, "bool") for column in BOOLEAN_COLUMNS]
+)
+
+# The ways dates are written in the House and Senate files, tried in order.
+# Parsing with explicit formats, rather than letting each reader guess,
+# means every value is read the same way.
+DATE_FORMATS = [
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+]
+
+BOOLEAN_VALUES = {
+    "y": True,
+    "yes": True,
+    "true": True,
+    "n": False,
+    "no": False,
+    "false": False,
+}
+
+ERROR_COLUMNS = ["file", "row", "column", "value"]
+
+
+def parse_numbers(values):
+    # Amounts are written with thousands separators and sometimes a $
+    return pd.to_numeric(
+        values.str.replace(r"[$,\s]", "", regex=True), errors="coerce"
+    ).astype("float64")
+
+
+def parse_dates(values):
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    remaining = values.notna()
+    for date_format in DATE_FORMATS:
+        if not remaining.any():
+            break
+        parsed[remaining] = pd.to_datetime(
+            values[remaining], format=date_format, errors="coerce"
+        )
+        remaining &= parsed.isna()
+    return parsed
+
+
+def parse_booleans(values):
+    return values.str.strip().str.lower().map(BOOLEAN_VALUES).astype("boolean")
+
+
+def column_parser(column):
+    if column in NUMERIC_COLUMNS:
+        return parse_numbers
+    if column in DATE_COLUMNS:
+        return parse_dates
+    if column in BOOLEAN_COLUMNS:
+        return parse_booleans
+    return None
+
+
+def normalize_chunk(chunk, filename, offset=0):
+    """
+    Parses the amount, date and flag columns of a chunk of text values in
+    place, a column at a time. Blank values become missing ones, as do
+    values that can't be parsed, which are returned as a DataFrame of
+    ERROR_COLUMNS (or None if there weren't any). row is the position of the
+    value's row in its file, counting from 0 after the header, given that
+    the chunk starts at offset.
+    """
+    errors = []
+    for column in chunk.columns:
+        parser = column_parser(column)
+        dtype = chunk[column].dtype
+        # Columns that were already parsed are left alone
+        if parser is None or not (
+            pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+        ):
+            continue
+        values = chunk[column]
+        values = values.where(values.str.strip() != "")
+        parsed = parser(values)
+        failed = (values.notna() & parsed.isna()).values
+        if failed.any():
+            errors.append(
+                pd.DataFrame(
+                    {
+                        "file": filename,
+                        "row": np.flatnonzero(failed) + offset,
+                        "column": column,
+                        "value": values.values[failed],
+                    },
+                    columns=ERROR_COLUMNS,
+                )
+            )
+        chunk[column] = parsed
+    if not errors:
+        return None
+    errors = pd.concat(errors, ignore_index=True)
+    return errors.sort_values("row", kind="mergesort")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import click
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from glob import glob
+from os import path
+import os
+from pathlib import Path
+import sys
+
+import house_processor
+import senate_processor
+import stack
+
+
+# A unit of work in the pipeline. Running action(*args) builds every one of
+# outputs from inputs; both are lists of file paths.
+Task = namedtuple("Task", ["name", "inputs", "outputs", "action", "args"])
+
+
+def house_extract_task(zip_file, output_dir):
+    # 2018_Registrations_XML.zip -> 2018, 2018_1stQuarter_XML.zip -> 2018_1stQuarter
+    prefix = Path(zip_file).stem[: -len("_XML")]
+    if prefix.endswith("_Registrations"):
+        prefix = prefix[: -len("_Registrations")]
+        document_class = house_processor.HouseRegistrationsFile
+        tables = house_processor.REGISTRATION_TABLES
+    else:
+        document_class = house_processor.HouseReportFile
+        tables = house_processor.REPORT_TABLES
+    output_prefix = path.join(output_dir, "house", prefix)
+    manifest = path.join(output_dir, "house", Path(zip_file).stem + ".manifest.json")
+    return Task(
+        "house/{}".format(Path(zip_file).stem),
+        [zip_file],
+        ["{}_{}.csv".format(output_prefix, table.name) for table in tables],
+        house_processor.export_tables,
+        (document_class, tables, [zip_file], output_prefix, 1, manifest),
+    )
+
+
+def senate_extract_task(zip_file, output_dir):
+    output_prefix = path.join(output_dir, "senate", Path(zip_file).stem)
+    manifest = output_prefix + ".manifest.json"
+    return Task(
+        "senate/{}".format(Path(zip_file).stem),
+        [zip_file],
+        [
+            "{}_{}.csv".format(output_prefix, table.name)
+            for table in senate_processor.TABLES
+        ],
+        senate_processor.export_tables,
+        (senate_processor.TABLES, [zip_file], output_prefix, 1, manifest),
+    )
+
+
+def stack_tasks(chamber, tables, extract_tasks, output_dir, stack_function):
+    extracted = [output for task in extract_tasks for output in task.outputs]
+    for table in tables:
+        suffix = "_{}.csv".format(table.name)
+        # Previously extracted files are stacked too, as they are by the Makefile
+        existing = glob(path.join(output_dir, chamber, "*" + suffix))
+        inputs = sorted(
+            set(output for output in extracted if output.endswith(suffix))
+            | set(existing)
+        )
+        if not inputs:
+            continue
+        output = path.join(output_dir, "stacked", chamber, table.name + ".csv")
+        yield Task(
+            "stacked/{}/{}".format(chamber, table.name),
+            inputs,
+            [output],
+            stack_function,
+            (inputs, output),
+        )
+
+
+def build_tasks(targets, data_dir, output_dir):
+    house_zips = sorted(glob(path.join(data_dir, "house", "*_XML.zip")))
+    senate_zips = sorted(glob(path.join(data_dir, "senate", "*.zip")))
+    house_tasks = [house_extract_task(zip_file, output_dir) for zip_file in house_zips]
+    senate_tasks = [
+        senate_extract_task(zip_file, output_dir) for zip_file in senate_zips
+    ]
+
+    tasks = []
+    if targets & {"all", "house_all", "house_stacks"}:
+        tasks.extend(house_tasks)
+    if targets & {"all", "senate_all", "senate_stacks"}:
+        tasks.extend(senate_tasks)
+    if "house_stacks" in targets:
+        tasks.extend(
+            stack_tasks(
+                "house",
+                house_processor.REGISTRATION_TABLES + house_processor.REPORT_TABLES,
+                house_tasks,
+                output_dir,
+                stack.stack_house,
+            )
+        )
+    if "senate_stacks" in targets:
+        tasks.extend(
+            stack_tasks(
+                "senate",
+                senate_processor.TABLES,
+                senate_tasks,
+                output_dir,
+                stack.stack_senate,
+            )
+        )
+    return tasks
+
+
+def is_stale(task):
+    if not all(path.exists(output) for output in task.outputs):
+        return True
+    newest_input = max(path.getmtime(i) for i in task.inputs)
+    return any(path.getmtime(output) < newest_input for output in task.outputs)
+
+
+def remove_outputs(task):
+    for output in task.outputs:
+        if path.exists(output):
+            os.remove(output)
+
+
+def run_tasks(tasks, jobs, dry_run=False):
+    """
+    Runs each stale task once all of the tasks producing its inputs have
+    finished, with up to jobs tasks running at once. Returns the names of
+    the tasks that failed or were skipped because a dependency failed.
+    """
+    producers = {output: task.name for task in tasks for output in task.outputs}
+    dependencies = {
+        task.name: set(producers[i] for i in task.inputs if i in producers)
+        for task in tasks
+    }
+    pending = list(tasks)
+    running = {}
+    finished = set()
+    rebuilt = set()
+    failed = set()
+
+    with ProcessPoolExecutor(jobs) as executor:
+        while pending or running:
+            for task in list(pending):
+                blockers = dependencies[task.name]
+                if blockers & failed:
+                    pending.remove(task)
+                    failed.add(task.name)
+                    print("Skipping {}".format(task.name), file=sys.stderr)
+                elif blockers <= finished:
+                    pending.remove(task)
+                    if not (blockers & rebuilt or is_stale(task)):
+                        finished.add(task.name)
+                    elif dry_run:
+                        print(task.name)
+                        finished.add(task.name)
+                        rebuilt.add(task.name)
+                    else:
+                        for output in task.outputs:
+                            os.makedirs(path.dirname(output) or ".", exist_ok=True)
+                        print("Building {}".format(task.name), file=sys.stderr)
+                        future = executor.submit(task.action, *task.args)
+                        running[future] = task
+            if not running:
+                continue
+            (done, _) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    future.result()
+                    finished.add(task.name)
+                    rebuilt.add(task.name)
+                except Exception as err:
+                    print(
+                        "Failed to build {}. Error: {}".format(task.name, err),
+                        file=sys.stderr,
+                    )
+                    remove_outputs(task)
+                    failed.add(task.name)
+    return failed
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option(
+    "--data-dir",
+    default="data/files",
+    type=click.Path(),
+    help="Directory containing the house/ and senate/ source zips",
+)
+@click.option("--output-dir", default="output", type=click.Path())
+@click.option(
+    "--jobs",
+    default=os.cpu_count(),
+    type=click.IntRange(1, None),
+    help="Number of tasks to run at once",
+)
+@click.option("--dry-run", is_flag=True, help="Only list the tasks that would run")
+@click.argument(
+    "targets",
+    nargs=-1,
+    type=click.Choice(
+        ["all", "house_all", "senate_all", "house_stacks", "senate_stacks"]
+    ),
+)
+def run(data_dir, output_dir, jobs, dry_run, targets):
+    tasks = build_tasks(set(targets or ["all"]), data_dir, output_dir)
+    failed = run_tasks(tasks, jobs, dry_run)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,301 @@
+import io
+import os
+from pathlib import Path
+import sys
+import zipfile
+
+import house_processor
+import senate_processor
+from writers import COLUMN_TYPES, arrow_schema, record_batch
+
+
+# The tables of each kind of source, by the name read_batches takes
+SOURCE_TABLES = {
+    "house_registrations": house_processor.REGISTRATION_TABLES,
+    "house_reports": house_processor.REPORT_TABLES,
+    "senate": senate_processor.TABLES,
+}
+
+DOCUMENT_CLASSES = {
+    "house_registrations": house_processor.HouseRegistrationsFile,
+    "house_reports": house_processor.HouseReportFile,
+}
+
+BATCH_KINDS = ["records", "numpy", "arrow"]
+
+DEFAULT_BATCH_SIZE = 65536
+
+
+class Record:
+    """
+    A row of a table, with an attribute for each column. Each table has its
+    own subclass, made by record_class, whose __slots__ are its columns.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self._fields):
+            raise TypeError(
+                "{} takes {} values, not {}".format(
+                    type(self).__name__, len(self._fields), len(values)
+                )
+            )
+        for (field, value) in zip(self._fields, values):
+            setattr(self, field, value)
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and list(self) == list(other)
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join(
+                "{}={!r}".format(field, getattr(self, field)) for field in self._fields
+            ),
+        )
+
+
+# Record classes by table, so every batch of a table shares one
+_record_classes = {}
+
+
+def record_class(table):
+    key = (table.name, tuple(table.columns))
+    if key not in _record_classes:
+        _record_classes[key] = type(
+            table.name,
+            (Record,),
+            {"__slots__": tuple(table.columns), "_fields": tuple(table.columns)},
+        )
+    return _record_classes[key]
+
+
+def numpy_dtype(columns):
+    import numpy as np
+
+    # Text is kept as Python strings, since values vary widely in length
+    # and may be missing
+    return np.dtype([(column, COLUMN_TYPES.get(column, object)) for column in columns])
+
+
+def batch_converter(kind, table):
+    """
+    Returns a function that turns a list of the table's rows into a batch of
+    the kind
+    """
+    if kind == "records":
+        record = record_class(table)
+        return lambda rows: [record(*row) for row in rows]
+    if kind == "numpy":
+        import numpy as np
+
+        dtype = numpy_dtype(table.columns)
+        return lambda rows: np.array([tuple(row) for row in rows], dtype=dtype)
+    schema = arrow_schema(table.columns)
+    return lambda rows: record_batch(schema, rows)
+
+
+# The first bytes of a zip archive: a local file header, or the end of an
+# archive with no members
+ZIP_MAGIC = [b"PK\x03\x04", b"PK\x05\x06"]
+
+
+class PrefixedStream(io.RawIOBase):
+    """
+    Reads prefix and then the rest of stream, to put back the bytes read
+    from the start of a stream that can't seek
+    """
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            data = self.prefix[: len(buffer)]
+            self.prefix = self.prefix[len(data) :]
+        else:
+            data = self.stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def sniff(stream):
+    """
+    Returns whether a stream holds a zip archive, and a stream to read it
+    from the start. A zip's directory is at its end, so a zip in a stream
+    that can't seek is read into memory; a single document is still
+    streamed.
+    """
+    if stream.seekable():
+        start = stream.tell()
+        is_zip = zipfile.is_zipfile(stream)
+        stream.seek(start)
+        return (is_zip, stream)
+    head = stream.read(4)
+    if head in ZIP_MAGIC:
+        return (True, io.BytesIO(head + stream.read()))
+    return (False, io.BufferedReader(PrefixedStream(head, stream)))
+
+
+def stream_documents(stream, file_id=None):
+    """
+    Yields (file_id, binary file object) for each document in a stream that
+    holds either a zip archive or a single document. Zip members are
+    streamed as they are read, and each is closed once the next one is
+    requested. A single document's id is file_id if it's given, and
+    otherwise comes from the stream's name, as files have, or is None; House
+    ids come from the document's filename.
+    """
+    name = getattr(stream, "name", None)
+    (is_zip, stream) = sniff(stream)
+    if is_zip:
+        with zipfile.ZipFile(stream) as zfile:
+            for member in zfile.namelist():
+                with zfile.open(member) as f:
+                    yield (Path(member).stem, f)
+        return
+    if file_id is None and isinstance(name, str):
+        file_id = Path(name).stem
+    yield (file_id, stream)
+
+
+def stream_rows(source, tables, stream, file_id=None):
+    for (file_id, f) in stream_documents(stream, file_id):
+        if source == "senate":
+            try:
+                for filing in senate_processor.SenateFile(f).filings():
+                    yield [list(table.rows(filing)) for table in tables]
+            except ValueError as err:
+                print(
+                    "Could not read {}. Error: {}".format(file_id or "stream", err),
+                    file=sys.stderr,
+                )
+            continue
+        if file_id is None:
+            raise ValueError(
+                "House documents are identified by their filename, so a file_id "
+                "is needed to read one from a stream without a name"
+            )
+        try:
+            document = DOCUMENT_CLASSES[source](f)
+        except ValueError as err:
+            print("Could not read {}. Error: {}".format(file_id, err), file=sys.stderr)
+            continue
+        yield [list(table.rows(file_id, document)) for table in tables]
+
+
+def document_rows(source, tables, data, workers=1, file_id=None):
+    """
+    Yields the rows for each table, one list of rows per table at a time,
+    from data: a path to a document, a directory of them or a zip archive, a
+    list of such paths, or bytes or a binary file object holding a zip
+    archive or a single document. Paths are read with the processors'
+    extract_tables, in parallel with more than one worker; streams are read
+    serially, and a single House document in a stream without a name needs
+    a file_id.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    if hasattr(data, "read"):
+        return stream_rows(source, tables, data, file_id)
+    files = [data] if isinstance(data, (str, os.PathLike)) else data
+    files = [os.fspath(file) for file in files]
+    if source == "senate":
+        return senate_processor.extract_tables(tables, files, workers)
+    return house_processor.extract_tables(
+        DOCUMENT_CLASSES[source], tables, files, workers
+    )
+
+
+def select_tables(source, names):
+    if source not in SOURCE_TABLES:
+        raise ValueError(
+            "Unknown source {}, expected one of {}".format(
+                source, ", ".join(sorted(SOURCE_TABLES))
+            )
+        )
+    tables = SOURCE_TABLES[source]
+    if names is None:
+        return tables
+    by_name = dict((table.name, table) for table in tables)
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(
+            "Unknown {} tables {}, expected some of {}".format(
+                source, ", ".join(unknown), ", ".join(by_name)
+            )
+        )
+    return [by_name[name] for name in names]
+
+
+def read_batches(
+    source,
+    data,
+    tables=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    kind="records",
+    workers=1,
+    file_id=None,
+):
+    """
+    Extracts the tables (all of them by default) of a source, one of
+    SOURCE_TABLES, from data as described in document_rows, and yields
+    (table name, batch) as each table accumulates batch_size rows, then the
+    remaining rows of each table. Batches are one of BATCH_KINDS:
+
+    - records: a list of Record instances, with an attribute per column
+    - numpy: a NumPy structured array, with a field per column
+    - arrow: a pyarrow RecordBatch, with the schema Parquet output uses
+
+    Text values are strings, or None where a Senate filing leaves them out.
+    Documents that can't be parsed are reported on stderr and skipped, as
+    they are by the processors. file_id is the id of a single House document
+    read from bytes or a stream without a name.
+    """
+    tables = select_tables(source, tables)
+    if kind not in BATCH_KINDS:
+        raise ValueError(
+            "Unknown batch kind {}, expected one of {}".format(
+                kind, ", ".join(BATCH_KINDS)
+            )
+        )
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    converters = [batch_converter(kind, table) for table in tables]
+    pending = [[] for table in tables]
+    for rows in document_rows(source, tables, data, workers, file_id):
+        for (i, table_rows) in enumerate(rows):
+            pending[i].extend(table_rows)
+            while len(pending[i]) >= batch_size:
+                yield (tables[i].name, converters[i](pending[i][:batch_size]))
+                pending[i] = pending[i][batch_size:]
+    for (table, convert, table_rows) in zip(tables, converters, pending):
+        if table_rows:
+            yield (table.name, convert(table_rows))
+
+
+def read_table(
+    source,
+    table,
+    data,
+    batch_size=DEFAULT_BATCH_SIZE,
+    kind="records",
+    workers=1,
+    file_id=None,
+):
+    """
+    Yields the batches of a single table, as read_batches does
+    """
+    for (_, batch) in read_batches(
+        source, data, [table], batch_size, kind, workers, file_id
+    ):
+        yield batch
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import click
+from functools import partial
+import sqlite3
+
+import house_processor
+from indexing import connect, update_index
+import senate_processor
+from sources import list_sources
+from writers import FORMATS, stdout_writer, write_rows
+
+
+# The texts are kept in a regular table, which the FTS5 table indexes
+# without storing a second copy of them
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS texts (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        chamber TEXT NOT NULL,
+        filing_id TEXT NOT NULL,
+        field TEXT NOT NULL,
+        text TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS texts_source ON texts (source)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts
+    USING fts5(text, content='texts', content_rowid='id')
+    """,
+]
+
+# The tables whose free text columns are indexed, and those columns
+INDEXED_COLUMNS = {
+    "house_reports": [
+        (
+            house_processor.get_table(house_processor.REPORT_TABLES, "Reports_Issues"),
+            ["specific_issues", "federal_agencies", "foreign_entity_issues"],
+        )
+    ],
+    "senate": [
+        (senate_processor.get_table("Issues"), ["specific_issue"]),
+        (
+            senate_processor.get_table("Lobbyists"),
+            ["activity_information", "official_position"],
+        ),
+    ],
+}
+
+RESULT_COLUMNS = ["chamber", "filing_id", "field", "snippet"]
+
+
+def open_index(database):
+    connection = connect(database)
+    for sql in SCHEMA:
+        connection.execute(sql)
+    return connection
+
+
+def source_extractor(source, cache=None):
+    tables = [table for (table, _) in INDEXED_COLUMNS[source]]
+    if source == "house_reports":
+        return partial(
+            house_processor.extract_document,
+            house_processor.HouseReportFile,
+            tables,
+            cache=cache,
+        )
+    return partial(senate_processor.extract_source, tables, cache=cache)
+
+
+def text_entries(source, rows):
+    """
+    Yields (filing_id, field, text) for each non-empty indexed text in the
+    rows extracted from a document. The first column of every table is the
+    id of its filing.
+    """
+    for ((table, columns), table_rows) in zip(INDEXED_COLUMNS[source], rows):
+        indexes = [(column, table.columns.index(column)) for column in columns]
+        for row in table_rows:
+            for (column, index) in indexes:
+                if row[index]:
+                    yield (row[0], column, row[index])
+
+
+def remove_texts(connection, key):
+    # External content tables have to be told the old values to remove them
+    connection.execute(
+        """
+        INSERT INTO texts_fts (texts_fts, rowid, text)
+        SELECT 'delete', id, text FROM texts WHERE source = ?
+        """,
+        (key,),
+    )
+    connection.execute("DELETE FROM texts WHERE source = ?", (key,))
+
+
+def add_texts(source, connection, key, rows):
+    chamber = "senate" if source == "senate" else "house"
+    for (filing_id, field, text) in text_entries(source, rows):
+        cursor = connection.execute(
+            "INSERT INTO texts (source, chamber, filing_id, field, text) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, chamber, filing_id, field, text),
+        )
+        connection.execute(
+            "INSERT INTO texts_fts (rowid, text) VALUES (?, ?)",
+            (cursor.lastrowid, text),
+        )
+
+
+def quote_terms(query):
+    # Quoting each term keeps punctuation such as the dots in H.R. from being
+    # read as FTS5 query syntax; quoted terms are still ANDed together
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+def search_texts(connection, query, chamber=None, limit=20):
+    """
+    Returns (chamber, filing_id, field, snippet) for the texts that best
+    match an FTS5 query, most relevant first. Cumulative snapshots index the
+    same filing under each source that holds it, so each text of a filing is
+    only returned once.
+    """
+    matches = """
+        FROM texts_fts JOIN texts ON texts.id = texts_fts.rowid
+        WHERE texts_fts MATCH ?
+    """
+    parameters = [query]
+    if chamber is not None:
+        matches += " AND texts.chamber = ?"
+        parameters.append(chamber)
+    # snippet() can't be used in a grouped query, so the first copy of each
+    # text is picked out first
+    sql = """
+        SELECT texts.chamber, texts.filing_id, texts.field,
+            snippet(texts_fts, 0, '[', ']', '...', 16)
+        {0}
+        AND texts.id IN (
+            SELECT min(texts.id) {0}
+            GROUP BY texts.chamber, texts.filing_id, texts.field, texts.text
+        )
+        ORDER BY rank LIMIT ?
+    """.format(
+        matches
+    )
+    parameters = parameters + parameters + [limit]
+    return connection.execute(sql, parameters).fetchall()
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes to parse documents with",
+)
+@house_processor.cache_option
+@click.argument("index", type=click.Path(dir_okay=False))
+@click.argument("source", type=click.Choice(sorted(INDEXED_COLUMNS)))
+@click.argument("files", nargs=-1, type=click.Path())
+def index(workers, cache, index, source, files):
+    """
+    Adds the issue descriptions and lobbyist activity in the files to a
+    full-text index. Documents that are already indexed and haven't changed
+    are skipped.
+    """
+    connection = open_index(index)
+    try:
+        (indexed, skipped) = update_index(
+            connection,
+            list_sources(files),
+            source_extractor(source, cache),
+            remove_texts,
+            partial(add_texts, source),
+            workers,
+        )
+    finally:
+        connection.close()
+    if cache is not None:
+        cache.evict()
+    click.echo("Indexed {} documents, {} unchanged".format(indexed, skipped), err=True)
+
+
+@cli.command()
+@click.option(
+    "--chamber",
+    type=click.Choice(["house", "senate"]),
+    help="Only return filings from this chamber",
+)
+@click.option(
+    "--limit",
+    default=20,
+    type=click.IntRange(1, None),
+    help="Largest number of results to return",
+)
+@click.option(
+    "--raw",
+    is_flag=True,
+    help="Pass the query to FTS5 as is, so it can use AND, OR, NEAR and prefix* "
+    "queries",
+)
+@click.option(
+    "--format",
+    "output_format",
+    default="csv",
+    type=click.Choice(FORMATS),
+    help="Output file format",
+)
+@click.argument("index", type=click.Path(exists=True, dir_okay=False))
+@click.argument("query")
+def search(chamber, limit, raw, output_format, index, query):
+    """
+    Writes the filings whose texts best match the query, with a snippet of
+    the matching text
+    """
+    connection = open_index(index)
+    try:
+        results = search_texts(
+            connection, query if raw else quote_terms(query), chamber, limit
+        )
+    except sqlite3.OperationalError as err:
+        raise click.UsageError("Invalid query: {}".format(err))
+    finally:
+        connection.close()
+    with stdout_writer(RESULT_COLUMNS, output_format) as writer:
+        write_rows([writer], [results])
+
+
+if __name__ == "__main__":
+    cli()
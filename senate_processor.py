@@ -1,40 +1,55 @@
 #!/usr/bin/env python3
 
 import click
-import tablib
-from lxml import objectify, etree
-from os import path
-import os
-from pathlib import Path
 from collections import namedtuple
+from functools import partial
 import sys
-import zipfile
-
-
-FILING_INFO_FIELDS = [
-    "id",
-    "year",
-    "received",
-    "amount",
-    "type",
-    "period",
-    "registrant_id",
-    "registrant_name",
-    "registrant_general_description",
-    "registrant_address",
-    "registrant_country",
-    "registrant_ppb_country",
-    "client_id",
-    "client_name",
-    "client_general_description",
-    "client_self_filer",
-    "client_contact_fullname",
-    "client_is_state_or_local_gov",
-    "client_country",
-    "client_ppb_country",
-    "client_state",
-    "client_ppb_state",
-]
+
+from fields import Fields
+import deltas
+from document_cache import DEFAULT_MAX_SIZE, DocumentCache
+from filters import check_columns, parse_columns, parse_conditions, select_rows
+import incremental
+from shards import ShardWriter
+import stats
+from texts import TEXT_COLUMNS, hashed_columns, intern_texts, unique_texts
+from sources import (
+    close_archives,
+    list_sources,
+    map_ordered,
+    map_sources,
+    open_source,
+)
+from writers import FORMATS, extension, file_writer, stdout_writer, write_rows
+
+
+FILING_INFO = Fields(
+    [
+        ("id", "@ID"),
+        ("year", "@Year"),
+        ("received", "@Received"),
+        ("amount", "@Amount"),
+        ("type", "@Type"),
+        ("period", "@Period"),
+        ("registrant_id", "Registrant/@RegistrantID"),
+        ("registrant_name", "Registrant/@RegistrantName"),
+        ("registrant_general_description", "Registrant/@GeneralDescription"),
+        ("registrant_address", "Registrant/@Address"),
+        ("registrant_country", "Registrant/@RegistrantCountry"),
+        ("registrant_ppb_country", "Registrant/@RegistrantPPBCountry"),
+        ("client_id", "Registrant/@ClientID"),
+        ("client_name", "Registrant/@ClientName"),
+        ("client_general_description", "Registrant/@GeneralDescription"),
+        ("client_self_filer", "Registrant/@SelfFiler"),
+        ("client_contact_fullname", "Registrant/@ContactFullname"),
+        ("client_is_state_or_local_gov", "Registrant/@IsStateOrLocalGov"),
+        ("client_country", "Registrant/@ClientCountry"),
+        ("client_ppb_country", "Registrant/@ClientPPBCountry"),
+        ("client_state", "Registrant/@ClientState"),
+        ("client_ppb_state", "Registrant/@ClientPPBState"),
+    ]
+)
+FILING_INFO_FIELDS = FILING_INFO.columns
 
 FilingInfo = namedtuple("Filing", FILING_INFO_FIELDS)
 
@@ -69,31 +84,25 @@ class Filing:
         self.id = obj.get("ID")
 
     def info(self):
-        obj = self.obj
-        return FilingInfo(
-            self.obj.get("ID"),
-            self.obj.get("Year"),
-            self.obj.get("Received"),
-            self.obj.get("Amount"),
-            self.obj.get("Type"),
-            self.obj.get("Period"),
-            self.obj.Registrant.get("RegistrantID"),
-            self.obj.Registrant.get("RegistrantName"),
-            self.obj.Registrant.get("GeneralDescription"),
-            self.obj.Registrant.get("Address"),
-            self.obj.Registrant.get("RegistrantCountry"),
-            self.obj.Registrant.get("RegistrantPPBCountry"),
-            self.obj.Registrant.get("ClientID"),
-            self.obj.Registrant.get("ClientName"),
-            self.obj.Registrant.get("GeneralDescription"),
-            self.obj.Registrant.get("SelfFiler"),
-            self.obj.Registrant.get("ContactFullname"),
-            self.obj.Registrant.get("IsStateOrLocalGov"),
-            self.obj.Registrant.get("ClientCountry"),
-            self.obj.Registrant.get("ClientPPBCountry"),
-            self.obj.Registrant.get("ClientState"),
-            self.obj.Registrant.get("ClientPPBState"),
-        )
+        return FilingInfo(*FILING_INFO.extract(self.obj))
+
+    def matches(self, conditions):
+        """
+        Checks --where conditions against the filing's attributes, before any
+        of its rows are extracted. code matches filings with any issue with
+        that code.
+        """
+        info = None
+        for condition in conditions:
+            if condition.column == "code":
+                if condition.value not in [issue.code for issue in self.issues()]:
+                    return False
+                continue
+            if info is None:
+                info = self.info()._asdict()
+            if (info[condition.column] or "") != condition.value:
+                return False
+        return True
 
     def lobbyists(self):
         if hasattr(self.obj, "Lobbyists"):
@@ -153,111 +162,707 @@ class Filing:
 
 
 class SenateFile:
+    """
+    Streams the <Filing> elements of a Senate quarterly file.
+
+    The file is read incrementally with iterparse rather than loaded into a
+    single tree, and each element is cleared once the next one is requested,
+    so Filings should be fully consumed before advancing the iterator.
+    """
+
     def __init__(self, contents):
-        try:
-            if path.isfile(contents):
-                obj = objectify.parse(contents).getroot()
+        # contents is a filename or a binary file object
+        self.source = contents
+
+    def filings(self, conditions=()):
+        from lxml import etree, objectify
+
+        context = etree.iterparse(
+            self.source, events=("end",), tag="{*}Filing", remove_blank_text=True
+        )
+        context.set_element_class_lookup(objectify.ObjectifyElementClassLookup())
+        while True:
+            with stats.timer("parse"):
+                event = next(context, None)
+            if event is None:
+                break
+            (_, element) = event
+            stats.count("filings")
+            filing = Filing(element)
+            if filing.matches(conditions):
+                yield filing
             else:
-                obj = objectify.fromstring(contents)
-        except:
-            obj = objectify.fromstring(contents)
-        self.obj = obj
+                stats.count("skipped_filings")
+            element.clear()
+            # Drop the references the root holds to already consumed filings
+            while element.getprevious() is not None:
+                element.getparent().remove(element.getprevious())
+        del context
+
+
+Table = namedtuple("Table", ["name", "columns", "rows"])
+
+
+def filing_rows(filing):
+    yield list(filing.info())
+
+
+def lobbyist_rows(filing):
+    for lobbyist in filing.lobbyists():
+        yield [filing.id] + list(lobbyist)
+
+
+def government_entity_rows(filing):
+    for entity in filing.government_entities():
+        yield [filing.id, entity]
+
+
+def issue_rows(filing):
+    for issue in filing.issues():
+        yield [filing.id] + list(issue)
+
 
-    def filings(self):
-        return [Filing(filing) for filing in self.obj.Filing]
+def foreign_entity_rows(filing):
+    for entity in filing.foreign_entities():
+        yield [filing.id] + list(entity)
 
 
-def read_files(files):
-    for file in files:
-        if path.isdir(file):
-            for f in os.listdir(file):
-                yield Path(f).stem, path.join(file, f)
-        elif zipfile.is_zipfile(file):
-            zfile = zipfile.ZipFile(file, "r")
-            for name in zfile.namelist():
-                yield Path(name).stem, zfile.read(name)
-        else:
-            yield Path(file).stem, file
+def affiliated_org_rows(filing):
+    for org in filing.affiliated_orgs():
+        yield [filing.id] + list(org)
 
 
-def read_filings(files):
-    for (file_id, contents) in read_files(files):
+# Table names match the output file suffixes used by the Makefile
+TABLES = [
+    Table("Filings", FILING_INFO_FIELDS, filing_rows),
+    Table("Lobbyists", ["filing_id"] + LOBBYIST_FIELDS, lobbyist_rows),
+    Table("Government_Entities", ["filing_id", "entity_name"], government_entity_rows),
+    Table("Issues", ["filing_id"] + ISSUE_FIELDS, issue_rows),
+    Table(
+        "ForeignEntities", ["filing_id"] + FOREIGN_ENTITY_FIELDS, foreign_entity_rows
+    ),
+    Table("AffiliatedOrgs", ["filing_id"] + AFFILIATED_ORG_FIELDS, affiliated_org_rows),
+]
+
+
+# Columns --where conditions can be on. code is an issue code
+WHERE_COLUMNS = FILING_INFO_FIELDS + ["code"]
+
+# With --dedup-texts, each distinct specific_issue text is written once to
+# this table and the issue rows only hold its hash
+ISSUE_TEXT_COLUMNS = ["specific_issue"]
+ISSUE_TEXTS_TABLE = Table("Issue_Texts", TEXT_COLUMNS, None)
+
+
+def texts_tables(tables):
+    """
+    Returns the tables as they're written with deduplicated texts: the issue
+    text columns hold hashes, and are named for them, and the texts table
+    follows the others
+    """
+    return [
+        table._replace(columns=hashed_columns(table.columns, ISSUE_TEXT_COLUMNS))
+        for table in tables
+    ] + [ISSUE_TEXTS_TABLE]
+
+
+def get_table(name):
+    return next(table for table in TABLES if table.name == name)
+
+
+def issue_conditions(conditions):
+    return [condition for condition in conditions if condition.column == "code"]
+
+
+def parse_source(tables, source, conditions=()):
+    """
+    Parses every filing in a single source file that matches the conditions
+    and returns its rows for each table.
+    """
+    stats.count("documents")
+    rows = [[] for table in tables]
+    try:
+        with open_source(source) as f:
+            for filing in SenateFile(f).filings(conditions):
+                with stats.timer("extract"):
+                    for (table, table_rows) in zip(tables, rows):
+                        table_rows.extend(table.rows(filing))
+    except ValueError as err:
+        stats.count("parse_failures")
+        return source.file_id, err, None
+    return source.file_id, None, rows
+
+
+def select_texts(tables, rows, conditions=(), columns=None, texts=False):
+    """
+    Limits issue rows to any code condition and projects the rows for each
+    table onto columns. With texts, the issue texts are replaced by their
+    hashes and the rows of the texts table follow the others.
+    """
+    rows = select_rows(tables, rows, issue_conditions(conditions), columns)
+    if not texts:
+        return rows
+    return intern_texts(
+        [columns or table.columns for table in tables], rows, ISSUE_TEXT_COLUMNS
+    )
+
+
+def extract_source(
+    tables, source, cache=None, conditions=(), columns=None, texts=False
+):
+    """
+    Returns the rows of every filing in a single source file that matches the
+    conditions for each table, from the cache if it has them, selected with
+    select_texts. This runs in the worker processes, so it only takes and
+    returns picklable values.
+    """
+    # Cached rows can't be matched against filings, so filtered runs parse
+    if cache is None or conditions:
+        (file_id, err, rows) = parse_source(tables, source, conditions)
+    else:
+        (file_id, err, rows) = cache.extract(
+            "SenateFile", tables, TABLES, parse_source, source
+        )
+    if err is not None:
+        return file_id, err, rows
+    return file_id, None, select_texts(tables, rows, conditions, columns, texts)
+
+
+# Filings sent to a worker at a time when parsing with a pool of workers
+CHUNK_FILINGS = 256
+
+
+def filing_chunks(sources, conditions=(), chunk_size=CHUNK_FILINGS):
+    """
+    Reads the filings of each source that match the conditions, yielding
+    (source, serialized filings, error) for every chunk_size of them, so
+    workers can extract the rows of one chunk while the next is read. A
+    source that can't be read ends with a chunk of the filings read before
+    the error, along with it.
+    """
+    from lxml import etree
+
+    for source in sources:
+        stats.count("documents")
+        chunk = []
         try:
-            file = SenateFile(contents)
-            for filing in file.filings():
-                yield filing
+            with open_source(source) as f:
+                for filing in SenateFile(f).filings(conditions):
+                    with stats.timer("serialize"):
+                        chunk.append(etree.tostring(filing.obj, with_tail=False))
+                    if len(chunk) == chunk_size:
+                        yield (source, chunk, None)
+                        chunk = []
         except ValueError as err:
-            print("Could not read {}. Error: {}".format(file_id, err), file=sys.stderr)
+            stats.count("parse_failures")
+            yield (source, chunk, err)
+            continue
+        if chunk:
+            yield (source, chunk, None)
+
+
+def extract_chunk(tables, conditions, columns, texts, chunk):
+    """
+    Returns (source, error, rows) for a chunk from filing_chunks, with the
+    rows of its filings for each table selected with select_texts. This runs
+    in the worker processes.
+    """
+    from lxml import objectify
+
+    (source, filings, err) = chunk
+    rows = [[] for table in tables]
+    if filings:
+        with stats.timer("parse"):
+            root = objectify.fromstring(
+                b"<PublicFilings>" + b"".join(filings) + b"</PublicFilings>"
+            )
+        with stats.timer("extract"):
+            for element in root.iterchildren():
+                filing = Filing(element)
+                for (table, table_rows) in zip(tables, rows):
+                    table_rows.extend(table.rows(filing))
+    return (source, err, select_texts(tables, rows, conditions, columns, texts))
+
+
+def source_rows(
+    tables, sources, workers=1, cache=None, conditions=(), columns=None, texts=False
+):
+    """
+    Yields (source, error, rows) for the sources in order, with one list of
+    rows per table selected with select_texts, for each part of a source:
+    each filing when parsing serially, each chunk of filings when parsing
+    with a pool of workers, or the whole source with a cache, whose entries
+    are whole sources. Only a cache holds a whole source in memory. A source
+    that can't be read yields the error last, with rows of None or the rows
+    of the filings read before it.
+    """
+    if cache is not None:
+        sources = list(sources)
+        extract = partial(
+            extract_source,
+            tables,
+            cache=cache,
+            conditions=conditions,
+            columns=columns,
+            texts=texts,
+        )
+        for (source, (_, err, rows)) in zip(
+            sources, map_sources(extract, sources, workers)
+        ):
+            yield (source, err, rows)
+        return
+    try:
+        if workers > 1:
+            extract = partial(extract_chunk, tables, conditions, columns, texts)
+            for result in map_ordered(
+                extract, filing_chunks(sources, conditions), workers
+            ):
+                yield result
+            return
+        for source in sources:
+            stats.count("documents")
+            try:
+                with open_source(source) as f:
+                    for filing in SenateFile(f).filings(conditions):
+                        with stats.timer("extract"):
+                            rows = [list(table.rows(filing)) for table in tables]
+                        yield (
+                            source,
+                            None,
+                            select_texts(tables, rows, conditions, columns, texts),
+                        )
+            except ValueError as err:
+                stats.count("parse_failures")
+                yield (source, err, None)
+    finally:
+        close_archives()
+
+
+def extract_tables(
+    tables, files, workers=1, cache=None, conditions=(), columns=None, texts=False
+):
+    """
+    Yields the rows for each table, one list of rows per table at a time,
+    for each part of a source file as described in source_rows. Filings are
+    streamed, so memory use doesn't grow with the size of a file, unless a
+    cache is used. With texts, each list is followed by the rows of the
+    texts table for the texts that haven't been seen before.
+    """
+    seen = set()
+    for (source, err, rows) in source_rows(
+        tables, list_sources(files), workers, cache, conditions, columns, texts
+    ):
+        if rows is not None:
+            yield unique_texts(seen, rows) if texts else rows
+        if err is not None:
+            print(
+                "Could not read {}. Error: {}".format(source.file_id, err),
+                file=sys.stderr,
+            )
+    if cache is not None:
+        cache.evict()
+
+
+def check_conditions(conditions):
+    check_columns(
+        [condition.column for condition in conditions], WHERE_COLUMNS, "--where column"
+    )
+
+
+def export_table(
+    table,
+    files,
+    workers=1,
+    output_format="csv",
+    cache=None,
+    conditions=(),
+    columns=None,
+    texts_output=None,
+):
+    """
+    Writes a single table to stdout. With texts_output, each distinct issue
+    text is written once to that file instead, and the rows hold its hash.
+    """
+    check_conditions(conditions)
+    if columns is not None:
+        check_columns(columns, table.columns, "column")
+    header = columns or table.columns
+    if texts_output is not None:
+        header = hashed_columns(header, ISSUE_TEXT_COLUMNS)
+    writers = []
+    try:
+        writers.append(stdout_writer(header, output_format))
+        if texts_output is not None:
+            writers.append(file_writer(texts_output, TEXT_COLUMNS, output_format))
+        for table_rows in extract_tables(
+            [table],
+            files,
+            workers,
+            cache,
+            conditions,
+            columns,
+            texts_output is not None,
+        ):
+            write_rows(writers, table_rows)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+def export_tables(
+    tables,
+    files,
+    output_prefix,
+    workers=1,
+    manifest=None,
+    output_format="csv",
+    cache=None,
+    conditions=(),
+    dedup_texts=False,
+    shards=None,
+):
+    """
+    Extracts every table from each filing in a single pass, writing each
+    table to <output_prefix>_<table name>.<format>. With a manifest, only files
+    that changed since the last run are parsed. With dedup_texts, each
+    distinct issue text is written once to the Issue_Texts table, and the
+    issue rows hold its hash. With shards, each table is written as that
+    many shards per year and quarter, as described in ShardWriter.
+    """
+    check_conditions(conditions)
+    if manifest is not None:
+        if output_format != "csv":
+            raise ValueError("Incremental runs only support csv output")
+        if conditions or dedup_texts or shards:
+            raise ValueError(
+                "Incremental runs can't be filtered, deduplicated or sharded"
+            )
+        incremental.export_tables(
+            tables,
+            list_sources(files),
+            partial(source_rows, tables, workers=workers, cache=cache),
+            output_prefix,
+            manifest,
+        )
+        if cache is not None:
+            cache.evict()
+        return
+    if shards is not None:
+        if dedup_texts:
+            raise ValueError("Sharded output can't be deduplicated")
+        writer = ShardWriter(
+            output_prefix, tables, shards, "year", ["type", "period"], output_format
+        )
+        try:
+            for (filing_id, rows) in deltas.filing_rows(
+                extract_tables(tables, files, workers, cache, conditions)
+            ):
+                writer.write(filing_id, rows)
+        finally:
+            writer.close()
+        writer.write_manifest()
+        return
+    output_tables = texts_tables(tables) if dedup_texts else tables
+    writers = [
+        file_writer(
+            "{}_{}{}".format(output_prefix, table.name, extension(output_format)),
+            table.columns,
+            output_format,
+        )
+        for table in output_tables
+    ]
+    try:
+        for table_rows in extract_tables(
+            tables, files, workers, cache, conditions, texts=dedup_texts
+        ):
+            write_rows(writers, table_rows)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+workers_option = click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(1, None),
+    help="Number of processes to parse files with",
+)
+
+format_option = click.option(
+    "--format",
+    "output_format",
+    default="csv",
+    type=click.Choice(FORMATS),
+    help="Output file format",
+)
+
+manifest_option = click.option(
+    "--manifest",
+    type=click.Path(),
+    help="Only parse files that changed since the run recorded in this file",
+)
+
+
+where_option = click.option(
+    "--where",
+    "conditions",
+    multiple=True,
+    callback=parse_conditions,
+    help="Only extract filings where column=value. Can be given more than once",
+)
+
+columns_option = click.option(
+    "--columns",
+    callback=parse_columns,
+    help="Comma separated columns to output, in order",
+)
+
+
+texts_output_option = click.option(
+    "--texts-output",
+    type=click.Path(dir_okay=False),
+    help="Write each distinct specific_issue text once to this file, and only "
+    "its hash in the rows",
+)
+
+
+def set_cache_size(ctx, param, value):
+    ctx.meta["cache_size"] = value
+
+
+def open_cache(ctx, param, value):
+    if value is None:
+        return None
+    return DocumentCache(value, ctx.meta.get("cache_size", DEFAULT_MAX_SIZE) << 20)
+
+
+def cache_option(command):
+    command = click.option(
+        "--cache",
+        type=click.Path(file_okay=False),
+        callback=open_cache,
+        help="Directory to cache the rows extracted from each file in. Cached "
+        "files are read whole rather than streamed a filing at a time",
+    )(command)
+    # Eager, so the size is known by the time the cache is opened
+    return click.option(
+        "--cache-size",
+        default=DEFAULT_MAX_SIZE,
+        type=click.IntRange(1, None),
+        is_eager=True,
+        expose_value=False,
+        callback=set_cache_size,
+        help="Largest size of the cache in MB",
+    )(command)
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--stats",
+    "show_stats",
+    is_flag=True,
+    help="Write a JSON summary of time per stage, rows and bytes to stderr",
+)
+@click.option(
+    "--profile", type=click.Path(), help="Write a cProfile dump of the run to this file"
+)
+@click.option(
+    "--tracemalloc",
+    "snapshot",
+    type=click.Path(),
+    help="Write a tracemalloc snapshot taken at the end of the run to this file",
+)
+@click.pass_context
+def cli(ctx, show_stats, profile, snapshot):
+    stats.instrument(ctx, show_stats, profile, snapshot)
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def filings(files):
-    COLUMNS = FILING_INFO_FIELDS
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        data.append(list(filing.info()))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def filings(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        get_table("Filings"), files, workers, output_format, cache, conditions, columns
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def lobbyists(files):
-    COLUMNS = ["filing_id"] + LOBBYIST_FIELDS
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        for lobbyist in filing.lobbyists():
-            data.append([filing.id] + list(lobbyist))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def lobbyists(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        get_table("Lobbyists"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def government_entities(files):
-    COLUMNS = ["filing_id", "entity_name"]
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        for entity in filing.government_entities():
-            data.append([filing.id, entity])
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def government_entities(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        get_table("Government_Entities"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def issues(files):
-    COLUMNS = ["filing_id"] + ISSUE_FIELDS
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        for issue in filing.issues():
-            data.append([filing.id] + list(issue))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+@texts_output_option
+def issues(files, workers, output_format, cache, conditions, columns, texts_output):
+    export_table(
+        get_table("Issues"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+        texts_output,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def foreign_entities(files):
-    COLUMNS = ["filing_id"] + FOREIGN_ENTITY_FIELDS
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        for entity in filing.foreign_entities():
-            data.append([filing.id] + list(entity))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def foreign_entities(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        get_table("ForeignEntities"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def affiliated_orgs(files):
-    COLUMNS = ["filing_id"] + AFFILIATED_ORG_FIELDS
-    data = tablib.Dataset(headers=COLUMNS)
-    for filing in read_filings(files):
-        for org in filing.affiliated_orgs():
-            data.append([filing.id] + list(org))
-    sys.stdout.buffer.write(data.export("csv").encode())
+@workers_option
+@format_option
+@cache_option
+@where_option
+@columns_option
+def affiliated_orgs(files, workers, output_format, cache, conditions, columns):
+    export_table(
+        get_table("AffiliatedOrgs"),
+        files,
+        workers,
+        output_format,
+        cache,
+        conditions,
+        columns,
+    )
+
+
+@cli.command()
+@click.argument("output_prefix", type=click.Path())
+@click.argument("files", nargs=-1, type=click.Path())
+@workers_option
+@manifest_option
+@format_option
+@cache_option
+@where_option
+@click.option(
+    "--shards",
+    type=click.IntRange(1, None),
+    help="Write each table as this many shards per year and quarter, "
+    "partitioned by a hash of the filing id, with a manifest",
+)
+@click.option(
+    "--dedup-texts",
+    is_flag=True,
+    help="Write each distinct specific_issue text once to an Issue_Texts table, "
+    "and only its hash in Issues",
+)
+def extract_all(
+    output_prefix,
+    files,
+    workers,
+    manifest,
+    output_format,
+    cache,
+    conditions,
+    shards,
+    dedup_texts,
+):
+    if manifest is not None and output_format != "csv":
+        raise click.UsageError("--manifest can only be used with csv output")
+    if manifest is not None and conditions:
+        raise click.UsageError("--manifest can't be used with --where")
+    if manifest is not None and dedup_texts:
+        raise click.UsageError("--manifest can't be used with --dedup-texts")
+    if manifest is not None and shards is not None:
+        raise click.UsageError("--manifest can't be used with --shards")
+    if shards is not None and dedup_texts:
+        raise click.UsageError("--shards can't be used with --dedup-texts")
+    export_tables(
+        TABLES,
+        files,
+        output_prefix,
+        workers,
+        manifest,
+        output_format,
+        cache,
+        conditions,
+        dedup_texts,
+        shards,
+    )
+
+
+@cli.command()
+@click.argument("old", type=click.Path(exists=True))
+@click.argument("new", type=click.Path(exists=True))
+@click.argument("output_prefix", type=click.Path())
+@workers_option
+@format_option
+@cache_option
+def diff(old, new, output_prefix, workers, output_format, cache):
+    """
+    Compares two snapshots of the same file (an older and a newer download of
+    a quarter, say) and writes only the filings that were inserted or changed
+    to <output_prefix>_<table>, and every inserted, changed and removed
+    filing id to <output_prefix>_Changes
+    """
+    deltas.export_diff(
+        TABLES,
+        extract_tables(TABLES, [old], workers, cache),
+        extract_tables(TABLES, [new], workers, cache),
+        output_prefix,
+        output_format,
+    )
 
 
 if __name__ == "__main__":
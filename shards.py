@@ -0,0 +1,208 @@
+from collections import OrderedDict
+import hashlib
+import json
+from os import path
+import os
+import re
+import shutil
+
+from download_cache import sha256_file
+from writers import extension, file_writer, write_rows
+
+
+SHARDS_VERSION = 1
+
+# The most shard files kept open at once. Each open file holds a descriptor,
+# and each Parquet writer buffers up to a batch of rows.
+MAX_OPEN_WRITERS = 64
+
+QUARTER_WORDS = {
+    "FIRST": "Q1",
+    "1ST": "Q1",
+    "SECOND": "Q2",
+    "2ND": "Q2",
+    "THIRD": "Q3",
+    "3RD": "Q3",
+    "FOURTH": "Q4",
+    "4TH": "Q4",
+}
+
+
+def shard_of(filing_id, shards):
+    # Python's hash() changes from run to run, so a digest is used instead
+    digest = hashlib.sha1(str(filing_id).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shards
+
+
+def quarter_of(values):
+    """
+    Returns Q1-Q4 for the first of values that names a quarter, such as
+    "Q2", "Q2Y" or "2nd Quarter (Apr 1 - June 30)", or "none"
+    """
+    for value in values:
+        value = (value or "").upper()
+        match = re.match(r"Q([1-4])", value)
+        if match:
+            return "Q" + match.group(1)
+        for word in value.split():
+            if word in QUARTER_WORDS:
+                return QUARTER_WORDS[word]
+    return "none"
+
+
+def partition_value(value):
+    # Partition values become directory names
+    return re.sub(r"[^\w-]", "_", value) if value else "unknown"
+
+
+class ShardWriter:
+    """
+    Writes each table as shards partitioned by year and quarter, and within
+    those by a stable hash of the filing id, so the shards can be loaded
+    in parallel. Shards are written to
+    <output_prefix>_<table>/year=<year>/quarter=<quarter>/part-<shard>, and
+    once they are closed, write_manifest() lists each one with its row count
+    and SHA-256 in <output_prefix>_shards.json.
+
+    Rows are written a filing at a time. The first table must be the one
+    with a row per filing, which holds the year_column and quarter_columns
+    the filing is partitioned by.
+
+    At most max_open_writers shards are open at once; the least recently
+    written one is closed to make room. A CSV shard that is written to again
+    is reopened and appended to. Parquet files can't be appended to, so a
+    Parquet shard is continued in another file, part-<shard>-<n>, which the
+    manifest lists as well.
+
+    The shards and manifest of an earlier run with the same output_prefix
+    are removed first, so none of their files are left alongside the new
+    ones.
+    """
+
+    def __init__(
+        self,
+        output_prefix,
+        tables,
+        shards,
+        year_column,
+        quarter_columns,
+        output_format="csv",
+        max_open_writers=MAX_OPEN_WRITERS,
+    ):
+        self.output_prefix = output_prefix
+        self.tables = tables
+        self.shards = shards
+        self.year_index = tables[0].columns.index(year_column)
+        self.quarter_indexes = [
+            tables[0].columns.index(column) for column in quarter_columns
+        ]
+        self.output_format = output_format
+        # A filing's rows are written to a shard of every table together
+        self.max_open_writers = max(max_open_writers, len(tables))
+        # The open writers by filename, least recently written first
+        self.writers = OrderedDict()
+        # The row count and partition of every file written, by its filename
+        self.rows = {}
+        self.partitions = {}
+        # The file each shard is currently written to, and how many it has
+        self.filenames = {}
+        self.parts = {}
+        self.remove_output()
+
+    def table_directory(self, table):
+        return "{}_{}".format(self.output_prefix, table.name)
+
+    def manifest_filename(self):
+        return "{}_shards.json".format(self.output_prefix)
+
+    def remove_output(self):
+        # The manifest goes first, so it never lists shards that are gone
+        if path.exists(self.manifest_filename()):
+            os.remove(self.manifest_filename())
+        for table in self.tables:
+            shutil.rmtree(self.table_directory(table), ignore_errors=True)
+
+    def shard_filename(self, table, year, quarter, shard, part=0):
+        return path.join(
+            self.table_directory(table),
+            "year={}".format(year),
+            "quarter={}".format(quarter),
+            "part-{:03d}{}{}".format(
+                shard, "-{}".format(part) if part else "", extension(self.output_format)
+            ),
+        )
+
+    def writer_for(self, table, year, quarter, shard):
+        key = (table.name, year, quarter, shard)
+        filename = self.filenames.get(key)
+        if filename in self.writers:
+            self.writers.move_to_end(filename)
+            return filename
+        while len(self.writers) >= self.max_open_writers:
+            (_, writer) = self.writers.popitem(last=False)
+            writer.close()
+        if filename is not None and self.output_format == "csv":
+            self.writers[filename] = file_writer(
+                filename, table.columns, self.output_format, append=True
+            )
+            return filename
+        part = self.parts.get(key, 0)
+        filename = self.shard_filename(table, year, quarter, shard, part)
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        self.writers[filename] = file_writer(
+            filename, table.columns, self.output_format
+        )
+        self.rows[filename] = 0
+        self.partitions[filename] = key
+        self.filenames[key] = filename
+        self.parts[key] = part + 1
+        return filename
+
+    def write(self, filing_id, rows):
+        (filing_row,) = rows[0]
+        year = partition_value(filing_row[self.year_index])
+        quarter = quarter_of(filing_row[index] for index in self.quarter_indexes)
+        shard = shard_of(filing_id, self.shards)
+        filenames = [
+            self.writer_for(table, year, quarter, shard) for table in self.tables
+        ]
+        write_rows([self.writers[filename] for filename in filenames], rows)
+        for (filename, table_rows) in zip(filenames, rows):
+            self.rows[filename] += len(table_rows)
+
+    def close(self):
+        while self.writers:
+            (_, writer) = self.writers.popitem(last=False)
+            writer.close()
+
+    def write_manifest(self):
+        entries = []
+        for filename in sorted(self.rows):
+            (table, year, quarter, shard) = self.partitions[filename]
+            entries.append(
+                {
+                    "table": table,
+                    "path": path.relpath(
+                        filename, path.dirname(self.output_prefix) or "."
+                    ),
+                    "year": year,
+                    "quarter": quarter,
+                    "shard": shard,
+                    "rows": self.rows[filename],
+                    "sha256": sha256_file(filename),
+                }
+            )
+        manifest_file = self.manifest_filename()
+        with open(manifest_file + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "version": SHARDS_VERSION,
+                    "shards_per_partition": self.shards,
+                    "format": self.output_format,
+                    "tables": [table.name for table in self.tables],
+                    "shards": entries,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(manifest_file + ".tmp", manifest_file)
@@ -0,0 +1,145 @@
+from collections import deque, namedtuple
+from functools import partial
+import hashlib
+from os import path
+import os
+from pathlib import Path
+import zipfile
+
+import stats
+
+
+# A single input document: either a file on disk (archive is None) or a
+# member of a zip archive. Sources are cheap to pickle, so they are what
+# gets sent to worker processes rather than parsed documents.
+Source = namedtuple("Source", ["file_id", "archive", "name"])
+
+
+def source_key(source):
+    if source.archive is None:
+        return source.name
+    return "{}:{}".format(path.basename(source.archive), source.name)
+
+
+def list_sources(files):
+    for file in files:
+        if path.isdir(file):
+            for f in os.listdir(file):
+                yield Source(Path(f).stem, None, path.join(file, f))
+        elif zipfile.is_zipfile(file):
+            with zipfile.ZipFile(file, "r") as zfile:
+                names = zfile.namelist()
+            for name in names:
+                yield Source(Path(name).stem, file, name)
+        else:
+            yield Source(Path(file).stem, None, file)
+
+
+# Zip archives opened by this process, so each one is only opened once
+_archives = {}
+
+
+def open_archive(archive):
+    if archive not in _archives:
+        _archives[archive] = zipfile.ZipFile(archive, "r")
+    return _archives[archive]
+
+
+def close_archives():
+    for zfile in _archives.values():
+        zfile.close()
+    _archives.clear()
+
+
+def forget_archives():
+    # Forked workers inherit the parent's archives, whose file offsets are
+    # shared with it, so each worker opens its own instead
+    _archives.clear()
+
+
+def open_source(source):
+    """
+    Returns a binary file object for the source. Zip members are streamed
+    (and decompressed) as they are read, so a member is never copied into a
+    single bytes object before it is parsed.
+    """
+    with stats.timer("open"):
+        if source.archive is None:
+            stream = open(source.name, "rb")
+            stats.count("compressed_bytes_in", os.fstat(stream.fileno()).st_size)
+        else:
+            info = open_archive(source.archive).getinfo(source.name)
+            stream = open_archive(source.archive).open(info)
+            stats.count("compressed_bytes_in", info.compress_size)
+    return stats.timed_reader(stream)
+
+
+def map_sources(func, sources, workers=1, chunksize=1):
+    """
+    Applies func to each source, spreading the work over a pool of worker
+    processes when workers > 1. Results are yielded in the same order as the
+    sources either way, so output is identical to a serial run.
+    """
+    if workers <= 1:
+        try:
+            for source in sources:
+                yield func(source)
+        finally:
+            close_archives()
+        return
+    if stats.enabled():
+        # Workers send back the stats for each source along with its result
+        func = partial(stats.collect, func)
+    import multiprocessing
+
+    with multiprocessing.Pool(workers, initializer=forget_archives) as pool:
+        for result in pool.imap(func, sources, chunksize):
+            yield unpack_result(result)
+
+
+def map_ordered(func, items, workers, pending=None):
+    """
+    Applies func to each item in a pool of worker processes, yielding the
+    results in the same order as the items. Unlike map_sources, at most
+    pending items (twice the workers by default) are taken ahead of the
+    results being consumed, so items can be read lazily from a large stream
+    without all of them being held in memory.
+    """
+    if stats.enabled():
+        func = partial(stats.collect, func)
+    import multiprocessing
+
+    pending = pending or 2 * workers
+    with multiprocessing.Pool(workers, initializer=forget_archives) as pool:
+        results = deque()
+        for item in items:
+            results.append(pool.apply_async(func, (item,)))
+            while len(results) >= pending:
+                yield unpack_result(results.popleft().get())
+        while results:
+            yield unpack_result(results.popleft().get())
+
+
+def unpack_result(result):
+    # Workers send back the stats they recorded along with each result
+    if not stats.enabled():
+        return result
+    (result, snapshot) = result
+    stats.merge(snapshot)
+    return result
+
+
+def source_hash(source):
+    """
+    Returns a string that changes whenever the contents of the source do.
+    Zip members use the CRC and size from the archive's directory, so
+    unchanged members never need to be decompressed.
+    """
+    if source.archive is None:
+        digest = hashlib.sha1()
+        with open(source.name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    info = open_archive(source.archive).getinfo(source.name)
+    return "{:08x}-{}".format(info.CRC, info.file_size)
@@ -1,26 +1,200 @@
 #!/usr/bin/env python3
 
 import click
-import pandas as pd
+import csv
 from pathlib import Path
 import sys
 
+from writers import FORMATS, arrow_schema, file_writer
 
-def read_senate_file(filename):
+
+# Rows read from each input at a time, which bounds memory use
+CHUNK_SIZE = 100000
+
+
+def senate_file_columns(filename):
     (year, quarter, contents) = Path(filename).stem.split("_", maxsplit=2)
-    df = pd.read_csv(filename)
-    df.insert(0, "file_year", year)
-    df.insert(1, "file_quarter", quarter)
-    return df
+    return [("file_year", year), ("file_quarter", quarter)]
 
 
-def read_house(filename):
+def house_file_columns(filename):
     (year, reporting_window, contents) = Path(filename).stem.split("_", maxsplit=2)
-    df = pd.read_csv(filename, dtype=object)
-    df.insert(0, "file_year", year)
-    if reporting_window != "Registrations":
-        df.insert(1, "file_reporting_window", reporting_window)
-    return df
+    if reporting_window == "Registrations":
+        return [("file_year", year)]
+    return [("file_year", year), ("file_reporting_window", reporting_window)]
+
+
+def is_parquet(filename):
+    return Path(filename).suffix == ".parquet"
+
+
+def read_columns(filename):
+    if is_parquet(filename):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(filename).names
+    with open(filename, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+
+def file_header(filename, extra_columns, expected):
+    columns = [name for (name, _) in extra_columns] + read_columns(filename)
+    if expected is not None and columns != expected:
+        raise ValueError(
+            "{} has columns {}, expected {}".format(filename, columns, expected)
+        )
+    return columns
+
+
+def read_chunks(filename):
+    import pandas as pd
+
+    if is_parquet(filename):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(filename).iter_batches(CHUNK_SIZE):
+            yield batch.to_pandas()
+        return
+    # Values are kept as text, so every chunk of every file is read the same
+    # way, and only empty values are missing, as they are in copy_csv_files
+    for chunk in pd.read_csv(
+        filename,
+        dtype=object,
+        keep_default_na=False,
+        na_values=[""],
+        chunksize=CHUNK_SIZE,
+    ):
+        yield chunk
+
+
+def copy_csv_files(files, file_columns, output):
+    """
+    Stacks CSV files into CSV output a row at a time with the csv module,
+    which is all that's needed when no values are parsed, so pandas isn't
+    imported at all. The output is the same as stack_files writes with
+    pandas: the excel dialect with Unix line endings.
+    """
+    writer = csv.writer(output, lineterminator="\n")
+    expected = None
+    for filename in files:
+        extra_columns = file_columns(filename)
+        columns = file_header(filename, extra_columns, expected)
+        if expected is None:
+            expected = columns
+            writer.writerow(columns)
+        values = [value for (_, value) in extra_columns]
+        with open(filename, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            # pandas skips blank lines
+            writer.writerows(values + row for row in reader if row)
+    output.flush()
+
+
+class CsvStackWriter:
+    def __init__(self, output, columns, column_types=None):
+        import pandas as pd
+
+        self.output = output
+        pd.DataFrame(columns=columns).to_csv(output, index=False)
+
+    def write(self, chunk):
+        chunk.to_csv(self.output, index=False, header=False)
+
+    def close(self):
+        self.output.flush()
+
+
+class ParquetStackWriter:
+    def __init__(self, output, columns, column_types=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.output = output
+        self.schema = arrow_schema(columns, column_types)
+        self.writer = pq.ParquetWriter(output, self.schema)
+
+    def write(self, chunk):
+        arrays = [
+            self.pa.array(chunk[field.name], from_pandas=True).cast(field.type)
+            for field in self.schema
+        ]
+        self.writer.write_batch(
+            self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        )
+
+    def close(self):
+        self.writer.close()
+        self.output.flush()
+
+
+STACK_WRITERS = {"csv": CsvStackWriter, "parquet": ParquetStackWriter}
+
+
+def stack_files(
+    files, file_columns, output, output_format="csv", typed=False, errors=None
+):
+    """
+    Appends each file to output a chunk at a time, adding the columns
+    returned by file_columns(filename) to the front of every row. Every file
+    must have the same columns.
+
+    With typed, amounts, dates and flags are parsed a chunk at a time with
+    normalize.normalize_chunk, and values that can't be parsed are written
+    to the errors writer, if there is one. Returns the number of them.
+    Untyped CSV is stacked without pandas, by copy_csv_files.
+    """
+    if output_format == "csv" and not typed and not any(map(is_parquet, files)):
+        copy_csv_files(files, file_columns, output)
+        return 0
+    from normalize import ARROW_TYPES, normalize_chunk
+
+    expected = None
+    writer = None
+    error_count = 0
+    try:
+        for filename in files:
+            extra_columns = file_columns(filename)
+            columns = file_header(filename, extra_columns, expected)
+            if expected is None:
+                expected = columns
+                writer = STACK_WRITERS[output_format](
+                    output, columns, ARROW_TYPES if typed else None
+                )
+            offset = 0
+            for chunk in read_chunks(filename):
+                if typed:
+                    chunk_errors = normalize_chunk(chunk, filename, offset)
+                    if chunk_errors is not None:
+                        error_count += len(chunk_errors)
+                        if errors is not None:
+                            for row in chunk_errors.itertuples(index=False):
+                                errors.write(row)
+                    offset += len(chunk)
+                for (i, (name, value)) in enumerate(extra_columns):
+                    chunk.insert(i, name, value)
+                writer.write(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return error_count
+
+
+def open_output(output, output_format):
+    if output_format == "csv":
+        return open(output, "w", newline="", encoding="utf-8")
+    return open(output, "wb")
+
+
+def stack_house(files, output, output_format="csv", typed=False, errors=None):
+    with open_output(output, output_format) as f:
+        return stack_files(files, house_file_columns, f, output_format, typed, errors)
+
+
+def stack_senate(files, output, output_format="csv", typed=False, errors=None):
+    with open_output(output, output_format) as f:
+        return stack_files(files, senate_file_columns, f, output_format, typed, errors)
 
 
 @click.group()
@@ -28,20 +202,75 @@ def cli():
     pass
 
 
+def stdout_for(output_format):
+    return sys.stdout if output_format == "csv" else sys.stdout.buffer
+
+
+format_option = click.option(
+    "--format",
+    "output_format",
+    default="csv",
+    type=click.Choice(FORMATS),
+    help="Output file format",
+)
+
+
+typed_option = click.option(
+    "--typed",
+    is_flag=True,
+    help="Parse amounts, dates and flags into numbers, timestamps and booleans",
+)
+
+errors_option = click.option(
+    "--errors",
+    "errors_file",
+    type=click.Path(dir_okay=False),
+    help="With --typed, write the values that couldn't be parsed to this file",
+)
+
+
+def stack_command(files, file_columns, output_format, typed, errors_file):
+    if errors_file is not None and not typed:
+        raise click.UsageError("--errors can only be used with --typed")
+    errors = None
+    try:
+        if errors_file is not None:
+            from normalize import ERROR_COLUMNS
+
+            errors = file_writer(errors_file, ERROR_COLUMNS)
+        error_count = stack_files(
+            files,
+            file_columns,
+            stdout_for(output_format),
+            output_format,
+            typed,
+            errors,
+        )
+    except ValueError as err:
+        raise click.ClickException(str(err))
+    finally:
+        if errors is not None:
+            errors.close()
+    if error_count:
+        click.echo("{} values couldn't be parsed".format(error_count), err=True)
+
+
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def house(files):
-    frames = [read_house(file) for file in files]
-    stack = pd.concat(frames)
-    stack.to_csv(sys.stdout, index=False)
+@format_option
+@typed_option
+@errors_option
+def house(files, output_format, typed, errors_file):
+    stack_command(files, house_file_columns, output_format, typed, errors_file)
 
 
 @cli.command()
 @click.argument("files", nargs=-1, type=click.Path())
-def senate(files):
-    frames = [read_senate_file(file) for file in files]
-    stack = pd.concat(frames)
-    stack.to_csv(sys.stdout, index=False)
+@format_option
+@typed_option
+@errors_option
+def senate(files, output_format, typed, errors_file):
+    stack_command(files, senate_file_columns, output_format, typed, errors_file)
 
 
 if __name__ == "__main__":
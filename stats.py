@@ -0,0 +1,208 @@
+from collections import defaultdict
+import io
+import json
+import sys
+import time
+
+
+class Stats:
+    """
+    Accumulates the time spent in each stage of a run, along with counters
+    such as documents, rows and bytes read and written.
+
+    Stage times are exclusive: time spent in a stage that is entered while
+    another is running (reading the stream while parsing, say) is only
+    counted against the inner stage.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.start = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        # Time spent in nested stages, for each stage currently running
+        self.nested = []
+
+    def snapshot(self):
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+    def merge(self, snapshot):
+        for (stage, seconds) in snapshot["seconds"].items():
+            self.seconds[stage] += seconds
+        for (name, count) in snapshot["counts"].items():
+            self.counts[name] += count
+
+    def reset(self):
+        self.seconds.clear()
+        self.counts.clear()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        summary = {
+            "elapsed_seconds": elapsed,
+            "stage_seconds": dict(self.seconds),
+            "documents_per_second": self.counts["documents"] / elapsed,
+            "rows_per_second": self.counts["rows"] / elapsed,
+        }
+        summary.update(self.counts)
+        return summary
+
+
+class Timer:
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.stats.nested.append(0.0)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        nested = self.stats.nested.pop()
+        self.stats.seconds[self.stage] += elapsed - nested
+        if self.stats.nested:
+            self.stats.nested[-1] += elapsed
+
+
+class NullTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_stats = Stats()
+_null_timer = NullTimer()
+
+
+def enable():
+    _stats.enabled = True
+    _stats.start = time.perf_counter()
+
+
+def enabled():
+    return _stats.enabled
+
+
+def timer(stage):
+    if not _stats.enabled:
+        return _null_timer
+    return Timer(_stats, stage)
+
+
+def count(name, n=1):
+    if _stats.enabled:
+        _stats.counts[name] += n
+
+
+def collect(func, source):
+    """
+    Runs func(source) in a worker process with stats enabled, returning the
+    result along with the stats it recorded so the parent can merge them.
+    """
+    enable()
+    _stats.reset()
+    result = func(source)
+    return result, _stats.snapshot()
+
+
+def merge(snapshot):
+    _stats.merge(snapshot)
+
+
+def report(output=None):
+    json.dump(_stats.summary(), output or sys.stderr, indent=2, sort_keys=True)
+    (output or sys.stderr).write("\n")
+
+
+class TimedReader:
+    """
+    Wraps a binary file object being parsed, timing its reads (which is
+    where zip members are decompressed) and counting the bytes read.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        with timer("read"):
+            data = self.stream.read(size)
+        count("bytes_in", len(data))
+        return data
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CountingStream(io.RawIOBase):
+    """
+    Wraps a binary output stream, counting the bytes written to it. The
+    wrapped stream is only closed if owns_stream is set.
+    """
+
+    def __init__(self, stream, owns_stream=False):
+        self.stream = stream
+        self.owns_stream = owns_stream
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        count("bytes_out", len(data))
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        # Closing flushes, so the wrapped stream is closed afterwards
+        super().close()
+        if self.owns_stream:
+            self.stream.close()
+
+
+def timed_reader(stream):
+    return TimedReader(stream) if _stats.enabled else stream
+
+
+def counting_stream(stream, owns_stream=False):
+    if not _stats.enabled:
+        return stream
+    return CountingStream(stream, owns_stream)
+
+
+def instrument(ctx, show_stats=False, profile=None, snapshot=None):
+    """
+    Turns on the requested instrumentation until the click context closes:
+    a stats summary on stderr, a cProfile dump written to profile and/or a
+    tracemalloc snapshot written to snapshot.
+    """
+    if show_stats:
+        enable()
+        ctx.call_on_close(report)
+    if profile is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump_profile():
+            profiler.disable()
+            profiler.dump_stats(profile)
+
+        ctx.call_on_close(dump_profile)
+    if snapshot is not None:
+        import tracemalloc
+
+        tracemalloc.start()
+        ctx.call_on_close(lambda: tracemalloc.take_snapshot().dump(snapshot))
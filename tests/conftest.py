@@ -0,0 +1,23 @@
+from os import path
+import sys
+
+import pytest
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+
+# The modules are scripts at the top of the repository rather than a package
+sys.path.insert(0, REPO)
+sys.path.insert(0, path.join(REPO, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def corpus(tmpdir_factory):
+    """
+    A directory holding a small generated corpus: 2018_Registrations_XML.zip,
+    2018_1stQuarter_XML.zip and 2018_1.zip
+    """
+    from generate import generate
+
+    output_dir = str(tmpdir_factory.mktemp("corpus"))
+    generate(output_dir, 2018, 30, 30, 200, 3, 4, 1)
+    return output_dir
@@ -0,0 +1,81 @@
+from os import path
+import sqlite3
+
+from click.testing import CliRunner
+import pytest
+
+import database
+from test_processors import DEDUP_TEXTS, SOURCES, extract_all, parse_csv
+
+
+def load(args):
+    result = CliRunner().invoke(database.cli, ["load"] + args)
+    assert result.exit_code == 0, result.output
+
+
+def table_rows(connection, name):
+    return connection.execute('SELECT * FROM "{}"'.format(name)).fetchall()
+
+
+def columns(connection, name):
+    return [
+        row[1] for row in connection.execute('PRAGMA table_info("{}")'.format(name))
+    ]
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+def test_load_sqlite(corpus, tmpdir, source):
+    filename = path.join(corpus, SOURCES[source][3])
+    outputs = extract_all(source, corpus, str(tmpdir.join("csv")))
+    db = str(tmpdir.join("lobbying.db"))
+    # Loading the same file again replaces the rows rather than adding to them
+    for run in range(2):
+        load(["--database", db, source, filename])
+        connection = sqlite3.connect(db)
+        for table in database.source_tables(source):
+            name = database.table_name(source, table)
+            [header, *rows] = parse_csv(outputs[table.name])
+            assert columns(connection, name) == header
+            assert len(table_rows(connection, name)) == len(rows)
+        connection.close()
+
+
+@pytest.mark.parametrize("source", sorted(DEDUP_TEXTS))
+def test_load_sqlite_dedup_texts(corpus, tmpdir, source):
+    filename = path.join(corpus, SOURCES[source][3])
+    (issues_table, _, column) = DEDUP_TEXTS[source]
+    tables = database.texts_tables(source, database.source_tables(source))
+    issues = next(
+        database.table_name(source, table)
+        for table in tables
+        if table.name == issues_table
+    )
+    texts = database.table_name(source, tables[-1])
+    db = str(tmpdir.join("lobbying.db"))
+    load(["--database", db, source, filename])
+    connection = sqlite3.connect(db)
+    header = columns(connection, issues)
+    expected = table_rows(connection, issues)
+    connection.close()
+
+    # The tables are replaced, hash columns and all
+    load(["--database", db, "--dedup-texts", source, filename])
+    connection = sqlite3.connect(db)
+    assert columns(connection, issues) == [
+        name + "_hash" if name == column else name for name in header
+    ]
+    hashes = [text_hash for (text_hash, _) in table_rows(connection, texts)]
+    assert len(hashes) == len(set(hashes))
+    joined = connection.execute(
+        'SELECT {} FROM "{}" LEFT JOIN "{}" ON "{}_hash" = text_hash'.format(
+            ", ".join(
+                "coalesce(text, '')" if name == column else '"{}"'.format(name)
+                for name in header
+            ),
+            issues,
+            texts,
+            column,
+        )
+    ).fetchall()
+    assert joined == expected
+    connection.close()
@@ -0,0 +1,55 @@
+import os
+from os import path
+
+from document_cache import DocumentCache
+
+
+def fill(cache, keys):
+    for (i, key) in enumerate(keys):
+        cache.put(key, [key] * 100)
+        # Older entries were used longer ago
+        os.utime(cache.entry_path(key), (i, i))
+
+
+def test_evict_removes_least_recently_used(tmpdir, monkeypatch):
+    cache = DocumentCache(str(tmpdir))
+    keys = ["{:02x}{}".format(i, "0" * 38) for i in range(6)]
+    fill(cache, keys)
+    sizes = cache.read_index()
+    assert sorted(sizes) == keys
+    cache.max_bytes = sum(sizes.values()) - 1
+    # Used most recently
+    cache.get(keys[0])
+    cache.evict()
+    assert [path.exists(cache.entry_path(key)) for key in keys] == [
+        True,
+        False,
+        True,
+        True,
+        True,
+        True,
+    ]
+    assert sorted(cache.read_index()) == keys[:1] + keys[2:]
+
+    # Under the cap, only the index is read
+    def walk(directory):
+        raise AssertionError("The cache directory shouldn't be walked")
+
+    monkeypatch.setattr(os, "walk", walk)
+    cache.evict()
+    assert path.exists(cache.entry_path(keys[0]))
+
+
+def test_index_is_rebuilt(tmpdir):
+    cache = DocumentCache(str(tmpdir))
+    keys = ["{:02x}{}".format(i, "0" * 38) for i in range(3)]
+    fill(cache, keys)
+    sizes = cache.read_index()
+    os.remove(cache.index_path)
+    os.remove(cache.entry_path(keys[1]))
+    assert cache.read_index() == dict((key, sizes[key]) for key in keys[::2])
+    # Entries removed by hand are dropped when the cache is over its cap
+    os.remove(cache.entry_path(keys[0]))
+    cache.max_bytes = 1
+    cache.evict()
+    assert cache.read_index() == {}
@@ -0,0 +1,34 @@
+from os import path
+
+from generate import generate
+import senate_processor
+
+
+def senate_rows(output_dir):
+    tables = senate_processor.TABLES
+    rows = dict((table.name, []) for table in tables)
+    for filing in senate_processor.extract_tables(
+        tables, [path.join(output_dir, "2018_1.zip")], 1
+    ):
+        for (table, table_rows) in zip(tables, filing):
+            rows[table.name].extend(table_rows)
+    return rows
+
+
+def test_generated_filings_fill_every_senate_column(tmpdir):
+    output_dir = str(tmpdir)
+    generate(output_dir, 2018, 0, 0, 200, 2, 4, 1)
+    rows = senate_rows(output_dir)
+    assert len(rows["Filings"]) == 200
+    for table in senate_processor.TABLES:
+        empty = [
+            column
+            for (i, column) in enumerate(table.columns)
+            if not any(row[i] for row in rows[table.name])
+        ]
+        assert empty == [], table.name
+    # The client is required, so every filing names one
+    filings = senate_processor.get_table("Filings")
+    for column in ["client_name", "client_id", "client_state"]:
+        i = filings.columns.index(column)
+        assert all(row[i] for row in rows["Filings"]), column
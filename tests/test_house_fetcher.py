@@ -0,0 +1,276 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import io
+import json
+import os
+from os import path
+import socketserver
+import threading
+from urllib.parse import parse_qs
+import zipfile
+
+from click.testing import CliRunner
+import pytest
+
+import house_fetcher
+
+
+HOUSE_PAGE = """
+<html><body><form method="post">
+<input type="hidden" id="__VIEWSTATEGENERATOR" value="generator" />
+<input type="hidden" id="__VIEWSTATE" value="state" />
+<input type="hidden" id="__EVENTVALIDATION" value="validation" />
+<select name="selFilesXML">
+<option value="2018 Registrations (XML)">2018 Registrations (XML)</option>
+</select>
+</form></body></html>
+"""
+
+SESSION_COOKIE = "ASP.NET_SessionId=session"
+
+
+def zip_bytes(text):
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as zfile:
+        for i in range(20):
+            zfile.writestr(
+                "2018_1_{}.xml".format(i), "<Filing>{} {}</Filing>".format(text, i)
+            )
+    return stream.getvalue()
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, headers=(), body=b""):
+        self.send_response(status)
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.log.append((self.command, self.path, dict(self.headers), status))
+
+    def serve_file(self, name):
+        (content, etag) = self.server.files[name]
+        headers = [("ETag", etag), ("Accept-Ranges", "bytes")]
+        if self.headers.get("If-None-Match") == etag:
+            return self.send(304, headers)
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range") in (None, etag):
+            first = int(byte_range[len("bytes=") : -1])
+            if first >= len(content):
+                return self.send(
+                    416, [("Content-Range", "bytes */{}".format(len(content)))]
+                )
+            headers.append(
+                (
+                    "Content-Range",
+                    "bytes {}-{}/{}".format(first, len(content) - 1, len(content)),
+                )
+            )
+            return self.send(206, headers, content[first:])
+        self.send(200, headers, content)
+
+    def do_GET(self):
+        if self.path == "/house":
+            return self.send(
+                200,
+                [("Set-Cookie", SESSION_COOKIE + "; Path=/")],
+                HOUSE_PAGE.encode("utf-8"),
+            )
+        name = self.path[len("/senate/") :]
+        if self.path.startswith("/senate/") and name in self.server.files:
+            return self.serve_file(name)
+        self.send(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        form = parse_qs(body.decode("utf-8"))
+        # The form tokens are only accepted from the session that loaded them
+        if SESSION_COOKIE not in self.headers.get("Cookie", "") or form.get(
+            "__VIEWSTATE"
+        ) != ["state"]:
+            return self.send(403)
+        self.serve_file(form["selFilesXML"][0])
+
+
+@pytest.fixture
+def server():
+    server = ThreadingServer(("127.0.0.1", 0), Handler)
+    server.files = {
+        "2018 Registrations (XML)": (zip_bytes("house"), '"house-1"'),
+        "2018_1.zip": (zip_bytes("senate"), '"senate-1"'),
+    }
+    server.log = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def sync(server, data_dir, *args):
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    result = CliRunner().invoke(
+        house_fetcher.cli,
+        [
+            "sync",
+            "--data-dir",
+            data_dir,
+            "--house-url",
+            url + "/house",
+            "--senate-url",
+            url + "/senate/",
+            "--first-senate-year",
+            "2018",
+        ]
+        + list(args),
+    )
+    assert result.exit_code == 0, result.output
+    return result.output.split()
+
+
+def read(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def statuses(server, name):
+    return [status for (_, request, _, status) in server.log if name in request]
+
+
+def test_first_download_then_not_modified(server, tmpdir):
+    data_dir = str(tmpdir)
+    house = path.join(data_dir, "house", "2018_Registrations_XML.zip")
+    senate = path.join(data_dir, "senate", "2018_1.zip")
+    assert sorted(sync(server, data_dir)) == [house, senate]
+    assert read(house) == server.files["2018 Registrations (XML)"][0]
+    assert read(senate) == server.files["2018_1.zip"][0]
+
+    mtimes = [os.stat(house).st_mtime_ns, os.stat(senate).st_mtime_ns]
+    del server.log[:]
+    assert sync(server, data_dir) == []
+    assert [status for (method, _, _, status) in server.log if method == "POST"] == [
+        304
+    ]
+    assert statuses(server, "2018_1.zip") == [304]
+    assert [os.stat(house).st_mtime_ns, os.stat(senate).st_mtime_ns] == mtimes
+
+
+def write_partial(data_dir, content, etag, length=None):
+    partial = path.join(data_dir, "senate", "2018_1.zip.part")
+    os.makedirs(path.dirname(partial))
+    with open(partial, "wb") as f:
+        f.write(content)
+    with open(partial + ".json", "w") as f:
+        json.dump({"etag": etag, "last_modified": None, "length": length}, f)
+    return partial
+
+
+def check_senate_file(server, data_dir, partial):
+    senate = path.join(data_dir, "senate", "2018_1.zip")
+    assert read(senate) == server.files["2018_1.zip"][0]
+    with zipfile.ZipFile(senate) as zfile:
+        assert zfile.testzip() is None
+    assert not path.exists(partial)
+    assert not path.exists(partial + ".json")
+
+
+def test_resumes_partial_download(server, tmpdir):
+    data_dir = str(tmpdir)
+    (content, etag) = server.files["2018_1.zip"]
+    partial = write_partial(data_dir, content[:100], etag, len(content))
+    sync(server, data_dir, "--no-house")
+    [(_, _, headers, status)] = [
+        entry for entry in server.log if "2018_1.zip" in entry[1]
+    ]
+    assert headers["Range"] == "bytes=100-"
+    assert headers["If-Range"] == etag
+    assert status == 206
+    check_senate_file(server, data_dir, partial)
+
+
+def test_partial_of_changed_file_starts_again(server, tmpdir):
+    data_dir = str(tmpdir)
+    old = zip_bytes("old senate")
+    partial = write_partial(data_dir, old[: len(old) // 2], '"senate-0"', len(old))
+    sync(server, data_dir, "--no-house")
+    assert statuses(server, "2018_1.zip") == [200]
+    check_senate_file(server, data_dir, partial)
+
+
+def test_partial_without_validator_is_discarded(server, tmpdir):
+    data_dir = str(tmpdir)
+    partial = write_partial(data_dir, b"junk", None)
+    sync(server, data_dir, "--no-house")
+    [(_, _, headers, status)] = [
+        entry for entry in server.log if "2018_1.zip" in entry[1]
+    ]
+    assert "Range" not in headers
+    assert status == 200
+    check_senate_file(server, data_dir, partial)
+
+
+def test_complete_partial_is_kept(server, tmpdir):
+    data_dir = str(tmpdir)
+    (content, etag) = server.files["2018_1.zip"]
+    partial = write_partial(data_dir, content, etag, len(content))
+    sync(server, data_dir, "--no-house")
+    assert statuses(server, "2018_1.zip") == [416]
+    check_senate_file(server, data_dir, partial)
+
+
+def test_oversized_partial_starts_again(server, tmpdir):
+    data_dir = str(tmpdir)
+    (content, etag) = server.files["2018_1.zip"]
+    partial = write_partial(data_dir, content + b"extra", etag)
+    sync(server, data_dir, "--no-house")
+    assert statuses(server, "2018_1.zip") == [416, 200]
+    check_senate_file(server, data_dir, partial)
+
+
+def test_local_changes_of_the_same_size_are_noticed(server, tmpdir):
+    data_dir = str(tmpdir)
+    senate = path.join(data_dir, "senate", "2018_1.zip")
+    sync(server, data_dir, "--no-house")
+    # A local file that's changed keeps its size, but not its timestamp
+    content = read(senate)
+    with open(senate, "wb") as f:
+        f.write(b"x" * len(content))
+    info = os.stat(senate)
+    os.utime(senate, ns=(info.st_atime_ns, info.st_mtime_ns + 10 ** 9))
+    assert sync(server, data_dir, "--no-house", "--force") == [senate]
+    assert read(senate) == content
+    mtime = os.stat(senate).st_mtime_ns
+    assert sync(server, data_dir, "--no-house", "--force") == []
+    assert os.stat(senate).st_mtime_ns == mtime
+
+
+def list_changed(server, data_dir):
+    url = "http://127.0.0.1:{}/house".format(server.server_address[1])
+    result = CliRunner().invoke(
+        house_fetcher.cli,
+        ["list", "--changed", "--data-dir", data_dir, "--house-url", url],
+    )
+    assert result.exit_code == 0, result.output
+    return result.output.splitlines()
+
+
+def test_list_changed(server, tmpdir):
+    data_dir = str(tmpdir)
+    assert list_changed(server, data_dir) == ["2018\tRegistrations"]
+    sync(server, data_dir)
+    assert list_changed(server, data_dir) == []
+    server.files["2018 Registrations (XML)"] = (zip_bytes("new house"), '"house-2"')
+    house = path.join(data_dir, "house", "2018_Registrations_XML.zip")
+    content = read(house)
+    assert list_changed(server, data_dir) == ["2018\tRegistrations"]
+    # Listing only reads the headers, so the file isn't replaced
+    assert read(house) == content
+    assert sync(server, data_dir, "--no-senate") == [house]
+    assert list_changed(server, data_dir) == []
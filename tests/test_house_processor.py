@@ -0,0 +1,135 @@
+import csv
+import io
+from os import path
+import zipfile
+
+from click.testing import CliRunner
+from lxml import etree
+
+from generate import Generator
+import house_processor
+
+
+def write_report(filename, values):
+    report = Generator(1, 2, 2018).report(700000000, 1)
+    for (tag, text) in values.items():
+        report.find(tag).text = text
+    for (index, lobbyist) in enumerate(report.iter("lobbyistNew")):
+        lobbyist.text = "YN"[index % 2]
+    with zipfile.ZipFile(filename, "w") as zfile:
+        zfile.writestr("700000000.xml", etree.tostring(report))
+
+
+def command_rows(command, filename):
+    result = CliRunner().invoke(house_processor.cli, [command, filename])
+    assert result.exit_code == 0, result.output
+    return list(csv.DictReader(io.StringIO(result.output)))
+
+
+def test_boolean_and_numeric_output(tmpdir):
+    filename = str(tmpdir.join("reports.zip"))
+    write_report(
+        filename,
+        {
+            "noLobbying": "true",
+            "selfSelect": "false",
+            "registrantDifferentAddress": " true ",
+            "income": "5,000.00",
+            "expenses": "5000.00",
+            "zip": "02134",
+            "contactPhone": "0123",
+        },
+    )
+    [report] = command_rows("reports", filename)
+    # true and false are written as True and False, as they always have been,
+    # and everything else, numbers included, as it is in the document
+    assert report["no_lobbying"] == "True"
+    assert report["self_select"] == "False"
+    assert report["registrant_different_address"] == "true"
+    assert report["income"] == "5,000.00"
+    assert report["expenses"] == "5000.00"
+    assert report["zip"] == "02134"
+    assert report["contact_phone"] == "0123"
+    lobbyists = command_rows("report_lobbyists", filename)
+    assert set(lobbyist["new"] for lobbyist in lobbyists) == {"True", "False"}
+
+
+def test_ali_code_leaves_inactive_issues(tmpdir):
+    filename = str(tmpdir.join("reports.zip"))
+    write_report(filename, {"updates/inactive_ALIs/ali_Code": "TAX"})
+    rows = command_rows("report_issues", filename)
+    code = rows[0]["ali_code"]
+    inactive = command_rows("report_inactive_issues", filename)
+    assert len(inactive) == 1
+    where = ["--where", "ali_code=" + code, filename]
+    result = CliRunner().invoke(house_processor.cli, ["report_issues"] + where)
+    issues = list(csv.DictReader(io.StringIO(result.output)))
+    assert issues == [row for row in rows if row["ali_code"] == code]
+    result = CliRunner().invoke(house_processor.cli, ["report_inactive_issues"] + where)
+    assert list(csv.DictReader(io.StringIO(result.output))) == inactive
+
+
+def test_prescan_recovers_like_the_parser(tmpdir):
+    filename = str(tmpdir.join("reports.zip"))
+    report = etree.tostring(Generator(1, 2, 2018).report(700000000, 1))
+    # An unescaped & is an error that the LD2 parser recovers from
+    report = report.replace(b"<clientName>", b"<clientName>A & ", 1)
+    with zipfile.ZipFile(filename, "w") as zfile:
+        zfile.writestr("700000000.xml", report)
+    [row] = command_rows("reports", filename)
+    where = ["--where", "report_year=2018", filename]
+    result = CliRunner().invoke(house_processor.cli, ["reports"] + where)
+    assert list(csv.DictReader(io.StringIO(result.output))) == [row]
+
+
+def test_prescan_is_strict_like_the_registrations_parser(tmpdir):
+    filename = str(tmpdir.join("registrations.zip"))
+    registration = etree.tostring(Generator(1, 2, 2018).registration(300000000))
+    registration = registration.replace(b"<clientName>", b"<clientName>A & ", 1)
+    with zipfile.ZipFile(filename, "w") as zfile:
+        zfile.writestr("300000000.xml", registration)
+    for where in [[], ["--where", "client_country=none"]]:
+        result = CliRunner().invoke(
+            house_processor.cli, ["registrations"] + where + [filename]
+        )
+        assert isinstance(result.exception, etree.XMLSyntaxError)
+
+
+def test_where_reads_cached_rows(corpus, tmpdir, monkeypatch):
+    filename = path.join(corpus, "2018_1stQuarter_XML.zip")
+    cache = ["--cache", str(tmpdir.join("cache"))]
+    where = ["--where", "ali_code=TAX", "--where", "expenses_method=B"]
+    expected = CliRunner().invoke(house_processor.cli, ["reports"] + where + [filename])
+    assert expected.output.count("\n") > 1
+    CliRunner().invoke(house_processor.cli, ["reports"] + cache + [filename])
+
+    def prescan(stream, checks, recover):
+        raise AssertionError("Cached documents shouldn't be scanned")
+
+    monkeypatch.setattr(house_processor, "prescan", prescan)
+    result = CliRunner().invoke(
+        house_processor.cli, ["reports"] + cache + where + [filename]
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output == expected.output
+
+
+def test_issues_are_read_once(tmpdir, monkeypatch):
+    filename = str(tmpdir.join("reports.zip"))
+    write_report(filename, {})
+    read_issues = house_processor.HouseReportFile.read_issues
+    calls = []
+
+    def counted(self):
+        calls.append(self)
+        return read_issues(self)
+
+    monkeypatch.setattr(house_processor.HouseReportFile, "read_issues", counted)
+    result = CliRunner().invoke(
+        house_processor.cli,
+        ["extract_all", "reports", str(tmpdir.join("out")), filename],
+    )
+    assert result.exit_code == 0, result.output
+    assert len(calls) == 1
+    with open(str(tmpdir.join("out_Reports_Lobbyists.csv"))) as f:
+        assert len(f.readlines()) > 1
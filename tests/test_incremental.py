@@ -0,0 +1,157 @@
+import csv
+import json
+from os import path
+
+from click.testing import CliRunner
+import pytest
+
+import incremental
+import senate_processor
+from sources import list_sources
+
+
+def read_csv(filename):
+    with open(filename, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_unchanged_sources_are_copied(corpus, tmpdir, monkeypatch, workers):
+    files = [path.join(corpus, "2018_1.zip")]
+    output_prefix = str(tmpdir.join("out"))
+    manifest = str(tmpdir.join("manifest.json"))
+    runner = CliRunner()
+    result = runner.invoke(senate_processor.cli, ["extract_all", output_prefix] + files)
+    assert result.exit_code == 0, result.output
+    expected = [
+        read_csv("{}_{}.csv".format(output_prefix, table.name))
+        for table in senate_processor.TABLES
+    ]
+
+    # Members are streamed, and only ever opened in this process
+    opened = []
+    open_source = senate_processor.open_source
+
+    def counting_open_source(source):
+        opened.append(source.name)
+        return open_source(source)
+
+    monkeypatch.setattr(senate_processor, "open_source", counting_open_source)
+    for run in range(2):
+        result = runner.invoke(
+            senate_processor.cli,
+            ["extract_all", "--workers", workers, "--manifest", manifest]
+            + [output_prefix]
+            + files,
+        )
+        assert result.exit_code == 0, result.output
+        assert [
+            read_csv("{}_{}.csv".format(output_prefix, table.name))
+            for table in senate_processor.TABLES
+        ] == expected
+    # Every member is parsed by the first run and copied by the second
+    assert len(opened) == 3
+
+
+class Table:
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+
+
+def export(tmpdir, tables, failing=(), failing_partway=()):
+    """
+    Runs export_tables over the files in tmpdir/sources, each of which holds
+    two rows for each table, given a part at a time. Returns the names of the
+    files it read.
+    """
+    parsed = []
+
+    def extract_sources(sources):
+        for source in sources:
+            parsed.append(source.file_id)
+            if source.file_id in failing:
+                yield (source, "unreadable", None)
+                continue
+            with open(source.name) as f:
+                value = f.read()
+            for part in ["1", "2"]:
+                rows = [
+                    [[source.file_id, part] + [value] * (len(table.columns) - 2)]
+                    for table in tables
+                ]
+                if source.file_id in failing_partway:
+                    yield (source, "truncated", rows)
+                    break
+                yield (source, None, rows)
+
+    incremental.export_tables(
+        tables,
+        list(list_sources([str(tmpdir.join("sources"))])),
+        extract_sources,
+        str(tmpdir.join("out")),
+        str(tmpdir.join("manifest.json")),
+    )
+    return sorted(parsed)
+
+
+def read_output(tmpdir):
+    return sorted(read_csv(str(tmpdir.join("out_T.csv")))[1:])
+
+
+def write_sources(tmpdir, names):
+    for name in names:
+        tmpdir.join("sources", name + ".txt").write(name, ensure=True)
+
+
+def test_changed_columns_parse_every_source(tmpdir):
+    write_sources(tmpdir, ["a", "b"])
+    assert export(tmpdir, [Table("T", ["id", "part", "value"])]) == ["a", "b"]
+    assert export(tmpdir, [Table("T", ["id", "part", "value"])]) == []
+    tables = [Table("T", ["id", "part", "value", "other"])]
+    assert export(tmpdir, tables) == ["a", "b"]
+    assert read_output(tmpdir) == [
+        ["a", "1", "a", "a"],
+        ["a", "2", "a", "a"],
+        ["b", "1", "b", "b"],
+        ["b", "2", "b", "b"],
+    ]
+    with open(str(tmpdir.join("manifest.json"))) as f:
+        assert json.load(f)["tables"] == [["T", ["id", "part", "value", "other"]]]
+
+
+def manifest_entries(tmpdir):
+    with open(str(tmpdir.join("manifest.json"))) as f:
+        return dict(
+            (path.basename(entry["key"]), entry) for entry in json.load(f)["sources"]
+        )
+
+
+def test_failed_sources_are_retried(tmpdir):
+    write_sources(tmpdir, ["a", "b", "c", "d"])
+    tables = [Table("T", ["id", "part", "value"])]
+    assert export(tmpdir, tables, failing=["b"], failing_partway=["c"]) == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+    entries = manifest_entries(tmpdir)
+    # b wrote nothing, so it is left out; c is kept for the row it wrote, but
+    # without a hash
+    assert sorted(entries) == ["a.txt", "c.txt", "d.txt"]
+    assert entries["c.txt"]["hash"] is None
+    assert entries["c.txt"]["rows"] == [1]
+    assert read_output(tmpdir) == [
+        ["a", "1", "a"],
+        ["a", "2", "a"],
+        ["c", "1", "c"],
+        ["d", "1", "d"],
+        ["d", "2", "d"],
+    ]
+    assert export(tmpdir, tables) == ["b", "c"]
+    assert read_output(tmpdir) == [
+        [name, part, name] for name in "abcd" for part in "12"
+    ]
+    assert export(tmpdir, tables) == []
+    assert len(read_output(tmpdir)) == 8
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from lookup import LookupIndex, normalize_name
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "SMITH, JOHN JR",
+        "SMITH, JOHN JR.",
+        "Smith, John, Jr.",
+        "SMITH JR, JOHN",
+        "John Smith Jr.",
+        "john  smith jr",
+    ],
+)
+def test_suffix_follows_the_name(name):
+    assert normalize_name(name) == "john smith jr"
+
+
+def test_names_without_suffixes():
+    assert normalize_name("SMITH, JOHN A.") == "john a smith"
+    assert normalize_name("John A Smith") == "john a smith"
+    assert normalize_name("DOE, JANE III") == "jane doe iii"
+    assert normalize_name("JR, JOHN") == "john jr"
+
+
+def test_old_name_keys_are_recomputed(tmpdir):
+    database = str(tmpdir.join("index.db"))
+    LookupIndex(database).close()
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute(
+            "INSERT INTO names VALUES (?, ?, ?, ?, ?, ?)",
+            ("2018_1.zip:a.xml", "senate", "1", "lobbyist", "SMITH, JOHN JR", "old"),
+        )
+        connection.execute(
+            "INSERT INTO filings (source, chamber, filing_id) VALUES (?, ?, ?)",
+            ("2018_1.zip:a.xml", "senate", "1"),
+        )
+        connection.execute("PRAGMA user_version = 0")
+    connection.close()
+    with LookupIndex(database) as index:
+        [filing] = index.by_name("John Smith Jr")
+        assert filing.filing_id == "1"
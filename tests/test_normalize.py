@@ -0,0 +1,48 @@
+import math
+
+import pandas as pd
+
+from normalize import ERROR_COLUMNS, normalize_chunk
+
+
+def test_parses_typed_columns():
+    chunk = pd.DataFrame(
+        {
+            "income": ["$5,000.00", "5000", " ", "unknown"],
+            "signed_date": [
+                "01/02/2018 03:04:05 PM",
+                "2018-01-02T03:04:05.500",
+                "2018-01-02",
+                "yesterday",
+            ],
+            "new": ["Y", "False", " yes ", "maybe"],
+            "foreign_entity_issues": ["Yes", "N/A", "", "true"],
+        },
+        dtype=object,
+    )
+    errors = normalize_chunk(chunk, "reports.csv", offset=10)
+    assert list(chunk["income"][:2]) == [5000.0, 5000.0]
+    assert all(math.isnan(value) for value in chunk["income"][2:])
+    assert list(chunk["signed_date"][:3]) == [
+        pd.Timestamp("2018-01-02 15:04:05"),
+        pd.Timestamp("2018-01-02 03:04:05.5"),
+        pd.Timestamp("2018-01-02"),
+    ]
+    assert pd.isna(chunk["signed_date"][3])
+    assert list(chunk["new"][:3]) == [True, False, True]
+    assert pd.isna(chunk["new"][3])
+    # Free text columns are left as they were
+    assert list(chunk["foreign_entity_issues"]) == ["Yes", "N/A", "", "true"]
+    assert list(errors.columns) == ERROR_COLUMNS
+    assert errors.values.tolist() == [
+        ["reports.csv", 13, "income", "unknown"],
+        ["reports.csv", 13, "signed_date", "yesterday"],
+        ["reports.csv", 13, "new", "maybe"],
+    ]
+
+
+def test_no_errors():
+    chunk = pd.DataFrame({"amount": ["1", ""], "name": ["a", "b"]}, dtype=object)
+    assert normalize_chunk(chunk, "contributions.csv") is None
+    assert chunk["amount"][0] == 1.0
+    assert list(chunk["name"]) == ["a", "b"]
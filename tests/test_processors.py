@@ -0,0 +1,295 @@
+from collections import OrderedDict
+import csv
+import io
+from os import path
+import zipfile
+
+from click.testing import CliRunner
+import pytest
+
+import house_processor
+import senate_processor
+
+
+# The command that writes each table on its own
+HOUSE_COMMANDS = {
+    "Registrations_Records": "registrations",
+    "Registrations_Lobbyists": "lobbyists",
+    "Registrations_Issues": "issues",
+    "Registrations_AffiliatedOrgs": "affiliated_orgs",
+    "Registrations_ForeignEntities": "foreign_entities",
+    "Reports": "reports",
+    "Reports_Issues": "report_issues",
+    "Reports_Lobbyists": "report_lobbyists",
+    "Reports_Inactive_Lobbyists": "report_inactive_lobbyists",
+    "Reports_Inactive_Issues": "report_inactive_issues",
+    "Reports_Affiliated_Orgs": "report_affiliated_orgs",
+    "Reports_Inactive_Orgs": "report_inactive_orgs",
+    "Reports_ForeignEntities": "report_foreign_entities",
+    "Reports_Inactive_ForeignEntities": "report_inactive_foreign_entities",
+}
+SENATE_COMMANDS = {
+    "Filings": "filings",
+    "Lobbyists": "lobbyists",
+    "Government_Entities": "government_entities",
+    "Issues": "issues",
+    "ForeignEntities": "foreign_entities",
+    "AffiliatedOrgs": "affiliated_orgs",
+}
+
+# The processor, extract_all's arguments before the output prefix, the
+# tables and the corpus file of each kind of source
+SOURCES = {
+    "house_registrations": (
+        house_processor.cli,
+        ["registrations"],
+        house_processor.REGISTRATION_TABLES,
+        "2018_Registrations_XML.zip",
+    ),
+    "house_reports": (
+        house_processor.cli,
+        ["reports"],
+        house_processor.REPORT_TABLES,
+        "2018_1stQuarter_XML.zip",
+    ),
+    "senate": (senate_processor.cli, [], senate_processor.TABLES, "2018_1.zip"),
+}
+
+OPTIONS = {"serial": [], "workers": ["--workers", "2"], "cache": ["--cache", None]}
+
+
+def invoke(cli, args):
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def read(filename):
+    # The test runner's output has \n line endings rather than CSV's \r\n
+    with open(filename, encoding="utf-8") as f:
+        return f.read()
+
+
+def extract_all(source, corpus, output_prefix, options=(), input_file=None):
+    """
+    Runs extract_all over the input file, by default the corpus file of the
+    source, returning the text of each table's output by name
+    """
+    (cli, args, tables, filename) = SOURCES[source]
+    invoke(
+        cli,
+        ["extract_all"]
+        + args
+        + list(options)
+        + [output_prefix, input_file or path.join(corpus, filename)],
+    )
+    return dict(
+        (table.name, read("{}_{}.csv".format(output_prefix, table.name)))
+        for table in tables
+    )
+
+
+def with_cache(options, tmpdir):
+    return [
+        str(tmpdir.join("cache")) if option is None else option for option in options
+    ]
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+@pytest.mark.parametrize("option", sorted(OPTIONS))
+def test_extract_all_matches_table_commands(corpus, tmpdir, source, option):
+    (cli, _, tables, filename) = SOURCES[source]
+    commands = SENATE_COMMANDS if source == "senate" else HOUSE_COMMANDS
+    options = with_cache(OPTIONS[option], tmpdir)
+    expected = extract_all(source, corpus, str(tmpdir.join("serial")))
+    assert expected[tables[0].name].count("\n") > 1
+    # A cache is filled by the first run and read by the second
+    for run in range(2 if option == "cache" else 1):
+        output_prefix = str(tmpdir.join("{}{}".format(option, run)))
+        assert extract_all(source, corpus, output_prefix, options) == expected
+        for table in tables:
+            assert (
+                invoke(
+                    cli,
+                    [commands[table.name]] + options + [path.join(corpus, filename)],
+                )
+                == expected[table.name]
+            )
+
+
+def parse_csv(text):
+    return list(csv.reader(io.StringIO(text)))
+
+
+def filtered(outputs, ids, column, value):
+    """
+    Returns the outputs with only the rows of the filings in ids, and of
+    those only the rows whose column has value in the tables with column
+    """
+    expected = {}
+    for (name, output) in outputs.items():
+        [header, *rows] = parse_csv(output)
+        rows = [row for row in rows if row[0] in ids]
+        # The codes of inactive issues aren't filtered
+        if column in header and name != "Reports_Inactive_Issues":
+            rows = [row for row in rows if row[header.index(column)] == value]
+        expected[name] = [header] + rows
+    return expected
+
+
+@pytest.mark.parametrize(
+    "source,table,column,value",
+    [
+        ("senate", "Filings", "client_state", "CA"),
+        ("senate", "Issues", "code", "TAX"),
+        ("house_registrations", "Registrations_Records", "reg_type", "1"),
+        ("house_reports", "Reports", "expenses_method", "B"),
+        ("house_reports", "Reports_Issues", "ali_code", "TAX"),
+    ],
+)
+@pytest.mark.parametrize("option", sorted(OPTIONS))
+def test_where(corpus, tmpdir, source, table, column, value, option):
+    outputs = extract_all(source, corpus, str(tmpdir.join("all")))
+    [header, *rows] = parse_csv(outputs[table])
+    ids = set(row[0] for row in rows if row[header.index(column)] == value)
+    assert 0 < len(ids) < len(set(row[0] for row in rows))
+    # Only conditions on issue codes limit the rows of a filing
+    limited = column if table != SOURCES[source][2][0].name else None
+    expected = filtered(outputs, ids, limited, value)
+
+    options = with_cache(OPTIONS[option], tmpdir) + [
+        "--where",
+        "{}={}".format(column, value),
+    ]
+    outputs = extract_all(source, corpus, str(tmpdir.join("where")), options)
+    assert (
+        dict((name, parse_csv(output)) for (name, output) in outputs.items())
+        == expected
+    )
+    if option == "cache":
+        # Once every document is cached, the conditions are checked against
+        # the cached rows
+        extract_all(source, corpus, str(tmpdir.join("fill")), options[:2])
+        outputs = extract_all(source, corpus, str(tmpdir.join("hits")), options)
+        assert (
+            dict((name, parse_csv(output)) for (name, output) in outputs.items())
+            == expected
+        )
+
+
+# The text of a document to change, and the encoding of each kind of source
+CHANGES = {
+    "house_registrations": ("<organizationName>", "utf-8"),
+    "house_reports": ("<organizationName>", "utf-8"),
+    "senate": ('RegistrantName="', "utf-16"),
+}
+
+
+def write_snapshot(filename, members):
+    with zipfile.ZipFile(filename, "w") as zfile:
+        for (name, content) in members:
+            zfile.writestr(name, content)
+
+
+def filing_outputs(tables, outputs):
+    """
+    Returns the rows of each filing for each table, by filing id
+    """
+    filings = OrderedDict()
+    for (i, table) in enumerate(tables):
+        for row in parse_csv(outputs[table.name])[1:]:
+            filings.setdefault(row[0], [[] for _ in tables])[i].append(row)
+    return filings
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+def test_diff(corpus, tmpdir, source):
+    (cli, args, tables, filename) = SOURCES[source]
+    with zipfile.ZipFile(path.join(corpus, filename)) as zfile:
+        members = [(name, zfile.read(name)) for name in zfile.namelist()]
+    # The newer snapshot drops the first member, adds the last and changes a
+    # filing in the second
+    (text, encoding) = CHANGES[source]
+    (name, content) = members[1]
+    changed = content.decode(encoding).replace(text, text + "Changed ", 1)
+    old = str(tmpdir.join("old.zip"))
+    write_snapshot(old, members[:-1])
+    new = str(tmpdir.join("new.zip"))
+    write_snapshot(new, [(name, changed.encode(encoding))] + members[2:])
+
+    old_filings = filing_outputs(
+        tables, extract_all(source, corpus, str(tmpdir.join("old")), [], old)
+    )
+    new_filings = filing_outputs(
+        tables, extract_all(source, corpus, str(tmpdir.join("new")), [], new)
+    )
+    changes = []
+    for (filing_id, rows) in new_filings.items():
+        if filing_id not in old_filings:
+            changes.append([filing_id, "inserted"])
+        elif old_filings[filing_id] != rows:
+            changes.append([filing_id, "changed"])
+    changes.extend(
+        [filing_id, "removed"]
+        for filing_id in old_filings
+        if filing_id not in new_filings
+    )
+    kinds = [change for (_, change) in changes]
+    assert kinds.count("changed") == 1
+    assert "inserted" in kinds and "removed" in kinds
+
+    output_prefix = str(tmpdir.join("diff"))
+    invoke(cli, ["diff"] + args + [old, new, output_prefix])
+    assert [
+        row[:2] for row in parse_csv(read(output_prefix + "_Changes.csv"))[1:]
+    ] == changes
+    written = [filing_id for (filing_id, change) in changes if change != "removed"]
+    for (i, table) in enumerate(tables):
+        assert parse_csv(read("{}_{}.csv".format(output_prefix, table.name))) == [
+            table.columns
+        ] + [row for filing_id in written for row in new_filings[filing_id][i]]
+
+
+# The issues table, the texts table and the texts column of the sources
+# with --dedup-texts
+DEDUP_TEXTS = {
+    "house_reports": ("Reports_Issues", "Reports_Issue_Texts", "specific_issues"),
+    "senate": ("Issues", "Issue_Texts", "specific_issue"),
+}
+
+
+@pytest.mark.parametrize("source", sorted(DEDUP_TEXTS))
+def test_dedup_texts(corpus, tmpdir, source):
+    (cli, _, tables, filename) = SOURCES[source]
+    (issues_table, texts_table, column) = DEDUP_TEXTS[source]
+    commands = SENATE_COMMANDS if source == "senate" else HOUSE_COMMANDS
+    expected = extract_all(source, corpus, str(tmpdir.join("all")))
+    outputs = extract_all(source, corpus, str(tmpdir.join("dedup")), ["--dedup-texts"])
+    assert set(outputs) == set(expected)
+    [header, *rows] = parse_csv(read(str(tmpdir.join("dedup_" + texts_table + ".csv"))))
+    assert header == ["text_hash", "text"]
+    texts = dict(rows)
+    assert len(texts) == len(rows)
+
+    [header, *rows] = parse_csv(outputs[issues_table])
+    [expected_header, *expected_rows] = parse_csv(expected[issues_table])
+    index = expected_header.index(column)
+    assert (
+        header
+        == expected_header[:index] + [column + "_hash"] + expected_header[index + 1 :]
+    )
+    assert [
+        row[:index] + [texts.get(row[index], "")] + row[index + 1 :] for row in rows
+    ] == expected_rows
+    for table in tables:
+        if table.name != issues_table:
+            assert outputs[table.name] == expected[table.name]
+
+    texts_output = str(tmpdir.join("texts.csv"))
+    output = invoke(
+        cli,
+        [commands[issues_table], "--texts-output", texts_output]
+        + [path.join(corpus, filename)],
+    )
+    assert output == outputs[issues_table]
+    assert dict(parse_csv(read(texts_output))[1:]) == texts
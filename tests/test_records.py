@@ -0,0 +1,122 @@
+import io
+from os import path
+import zipfile
+
+import pytest
+
+import house_processor
+import records
+import senate_processor
+from test_processors import SOURCES
+
+
+def corpus_file(corpus, source):
+    return path.join(corpus, SOURCES[source][3])
+
+
+def expected_rows(corpus, source, tables):
+    """
+    Returns the rows of each table by name, as the processors extract them
+    """
+    filename = corpus_file(corpus, source)
+    if source == "senate":
+        extracted = senate_processor.extract_tables(tables, [filename])
+    else:
+        extracted = house_processor.extract_tables(
+            records.DOCUMENT_CLASSES[source], tables, [filename]
+        )
+    rows = dict((table.name, []) for table in tables)
+    for table_rows in extracted:
+        for (table, new_rows) in zip(tables, table_rows):
+            rows[table.name].extend(new_rows)
+    return rows
+
+
+def batch_rows(kind, batch):
+    if kind == "records":
+        return [list(record) for record in batch]
+    if kind == "numpy":
+        return [list(row) for row in batch.tolist()]
+    return [list(row.values()) for row in batch.to_pylist()]
+
+
+def read_all(source, data, kind="records", **options):
+    rows = {}
+    for (name, batch) in records.read_batches(source, data, kind=kind, **options):
+        rows.setdefault(name, []).extend(batch_rows(kind, batch))
+    return rows
+
+
+class Unseekable(io.RawIOBase):
+    """
+    A stream that can only be read, like stdin
+    """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+@pytest.mark.parametrize("kind", records.BATCH_KINDS)
+def test_read_batches(corpus, source, kind):
+    tables = records.SOURCE_TABLES[source]
+    expected = expected_rows(corpus, source, tables)
+    batch_sizes = []
+    for (name, batch) in records.read_batches(
+        source, corpus_file(corpus, source), batch_size=7, kind=kind
+    ):
+        batch_sizes.append(len(batch))
+    assert max(batch_sizes) == 7
+    rows = read_all(source, corpus_file(corpus, source), kind, batch_size=7)
+    assert rows == dict((name, rows) for (name, rows) in expected.items() if rows)
+
+
+@pytest.mark.parametrize("source", sorted(SOURCES))
+def test_read_streams(corpus, source):
+    filename = corpus_file(corpus, source)
+    expected = read_all(source, filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+    assert read_all(source, data) == expected
+    assert read_all(source, io.BufferedReader(Unseekable(data))) == expected
+
+
+def test_read_table(corpus):
+    [table] = records.select_tables("senate", ["Issues"])
+    expected = expected_rows(corpus, "senate", [table])["Issues"]
+    batches = list(
+        records.read_table("senate", "Issues", corpus_file(corpus, "senate"), 10)
+    )
+    assert [list(record) for batch in batches for record in batch] == expected
+    assert all(type(record).__name__ == "Issues" for record in batches[0])
+    assert list(batches[0][0]) == [
+        getattr(batches[0][0], column) for column in table.columns
+    ]
+
+
+def test_single_house_document_needs_an_id(corpus):
+    with zipfile.ZipFile(corpus_file(corpus, "house_reports")) as zfile:
+        name = zfile.namelist()[0]
+        data = zfile.read(name)
+    file_id = path.splitext(name)[0]
+    expected = read_all("house_reports", corpus_file(corpus, "house_reports"))
+    expected = dict(
+        (table, [row for row in rows if row[0] == file_id])
+        for (table, rows) in expected.items()
+    )
+    expected = dict((table, rows) for (table, rows) in expected.items() if rows)
+    with pytest.raises(ValueError):
+        read_all("house_reports", data)
+    with pytest.raises(ValueError):
+        read_all("house_reports", io.BufferedReader(Unseekable(data)))
+    assert read_all("house_reports", data, file_id=file_id) == expected
+    assert (
+        read_all("house_reports", io.BufferedReader(Unseekable(data)), file_id=file_id)
+        == expected
+    )
@@ -0,0 +1,57 @@
+import csv
+import io
+from os import path
+import shutil
+import sqlite3
+
+from click.testing import CliRunner
+import pytest
+
+import search
+
+# The corpus file of each kind of source
+FILES = {"house_reports": "2018_1stQuarter_XML.zip", "senate": "2018_1.zip"}
+
+
+def invoke(args):
+    result = CliRunner().invoke(search.cli, args)
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def search_rows(index, query):
+    output = invoke(["search", "--limit", "1000", index, query])
+    return list(csv.reader(io.StringIO(output)))
+
+
+def first_text(index, field):
+    connection = sqlite3.connect(index)
+    try:
+        return connection.execute(
+            "SELECT filing_id, text FROM texts WHERE field = ? ORDER BY id", (field,)
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize(
+    "source,field", [("house_reports", "specific_issues"), ("senate", "specific_issue")]
+)
+def test_index_and_search(corpus, tmpdir, source, field):
+    filename = path.join(corpus, FILES[source])
+    index = str(tmpdir.join("search.db"))
+    invoke(["index", index, source, filename])
+    (filing_id, text) = first_text(index, field)
+    query = text.split("\n")[0]
+    rows = search_rows(index, query)
+    assert rows[0] == search.RESULT_COLUMNS
+    assert [filing_id, field] in [row[1:3] for row in rows[1:]]
+    # Documents that haven't changed aren't indexed again
+    assert "Indexed 0 documents" in invoke(["index", index, source, filename])
+
+    # A cumulative snapshot holds the same filings again, but each text of a
+    # filing is still found once
+    snapshot = str(tmpdir.join("snapshot.zip"))
+    shutil.copy(filename, snapshot)
+    invoke(["index", index, source, snapshot])
+    assert search_rows(index, query) == rows
@@ -0,0 +1,47 @@
+from os import path
+
+import senate_processor
+from sources import list_sources
+
+
+def concatenated(results):
+    tables = [[] for table in senate_processor.TABLES]
+    for (_, err, rows) in results:
+        assert err is None
+        for (table_rows, part) in zip(tables, rows):
+            table_rows.extend(part)
+    return tables
+
+
+def test_chunks_hold_the_same_rows_as_a_serial_run(corpus):
+    tables = senate_processor.TABLES
+    sources = list(list_sources([path.join(corpus, "2018_1.zip")]))
+    serial = list(senate_processor.source_rows(tables, sources))
+    # Each filing is its own part when parsing serially
+    assert len(serial) == 200
+    chunks = list(senate_processor.filing_chunks(sources, chunk_size=7))
+    # The members of 67, 67 and 66 filings are each split into 10 chunks
+    assert len(chunks) == 30
+    assert all(0 < len(filings) <= 7 for (_, filings, _) in chunks)
+    assert concatenated(
+        senate_processor.extract_chunk(tables, (), None, False, chunk)
+        for chunk in chunks
+    ) == concatenated(serial)
+
+
+def test_workers_split_members_into_chunks(corpus, tmpdir, monkeypatch):
+    files = [path.join(corpus, "2018_1.zip")]
+    tables = senate_processor.TABLES
+    expected = concatenated(
+        (None, None, rows) for rows in senate_processor.extract_tables(tables, files)
+    )
+    filing_chunks = senate_processor.filing_chunks
+
+    def small_chunks(sources, conditions=()):
+        return filing_chunks(sources, conditions, chunk_size=10)
+
+    monkeypatch.setattr(senate_processor, "filing_chunks", small_chunks)
+    parts = list(senate_processor.extract_tables(tables, files, workers=2))
+    # 7, 7 and 7 chunks of the three members, rather than one part per member
+    assert len(parts) == 21
+    assert concatenated((None, None, rows) for rows in parts) == expected
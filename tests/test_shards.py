@@ -0,0 +1,126 @@
+import csv
+import glob
+import json
+from os import path
+
+from click.testing import CliRunner
+import pytest
+
+import deltas
+import senate_processor
+from shards import ShardWriter
+
+
+def read_csv(filename):
+    with open(filename, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def read_shards(output_prefix, table, output_format):
+    """
+    Returns the header and the sorted rows of every shard of a table
+    """
+    header = None
+    rows = []
+    pattern = "{}_{}/*/*/*.{}".format(output_prefix, table, output_format)
+    for filename in glob.glob(pattern):
+        if output_format == "csv":
+            [header, *shard_rows] = read_csv(filename)
+        else:
+            import pyarrow.parquet as pq
+
+            shard = pq.read_table(filename)
+            header = shard.column_names
+            shard_rows = [list(row.values()) for row in shard.to_pylist()]
+        rows.extend(shard_rows)
+    return (header, sorted(rows))
+
+
+def write_shards(corpus, output_prefix, output_format, max_open_writers):
+    tables = senate_processor.TABLES
+    writer = ShardWriter(
+        output_prefix,
+        tables,
+        8,
+        "year",
+        ["type", "period"],
+        output_format,
+        max_open_writers,
+    )
+    try:
+        for (filing_id, rows) in deltas.filing_rows(
+            senate_processor.extract_tables(
+                tables, [path.join(corpus, "2018_1.zip")], 1
+            )
+        ):
+            writer.write(filing_id, rows)
+            assert len(writer.writers) <= writer.max_open_writers
+    finally:
+        writer.close()
+    writer.write_manifest()
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_closed_shards_are_continued(corpus, tmpdir, output_format):
+    capped = str(tmpdir.join("capped"))
+    write_shards(corpus, capped, output_format, 1)
+    uncapped = str(tmpdir.join("uncapped"))
+    write_shards(corpus, uncapped, output_format, 1000)
+    for table in senate_processor.TABLES:
+        (header, rows) = read_shards(capped, table.name, output_format)
+        assert header == table.columns
+        assert (header, rows) == read_shards(uncapped, table.name, output_format)
+    with open(capped + "_shards.json") as f:
+        manifest = json.load(f)
+    for entry in manifest["shards"]:
+        filename = path.join(str(tmpdir), entry["path"])
+        if output_format == "csv":
+            assert len(read_csv(filename)) == entry["rows"] + 1
+
+
+def test_extract_all_shards_hold_every_row(corpus, tmpdir):
+    files = [path.join(corpus, "2018_1.zip")]
+    output_prefix = str(tmpdir.join("out"))
+    runner = CliRunner()
+    for args in [[output_prefix], ["--shards", "3", output_prefix + "_sharded"]]:
+        result = runner.invoke(senate_processor.cli, ["extract_all"] + args + files)
+        assert result.exit_code == 0, result.output
+    with open(output_prefix + "_sharded_shards.json") as f:
+        manifest = json.load(f)
+    for table in senate_processor.TABLES:
+        [header, *rows] = read_csv("{}_{}.csv".format(output_prefix, table.name))
+        assert read_shards(output_prefix + "_sharded", table.name, "csv") == (
+            header,
+            sorted(rows),
+        )
+        assert sum(
+            entry["rows"]
+            for entry in manifest["shards"]
+            if entry["table"] == table.name
+        ) == len(rows)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_rerun_replaces_shards(corpus, tmpdir, output_format):
+    files = [path.join(corpus, "2018_1.zip")]
+    output_prefix = str(tmpdir.join("out"))
+    runner = CliRunner()
+    # The second run writes fewer shards, to different files
+    for shards in ["5", "3"]:
+        result = runner.invoke(
+            senate_processor.cli,
+            ["extract_all", "--format", output_format, "--shards", shards]
+            + [output_prefix]
+            + files,
+        )
+        assert result.exit_code == 0, result.output
+    expected = str(tmpdir.join("expected"))
+    write_shards(corpus, expected, output_format, 1000)
+    for table in senate_processor.TABLES:
+        assert read_shards(output_prefix, table.name, output_format) == read_shards(
+            expected, table.name, output_format
+        )
+    with open(output_prefix + "_shards.json") as f:
+        manifest = json.load(f)
+    assert set(entry["shard"] for entry in manifest["shards"]) == {0, 1, 2}
+    assert len(manifest["shards"]) == len(glob.glob(output_prefix + "_*/*/*/*"))
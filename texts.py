@@ -0,0 +1,65 @@
+import hashlib
+
+import stats
+
+
+# Columns of the side tables that hold each distinct text once
+TEXT_COLUMNS = ["text_hash", "text"]
+
+
+def text_hash(text):
+    # 64 bits is plenty to tell every text in the data apart
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def hashed_columns(columns, text_columns):
+    """
+    Returns the columns with the text columns renamed for the hashes that
+    replace their texts, so specific_issues becomes specific_issues_hash
+    """
+    return [
+        column + "_hash" if column in text_columns else column for column in columns
+    ]
+
+
+def intern_row(row, indexes, texts):
+    row = list(row)
+    for index in indexes:
+        text = row[index]
+        if text:
+            key = text_hash(text)
+            texts.setdefault(key, text)
+            row[index] = key
+    return row
+
+
+def intern_texts(columns, rows, text_columns):
+    """
+    Replaces the values of the text columns in each table's rows (whose
+    columns are given by columns) with the hash of the text. Returns the
+    rows for each table followed by the rows of the texts table, with one
+    row for each distinct text.
+    """
+    texts = {}
+    interned = []
+    for (table_columns, table_rows) in zip(columns, rows):
+        indexes = [
+            index
+            for (index, column) in enumerate(table_columns)
+            if column in text_columns
+        ]
+        if indexes:
+            table_rows = [intern_row(row, indexes, texts) for row in table_rows]
+        interned.append(table_rows)
+    return interned + [[[key, text] for (key, text) in texts.items()]]
+
+
+def unique_texts(seen, rows):
+    """
+    Drops the texts in seen from the texts table, which is the last of the
+    tables in rows, and adds the rest to it, so each text is only written once
+    """
+    texts = [row for row in rows[-1] if row[0] not in seen]
+    seen.update(key for (key, _) in texts)
+    stats.count("duplicate_texts", len(rows[-1]) - len(texts))
+    return rows[:-1] + [texts]
@@ -0,0 +1,179 @@
+import csv
+import io
+import sys
+
+import stats
+
+
+class CsvWriter:
+    """
+    Writes rows to a binary stream as CSV as they are produced.
+
+    The output matches what tablib's csv export produced: the excel dialect,
+    utf-8 encoded, with a header row even when there is no data.
+    """
+
+    def __init__(self, stream, columns, owns_stream=False, header=True):
+        self.owns_stream = owns_stream
+        self.text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        self.writer = csv.writer(self.text)
+        if header:
+            self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.text.flush()
+        # Detach rather than close so stdout stays usable
+        stream = self.text.detach()
+        if self.owns_stream:
+            stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Columns with few distinct values, which are dictionary encoded in
+# columnar output
+DICTIONARY_COLUMNS = [
+    "ali_code",
+    "code",
+    "reg_type",
+    "report_type",
+    "report_year",
+    "type",
+    "period",
+    "year",
+    "covered_gov_position_indicator",
+    "file_year",
+    "file_quarter",
+    "file_reporting_window",
+]
+
+# Columns whose values aren't strings
+COLUMN_TYPES = {"issue_index": "int64", "new": "bool"}
+
+
+def is_dictionary_column(column):
+    return (
+        column in DICTIONARY_COLUMNS
+        or column.endswith("state")
+        or column.endswith("country")
+    )
+
+
+def arrow_schema(columns, column_types=None):
+    """
+    Returns the Arrow schema for columns. column_types maps the columns whose
+    values have been parsed to the alias of their type.
+    """
+    import pyarrow as pa
+
+    types = dict(COLUMN_TYPES, **(column_types or {}))
+
+    def column_type(column):
+        if column in types:
+            return pa.type_for_alias(types[column])
+        if is_dictionary_column(column):
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+
+    return pa.schema([pa.field(column, column_type(column)) for column in columns])
+
+
+def record_batch(schema, rows):
+    """
+    Returns an Arrow record batch of a non-empty list of rows with schema
+    """
+    import pyarrow as pa
+
+    arrays = [
+        pa.array(values, type=field.type) for (field, values) in zip(schema, zip(*rows))
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ParquetWriter:
+    """
+    Writes rows to a binary stream as Parquet, converting them to Arrow record
+    batches of batch_size rows at a time.
+    """
+
+    def __init__(self, stream, columns, owns_stream=False, batch_size=65536):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow must be installed to write parquet output")
+        self.stream = stream
+        self.owns_stream = owns_stream
+        self.batch_size = batch_size
+        self.schema = arrow_schema(columns)
+        self.writer = pq.ParquetWriter(stream, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self.writer.write_batch(record_batch(self.schema, self.rows))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter}
+
+FORMATS = list(WRITERS)
+
+
+def extension(output_format):
+    return "." + output_format
+
+
+def stdout_writer(columns, output_format="csv"):
+    return WRITERS[output_format](stats.counting_stream(sys.stdout.buffer), columns)
+
+
+def file_writer(filename, columns, output_format="csv", append=False):
+    """
+    Returns a writer of rows to filename. With append, rows are added to the
+    end of an existing CSV file, which already has its header.
+    """
+    if append:
+        if output_format != "csv":
+            raise ValueError("Only csv output can be appended to")
+        stream = stats.counting_stream(open(filename, "ab"), owns_stream=True)
+        return CsvWriter(stream, columns, owns_stream=True, header=False)
+    stream = stats.counting_stream(open(filename, "wb"), owns_stream=True)
+    return WRITERS[output_format](stream, columns, owns_stream=True)
+
+
+def write_rows(writers, table_rows):
+    """
+    Writes each list of rows in table_rows with the matching writer
+    """
+    with stats.timer("write"):
+        for (writer, rows) in zip(writers, table_rows):
+            for row in rows:
+                writer.write(row)
+            stats.count("rows", len(rows))